@@ -12,86 +12,1012 @@ from vex import *
 # Brain should be defined by default
 brain = Brain()
 
-# The internal EXP inertial sensor
-brain_inertial = Inertial()
-
 # The controller
 controller = Controller()
 
-# Drive motors
-left_drive_2 = Motor(Ports.PORT7, True)
-right_drive_2 = Motor(Ports.PORT12,  False)
+# Motors, sensors and button mappings come from robot_config.json
+# ---- BEGIN ROBOT CONFIG: generated by tools/robot_config.py from robot_config.json, do not edit ----
+ROBOT_CONFIG = {'max_speed': 75,
+ 'deadband': 15,
+ 'motor_refresh_ms': 500,
+ 'periods_ms': {'drive': 20, 'arm': 20, 'telemetry': 1000},
+ 'slew': {'shape': 'scurve', 'drive_ramp_ms': 250, 'arm_ramp_ms': 150},
+ 'telemetry_log': {'enabled': True, 'capacity': 256, 'batch': 16, 'flush_ms': 250},
+ 'odometry': {'inertial': 'brain_inertial',
+              'wheel_travel_mm': 200,
+              'track_width_mm': 176,
+              'heading_weight': 1.0},
+ 'sensors': {'brain_inertial': {'type': 'Inertial'}},
+ 'drive': {'mode': 'arcade',
+           'forward_axis': 'D',
+           'turn_axis': 'B',
+           'left': ['left_drive_2'],
+           'right': ['right_drive_2']},
+ 'motors': {'left_drive_2': {'port': 7, 'reverse': True},
+            'right_drive_2': {'port': 12},
+            'claw_motor': {'port': 4,
+                           'max_torque': 25,
+                           'stopping': 'HOLD',
+                           'buttons': ['RUp', 'RDown']},
+            'lift_motor': {'port': 11,
+                           'reverse': True,
+                           'stopping': 'HOLD',
+                           'buttons': ['EUp', 'EDown']}},
+ 'name': 'season-arcade'}
+# ---- END ROBOT CONFIG ----
+
+# ---- BEGIN MOTION PROFILE: generated by tools/robot_config.py from tools/motion_profile.py, do not edit ----
+import math
 
-# Arm and claw motors will have brake mode set to hold
-# Claw motor will have max torque limited
-claw_motor = Motor(Ports.PORT4, False)
-lift_motor = Motor(Ports.PORT11, True)
+PROFILE_TRAPEZOID = "trapezoid"
+PROFILE_SCURVE = "scurve"
 
-# Max motor speed (percent) for motors controlled by buttons
-MAX_SPEED = 75
+# Smart motor speed at 100 percent, degrees per second
+MOTOR_DPS_AT_FULL = 720.0
 
 #
-# All motors are controlled from this function which is run as a separate thread
+# Fraction of the way through a ramp, 0 to 1, for progress 0 to 1.
 #
-def drive_task():
-    drive_axis = 0
-    turn_axis = 0
-
-    # setup the claw motor
-    claw_motor.set_max_torque(25, PERCENT)
-    claw_motor.set_stopping(HOLD)
-
-    # setup the arm motor
-    lift_motor.set_stopping(HOLD)
-
-    # loop forever
-    while True:
-        # buttons
-        # Three values, max, 0 and -max.
-        #
-        control_l1  = (controller.buttonLUp.pressing() - controller.buttonLDown.pressing()) * MAX_SPEED
-        control_r1  = (controller.buttonRUp.pressing() - controller.buttonRDown.pressing()) * MAX_SPEED
-        control_l2  = (controller.buttonEUp.pressing() - controller.buttonEDown.pressing()) * MAX_SPEED
-        control_r2  = (controller.buttonFUp.pressing() - controller.buttonFDown.pressing()) * MAX_SPEED
+def ramp_shape(progress, shape):
+    if shape == PROFILE_SCURVE:
+        return (1 - math.cos(math.pi * progress)) / 2
+    return progress
 
-        # joystick tank control
-        drive_axis = controller.axisD.position()
-        turn_axis = controller.axisB.position()
-
-        # threshold the variable channels so the drive does not
-        # move if the joystick axis does not return exactly to 0
-        deadband = 15
-        if abs(drive_axis) + abs(turn_axis) > deadband:
-            left_drive_2.set_velocity((drive_axis + turn_axis), PERCENT)
-            right_drive_2.set_velocity((drive_axis - turn_axis), PERCENT)
+#
+# Teleop slew limiter. steps[v] is the largest change in output allowed in
+# one tick while the output is at |v| percent, so a tick costs one list
+# index. A trapezoid ramps at a constant rate, reaching full speed from rest
+# in ramp_ms. An S-curve follows (1 - cos) / 2 over the same time: its steps
+# are smallest near rest and near full speed and largest at half speed,
+# never below min_step so the output always gets moving.
+#
+class SlewTable:
+    def __init__(self, ramp_ms, tick_ms, shape=PROFILE_SCURVE, min_step=1.0):
+        self.ramp_ms = ramp_ms
+        self.shape = shape
+        steps = []
+        for v in range(101):
+            if ramp_ms <= 0:
+                step = 200.0
+            elif shape == PROFILE_SCURVE:
+                step = math.pi * tick_ms / ramp_ms * math.sqrt(v * (100 - v))
+            else:
+                step = 100.0 * tick_ms / ramp_ms
+            if step < min_step:
+                step = min_step
+            steps.append(step)
+        self.steps = steps
+
+    # the output for this tick when moving from current towards target
+    def next(self, current, target):
+        if target > 100:
+            target = 100
+        elif target < -100:
+            target = -100
+        step = self.steps[int(abs(current))]
+        if target > current:
+            if current + step < target:
+                return current + step
+            return target
+        if current - step > target:
+            return current - step
+        return target
+
+#
+# Velocity in percent for each tick of a move of `degrees` motor degrees.
+# The move ramps up over ramp_ms, cruises at velocity and ramps down over
+# ramp_ms to end at rest, every ramp following the given shape. A move too
+# short to reach velocity gets a lower peak instead, so the table always
+# covers exactly the requested distance. Velocities never drop below
+# min_velocity so the move can finish on its encoder.
+#
+def build_move_profile(degrees, velocity, ramp_ms, tick_ms, shape=PROFILE_SCURVE, min_velocity=5.0):
+    degrees = abs(degrees)
+    peak = abs(velocity)
+    ramp_s = ramp_ms / 1000.0
+    peak_dps = peak * MOTOR_DPS_AT_FULL / 100.0
+    # each ramp covers peak * ramp / 2 whatever its shape
+    if peak_dps * ramp_s > degrees:
+        peak_dps = degrees / ramp_s if ramp_s > 0 else peak_dps
+        peak = peak_dps * 100.0 / MOTOR_DPS_AT_FULL
+    cruise_s = 0.0
+    if peak_dps > 0:
+        cruise_s = (degrees - peak_dps * ramp_s) / peak_dps
+    total_ms = 2 * ramp_ms + cruise_s * 1000.0
+
+    table = []
+    t = tick_ms / 2.0
+    while t < total_ms:
+        if t < ramp_ms:
+            v = peak * ramp_shape(t / ramp_ms, shape)
+        elif t > total_ms - ramp_ms:
+            v = peak * ramp_shape((total_ms - t) / ramp_ms, shape)
+        else:
+            v = peak
+        if v < min_velocity:
+            v = min_velocity
+        table.append(v)
+        t += tick_ms
+    if not table:
+        table.append(min_velocity)
+    return table
+# ---- END MOTION PROFILE ----
+
+# ---- BEGIN ODOMETRY: generated by tools/robot_config.py from tools/odometry.py, do not edit ----
+import math
+
+#
+# Pose estimator for a differential drive. Each update takes the change in
+# the drive encoders since the last one for distance, and the change in
+# heading from the inertial sensor blended with the heading change the
+# encoders imply (heading_weight 1 trusts the inertial sensor only), then
+# advances (x, y, heading) along the mean heading of the step.
+#
+# x is to the right and y forward of the starting pose, in mm; heading is
+# in degrees, clockwise like the inertial sensor. The update keeps its
+# state in preallocated lists and builds no tuples or lists per tick.
+#
+# The latest pose is published lock-free for other threads: it is written
+# to the inactive one of two buffers, each guarded by a sequence number
+# that is odd while the buffer is being written, and then the active index
+# is flipped. pose() retries if it raced with a write.
+#
+class PoseEstimator:
+    def __init__(self, inertial, left, right, wheel_travel_mm=200, track_width_mm=176,
+                 heading_weight=1.0, period_ms=10):
+        self.inertial = inertial
+        self.left = tuple(left)
+        self.right = tuple(right)
+        self.mm_per_degree = wheel_travel_mm / 360.0
+        self.track_width_mm = track_width_mm
+        self.heading_weight = heading_weight
+        self.period_ms = period_ms
+        # x, y, heading (deg), last left, last right, last inertial rotation
+        self.state = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        # published poses: x, y, heading, sequence
+        self.buffers = ([0.0, 0.0, 0.0, 0], [0.0, 0.0, 0.0, 0])
+        self.active = 0
+        self.updates = 0
+        self.reset(0, 0, 0)
+
+    def _side(self, motors):
+        total = 0.0
+        for motor in motors:
+            total += motor.position(DEGREES)
+        return total / len(motors)
+
+    # restart the estimate at the given pose, e.g. at a known field position
+    def reset(self, x, y, heading):
+        state = self.state
+        state[0] = x
+        state[1] = y
+        state[2] = heading
+        state[3] = self._side(self.left)
+        state[4] = self._side(self.right)
+        state[5] = self.inertial.rotation(DEGREES)
+        self._publish()
+
+    def update(self):
+        state = self.state
+        left = self._side(self.left)
+        right = self._side(self.right)
+        rotation = self.inertial.rotation(DEGREES)
+
+        d_left = (left - state[3]) * self.mm_per_degree
+        d_right = (right - state[4]) * self.mm_per_degree
+        d_imu = rotation - state[5]
+        d_encoder = math.degrees((d_left - d_right) / self.track_width_mm)
+        d_heading = self.heading_weight * d_imu + (1 - self.heading_weight) * d_encoder
+
+        distance = (d_left + d_right) / 2
+        mid = math.radians(state[2] + d_heading / 2)
+        state[0] += distance * math.sin(mid)
+        state[1] += distance * math.cos(mid)
+        state[2] += d_heading
+        state[3] = left
+        state[4] = right
+        state[5] = rotation
+        self.updates += 1
+        self._publish()
+
+    def _publish(self):
+        buf = self.buffers[1 - self.active]
+        buf[3] += 1
+        buf[0] = self.state[0]
+        buf[1] = self.state[1]
+        buf[2] = self.state[2]
+        buf[3] += 1
+        self.active = 1 - self.active
+
+    # the latest (x, y, heading); safe to call from any thread
+    def pose(self):
+        while True:
+            buf = self.buffers[self.active]
+            seq = buf[3]
+            x = buf[0]
+            y = buf[1]
+            heading = buf[2]
+            if seq % 2 == 0 and buf[3] == seq:
+                return x, y, heading
+
+    # the latest heading only, without building a tuple
+    def heading(self):
+        while True:
+            buf = self.buffers[self.active]
+            seq = buf[3]
+            heading = buf[2]
+            if seq % 2 == 0 and buf[3] == seq:
+                return heading
+
+    # update forever at period_ms against a fixed deadline, for its own thread
+    def run(self):
+        deadline = brain.timer.time(MSEC)
+        while True:
+            self.update()
+            deadline += self.period_ms
+            now = brain.timer.time(MSEC)
+            if deadline > now:
+                sleep(deadline - now)
+            else:
+                deadline = now
+# ---- END ODOMETRY ----
+
+# ---- BEGIN TELEMETRY LOG: generated by tools/robot_config.py from tools/telemetry_log.py, do not edit ----
+#
+# Telemetry log. Each record is a uint32 time in msec followed by one int16
+# per channel, little endian. A channel is a (name, scale) pair and is
+# stored as int(value * scale), so scale 10 keeps one decimal place.
+#
+# The hot loop fills the preallocated `row` list and calls commit(), which
+# packs it into the next slot of a preallocated ring buffer; nothing is
+# allocated per record. flush() runs from a slower background loop and
+# prints the records written since the last flush as hex lines
+#
+#     #VEXTLM HEADER <record size> name:scale,name:scale,...
+#     #VEXTLM <sequence number of the first record> <records as hex>
+#
+# with at most batch records per line. If the flush falls more than the
+# ring's capacity behind, the oldest records are overwritten and counted in
+# lost; the sequence numbers let the decoder see the gap.
+#
+class TelemetryLog:
+    def __init__(self, channels, capacity=256, batch=16, flush_ms=250):
+        self.names = tuple([name for name, scale in channels])
+        self.scales = tuple([scale for name, scale in channels])
+        self.record_size = 4 + 2 * len(channels)
+        self.capacity = capacity
+        self.batch = batch
+        self.flush_ms = flush_ms
+        self.buffer = bytearray(capacity * self.record_size)
+        self.row = [0] * len(channels)
+        self.written = 0
+        self.flushed = 0
+        self.lost = 0
+        self.header_sent = False
+
+    # pack row into the ring as a record stamped with time t (msec)
+    def commit(self, t):
+        buf = self.buffer
+        i = (self.written % self.capacity) * self.record_size
+        t = int(t)
+        buf[i] = t & 0xFF
+        buf[i + 1] = (t >> 8) & 0xFF
+        buf[i + 2] = (t >> 16) & 0xFF
+        buf[i + 3] = (t >> 24) & 0xFF
+        i += 4
+        row = self.row
+        scales = self.scales
+        for c in range(len(row)):
+            v = int(row[c] * scales[c])
+            if v > 32767:
+                v = 32767
+            elif v < -32768:
+                v = -32768
+            buf[i] = v & 0xFF
+            buf[i + 1] = (v >> 8) & 0xFF
+            i += 2
+        self.written += 1
+
+    # print every record not flushed yet, oldest first
+    def flush(self):
+        if not self.header_sent:
+            fields = []
+            for c in range(len(self.names)):
+                fields.append("%s:%s" % (self.names[c], self.scales[c]))
+            print("#VEXTLM HEADER %d %s" % (self.record_size, ",".join(fields)))
+            self.header_sent = True
+        written = self.written
+        if written - self.flushed > self.capacity:
+            self.lost += written - self.flushed - self.capacity
+            self.flushed = written - self.capacity
+        size = self.record_size
+        while self.flushed < written:
+            count = min(self.batch, written - self.flushed)
+            # a batch may wrap around the end of the ring
+            start = (self.flushed % self.capacity) * size
+            end = start + count * size
+            if end <= len(self.buffer):
+                data = self.buffer[start:end]
+            else:
+                data = self.buffer[start:] + self.buffer[:end - len(self.buffer)]
+            print("#VEXTLM %d %s" % (self.flushed, "".join(["%02x" % b for b in data])))
+            self.flushed += count
+
+    # flush every flush_ms forever, for its own thread
+    def run(self):
+        while True:
+            sleep(self.flush_ms)
+            self.flush()
+# ---- END TELEMETRY LOG ----
+
+# ---- BEGIN SCREEN LAYOUT: generated by tools/robot_config.py from tools/screen_layout.py, do not edit ----
+#
+# Brain screen layout. Each field is a named text line on its own screen
+# row. set() only stores the new text and marks the field dirty when it
+# differs from what is on screen, so it is cheap to call from any loop.
+# draw() then rewrites the dirty rows, padding with spaces over the end of
+# the old text instead of clearing, so nothing flickers. Drawing is rate
+# limited to one pass every refresh_ms; a call that comes sooner returns
+# at once and the changes are drawn on a later pass. Control loops should
+# only call set() and leave drawing to run() in a thread of its own; draw()
+# takes the dirty list before printing, so a field set meanwhile is kept
+# for the next pass.
+#
+class ScreenLayout:
+    def __init__(self, fields, refresh_ms=200):
+        self.rows = {}
+        self.text = {}
+        self.shown = {}
+        self.dirty = []
+        for name, row in fields:
+            self.rows[name] = row
+            self.text[name] = ""
+            self.shown[name] = ""
+        self.refresh_ms = refresh_ms
+        self.last_draw = -refresh_ms
+        self.draws = 0
+        self.lines_drawn = 0
+
+    # show text in the named field on the next draw
+    def set(self, name, text):
+        if text == self.text[name]:
+            return
+        self.text[name] = text
+        if name not in self.dirty:
+            self.dirty.append(name)
+
+    # redraw the fields that changed; force skips the rate limit
+    def draw(self, force=False):
+        if not self.dirty:
+            return
+        now = brain.timer.time(MSEC)
+        if not force and now - self.last_draw < self.refresh_ms:
+            return
+        self.last_draw = now
+        dirty = self.dirty
+        self.dirty = []
+        for name in dirty:
+            text = self.text[name]
+            old = self.shown[name]
+            brain.screen.set_cursor(self.rows[name], 1)
+            if len(old) > len(text):
+                brain.screen.print(text + " " * (len(old) - len(text)))
+            else:
+                brain.screen.print(text)
+            self.shown[name] = text
+            self.lines_drawn += 1
+        self.draws += 1
+
+    # draw every refresh_ms forever, for its own thread
+    def run(self):
+        while True:
+            self.draw()
+            sleep(self.refresh_ms)
+# ---- END SCREEN LAYOUT ----
+
+# ---- BEGIN ROBOT RUNTIME: generated by tools/robot_config.py from tools/robot_runtime.py, do not edit ----
+# Controller button bits in ControllerState.buttons
+BUTTON_BITS = {
+    "LUp": 1, "LDown": 2, "RUp": 4, "RDown": 8,
+    "EUp": 16, "EDown": 32, "FUp": 64, "FDown": 128,
+}
+AXIS_NAMES = ("A", "B", "C", "D")
+STOPPING_NAMES = ("COAST", "BRAKE", "HOLD")
+SENSOR_TYPE_NAMES = ("Inertial", "Optical", "Touchled", "Distance", "Bumper")
+SLEW_SHAPES = ("trapezoid", "scurve")
+
+#
+# Check a robot config before anything is built from it. Raises ValueError
+# naming the first problem found: two devices on one port, a port outside
+# 1-12, an unknown axis, button, brake mode, sensor type or slew shape, a
+# motor's buttons that are not a pair of two different buttons, a button
+# mapped to two motors, a drive motor that is not declared, an odometry
+# sensor that is not an Inertial, a telemetry enabled flag that is not a
+# bool, or a telemetry ring smaller than one flush batch.
+#
+def validate_config(config):
+    used_ports = {}
+    devices = list(config["motors"].items()) + list(config.get("sensors", {}).items())
+    for name, spec in devices:
+        port = spec.get("port")
+        if port is None:
+            continue
+        if not isinstance(port, int) or port < 1 or port > 12:
+            raise ValueError("%s: port %s is not 1-12" % (name, port))
+        if port in used_ports:
+            raise ValueError("port %d is used by both %s and %s" % (port, used_ports[port], name))
+        used_ports[port] = name
+
+    for name, spec in config["motors"].items():
+        if spec.get("stopping", "COAST") not in STOPPING_NAMES:
+            raise ValueError("%s: unknown stopping mode %s" % (name, spec["stopping"]))
+    for name, spec in config.get("sensors", {}).items():
+        if spec["type"] not in SENSOR_TYPE_NAMES:
+            raise ValueError("%s: unknown sensor type %s" % (name, spec["type"]))
+
+    inertial = config["odometry"]["inertial"]
+    if config.get("sensors", {}).get(inertial, {}).get("type") != "Inertial":
+        raise ValueError("odometry inertial %s is not an Inertial sensor" % inertial)
+
+    log = config["telemetry_log"]
+    if not isinstance(log["enabled"], bool):
+        raise ValueError("telemetry_log enabled must be true or false, not %s" % log["enabled"])
+    if log["capacity"] < log["batch"]:
+        raise ValueError("telemetry_log capacity %d is smaller than its batch %d" % (log["capacity"], log["batch"]))
+
+    if config["slew"]["shape"] not in SLEW_SHAPES:
+        raise ValueError("unknown slew shape %s" % config["slew"]["shape"])
+
+    used_buttons = {}
+    for name, spec in config["motors"].items():
+        if "buttons" not in spec:
+            continue
+        buttons = spec["buttons"]
+        if not isinstance(buttons, (list, tuple)) or len(buttons) != 2:
+            raise ValueError("%s: buttons must be an [up, down] pair, not %s" % (name, buttons))
+        if buttons[0] == buttons[1]:
+            raise ValueError("%s: button %s is both up and down" % (name, buttons[0]))
+        for button in buttons:
+            if button not in BUTTON_BITS:
+                raise ValueError("%s: unknown button %s" % (name, button))
+            if button in used_buttons:
+                raise ValueError("button %s is mapped to both %s and %s" % (button, used_buttons[button], name))
+            used_buttons[button] = name
+
+    drive = config["drive"]
+    if drive["mode"] == "tank":
+        axes = (drive["left_axis"], drive["right_axis"])
+    elif drive["mode"] == "arcade":
+        axes = (drive["forward_axis"], drive["turn_axis"])
+    else:
+        raise ValueError("unknown drive mode %s" % drive["mode"])
+    for axis in axes:
+        if axis not in AXIS_NAMES:
+            raise ValueError("unknown controller axis %s" % axis)
+    for name in list(drive["left"]) + list(drive["right"]):
+        if name not in config["motors"]:
+            raise ValueError("drive motor %s is not declared" % name)
+
+CONTROLLER_BUTTONS = (
+    (controller.buttonLUp, BUTTON_BITS["LUp"]),
+    (controller.buttonLDown, BUTTON_BITS["LDown"]),
+    (controller.buttonRUp, BUTTON_BITS["RUp"]),
+    (controller.buttonRDown, BUTTON_BITS["RDown"]),
+    (controller.buttonEUp, BUTTON_BITS["EUp"]),
+    (controller.buttonEDown, BUTTON_BITS["EDown"]),
+    (controller.buttonFUp, BUTTON_BITS["FUp"]),
+    (controller.buttonFDown, BUTTON_BITS["FDown"]),
+)
+CONTROLLER_AXES = (controller.axisA, controller.axisB, controller.axisC, controller.axisD)
+
+#
+# Snapshot of the controller taken once per tick. Every button is read once
+# into a bitmask and only the axes the robot maps are read, so all the
+# mappings in a tick see the same input and the tick can be replayed from
+# (buttons, axes) alone.
+#
+class ControllerState:
+    __slots__ = ("buttons", "axes", "axis_indexes", "time")
+
+    def __init__(self, axis_indexes):
+        self.buttons = 0
+        self.axes = [0, 0, 0, 0]
+        self.axis_indexes = axis_indexes
+        self.time = 0
+
+    def read(self):
+        buttons = 0
+        for button, bit in CONTROLLER_BUTTONS:
+            if button.pressing():
+                buttons |= bit
+        self.buttons = buttons
+        axes = self.axes
+        for i in self.axis_indexes:
+            axes[i] = CONTROLLER_AXES[i].position()
+        self.time = brain.timer.time(MSEC)
+
+#
+# Motor output layer. Remembers the last command sent to each motor and only
+# sends a new one when the value changes, so an idle controller does not
+# flood the smart ports with identical spin commands every loop.
+# Unchanged commands are still resent every refresh_ms as a safety net, which
+# also restores a motor that lost its state (e.g. after a smart port
+# reconnect); refresh_ms <= 0 never resends. Every motor command in the
+# runtime goes through spin().
+#
+# Motors are registered once at startup with add(), which returns the
+# motor's slot; spin() takes the slot, and the last command of every motor
+# is kept in lists indexed by it, so a tick does no dictionary lookups.
+#
+class MotorWriter:
+    def __init__(self, refresh_ms):
+        self.refresh_ms = refresh_ms
+        self.motors = []
+        self.last_value = []
+        self.last_sent = []
+        self.sent = 0
+        self.suppressed = 0
+        self.started = brain.timer.time(MSEC)
+
+    # register motor and return its slot; a motor added twice keeps one slot
+    def add(self, motor):
+        for slot in range(len(self.motors)):
+            if self.motors[slot] is motor:
+                return slot
+        self.motors.append(motor)
+        self.last_value.append(None)
+        self.last_sent.append(0)
+        return len(self.motors) - 1
+
+    # spin the motor in slot at value percent, skipping the command if nothing changed
+    def spin(self, slot, value):
+        now = brain.timer.time(MSEC)
+        if self.last_value[slot] == value:
+            if self.refresh_ms <= 0 or now - self.last_sent[slot] < self.refresh_ms:
+                self.suppressed += 1
+                return
+        self.motors[slot].spin(FORWARD, value, PERCENT)
+        self.last_value[slot] = value
+        self.last_sent[slot] = now
+        self.sent += 1
+
+    # commands per second sent and suppressed since the writer was created
+    def rates(self):
+        elapsed = (brain.timer.time(MSEC) - self.started) / 1000
+        if elapsed <= 0:
+            return 0, 0
+        return self.sent / elapsed, self.suppressed / elapsed
+
+    def status(self):
+        sent, suppressed = self.rates()
+        return "cmd/s %d saved %d" % (sent, suppressed)
+
+#
+# Fixed-rate scheduler. Each registered loop function runs every period_ms
+# against a fixed deadline (start + n * period), so the period does not drift
+# with how long the loop body takes, and several loops share one thread.
+# A run that ends after its next deadline counts as an overrun, and the
+# missed periods are skipped rather than run back to back.
+#
+class PeriodicTask:
+    def __init__(self, name, func, period_ms):
+        self.name = name
+        self.func = func
+        self.period_ms = period_ms
+        self.deadline = 0
+        self.runs = 0
+        self.overruns = 0
+        self.jitter_total = 0
+        self.jitter_max = 0
+        self.busy_max = 0
+
+    # average lateness of the start of a run (msec)
+    def jitter_mean(self):
+        if self.runs == 0:
+            return 0
+        return self.jitter_total / self.runs
+
+class Scheduler:
+    def __init__(self):
+        self.tasks = []
+
+    def add(self, name, func, period_ms):
+        task = PeriodicTask(name, func, period_ms)
+        self.tasks.append(task)
+        return task
+
+    # run the registered loops forever from the calling thread
+    def run(self):
+        now = brain.timer.time(MSEC)
+        for task in self.tasks:
+            task.deadline = now
+        while True:
+            task = self.tasks[0]
+            for other in self.tasks:
+                if other.deadline < task.deadline:
+                    task = other
+
+            now = brain.timer.time(MSEC)
+            if task.deadline > now:
+                sleep(task.deadline - now)
+                now = brain.timer.time(MSEC)
+
+            late = now - task.deadline
+            task.func()
+            end = brain.timer.time(MSEC)
+
+            task.runs += 1
+            task.jitter_total += late
+            if late > task.jitter_max:
+                task.jitter_max = late
+            if end - now > task.busy_max:
+                task.busy_max = end - now
+
+            task.deadline += task.period_ms
+            if end > task.deadline:
+                task.overruns += 1
+                while task.deadline <= end:
+                    task.deadline += task.period_ms
+
+    # one line per loop: mean/max jitter and overruns
+    def status(self, index):
+        task = self.tasks[index]
+        return "%s j%d/%d o%d" % (task.name, task.jitter_mean(), task.jitter_max, task.overruns)
+
+SENSOR_TYPES = {
+    "Inertial": Inertial,
+    "Optical": Optical,
+    "Touchled": Touchled,
+    "Distance": Distance,
+    "Bumper": Bumper,
+}
+STOPPING_MODES = {"COAST": COAST, "BRAKE": BRAKE, "HOLD": HOLD}
+
+# Telemetry log record: controller input, drive outputs and pose, one per drive tick
+TELEMETRY_CHANNELS = (
+    ("buttons", 1), ("axis_a", 1), ("axis_b", 1), ("axis_c", 1), ("axis_d", 1),
+    ("drive_left", 10), ("drive_right", 10), ("x_mm", 1), ("y_mm", 1), ("heading_deg", 10),
+)
+
+#
+# Builds every device from the config once at startup and precomputes the
+# tables the control loops use, including the slew tables that ramp every
+# output, so the loops themselves only index tuples and lists and never
+# look at the config again.
+#
+class Robot:
+    def __init__(self, config):
+        validate_config(config)
+        self.name = config["name"]
+        self.max_speed = config["max_speed"]
+        self.deadband = config["deadband"]
+        self.periods = config["periods_ms"]
+
+        self.devices = {}
+        for name, spec in config["motors"].items():
+            motor = Motor(getattr(Ports, "PORT%d" % spec["port"]), spec.get("reverse", False))
+            if "max_torque" in spec:
+                motor.set_max_torque(spec["max_torque"], PERCENT)
+            if "stopping" in spec:
+                motor.set_stopping(STOPPING_MODES[spec["stopping"]])
+            self.devices[name] = motor
+        for name, spec in config.get("sensors", {}).items():
+            if spec.get("port") is None:
+                self.devices[name] = SENSOR_TYPES[spec["type"]]()
+            else:
+                self.devices[name] = SENSOR_TYPES[spec["type"]](getattr(Ports, "PORT%d" % spec["port"]))
+
+        drive = config["drive"]
+        self.drive_mode = drive["mode"]
+        self.left = tuple([self.devices[name] for name in drive["left"]])
+        self.right = tuple([self.devices[name] for name in drive["right"]])
+        if self.drive_mode == "tank":
+            self.drive_axes = (AXIS_NAMES.index(drive["left_axis"]), AXIS_NAMES.index(drive["right_axis"]))
         else:
-            left_drive_2.set_velocity(0, PERCENT)
-            right_drive_2.set_velocity(0, PERCENT)
-        left_drive_2.spin(FORWARD)
-        right_drive_2.spin(FORWARD)
+            self.drive_axes = (AXIS_NAMES.index(drive["forward_axis"]), AXIS_NAMES.index(drive["turn_axis"]))
+
+        self.writer = MotorWriter(config["motor_refresh_ms"])
+        # writer slots of the drive motors, left then right
+        self.left_slots = tuple([self.writer.add(motor) for motor in self.left])
+        self.right_slots = tuple([self.writer.add(motor) for motor in self.right])
+
+        # (writer slot, up bit, down bit) for every button-driven motor
+        buttons = []
+        for name, spec in config["motors"].items():
+            if "buttons" in spec:
+                up, down = spec["buttons"]
+                buttons.append((self.writer.add(self.devices[name]), BUTTON_BITS[up], BUTTON_BITS[down]))
+        self.button_motors = tuple(buttons)
+
+        axis_indexes = list(self.drive_axes)
+        axis_indexes.sort()
+        self.state = ControllerState(tuple(axis_indexes))
+        # last drive outputs (percent), left then right
+        self.drive_outputs = [0, 0]
+
+        odometry = config["odometry"]
+        self.odometry = PoseEstimator(self.devices[odometry["inertial"]], self.left, self.right,
+                                      odometry["wheel_travel_mm"], odometry["track_width_mm"],
+                                      odometry["heading_weight"], self.periods["drive"])
+
+        slew = config["slew"]
+        self.drive_slew = SlewTable(slew["drive_ramp_ms"], self.periods["drive"], slew["shape"])
+        self.arm_slew = SlewTable(slew["arm_ramp_ms"], self.periods["arm"], slew["shape"])
+
+        log = config["telemetry_log"]
+        self.log = TelemetryLog(TELEMETRY_CHANNELS, log["capacity"], log["batch"], log["flush_ms"])
+        self.scheduler = Scheduler()
+
+    # the drive loop for this robot's drive mode, bound to its tables
+    def drive_step(self):
+        axes = self.state.axes
+        first_axis, second_axis = self.drive_axes
+        left = self.left_slots
+        right = self.right_slots
+        deadband = self.deadband
+        spin = self.writer.spin
+        slew = self.drive_slew.next
+        outputs = self.drive_outputs
+
+        # joystick tank control
+        def tank_step():
+            drive_left = axes[first_axis]
+            drive_right = axes[second_axis]
+
+            # threshold the variable channels so the drive does not
+            # move if the joystick axis does not return exactly to 0
+            if abs(drive_left) < deadband:
+                drive_left = 0
+            if abs(drive_right) < deadband:
+                drive_right = 0
+
+            out_left = slew(outputs[0], drive_left)
+            out_right = slew(outputs[1], drive_right)
+            outputs[0] = out_left
+            outputs[1] = out_right
+            for slot in left:
+                spin(slot, out_left)
+            for slot in right:
+                spin(slot, out_right)
 
-        wait(20, MSEC)
+        # arcade drive, forward and turn from separate axes
+        def arcade_step():
+            drive_axis = axes[first_axis]
+            turn_axis = axes[second_axis]
+            drive_left = 0
+            drive_right = 0
+            if abs(drive_axis) + abs(turn_axis) > deadband:
+                drive_left = drive_axis + turn_axis
+                drive_right = drive_axis - turn_axis
 
-        #if abs(drive_axis) < deadband:
-            #drive_axis = 0
-        #if abs(turn_axis) < deadband:
-            #turn_axis = 0
+            out_left = slew(outputs[0], drive_left)
+            out_right = slew(outputs[1], drive_right)
+            outputs[0] = out_left
+            outputs[1] = out_right
+            for slot in left:
+                spin(slot, out_left)
+            for slot in right:
+                spin(slot, out_right)
 
-       # # Now send all drive values to motors
+        if self.drive_mode == "tank":
+            return tank_step
+        return arcade_step
 
-       # # The drivetrain
-        #left_drive_2.spin(FORWARD, drive_axis, PERCENT)
-        #right_drive_2.spin(FORWARD, turn_axis, PERCENT)
+    # the button loop: each up/down pair gives max, 0 or -max, slew limited
+    def button_step(self):
+        state = self.state
+        table = self.button_motors
+        max_speed = self.max_speed
+        spin = self.writer.spin
+        slew = self.arm_slew.next
+        outputs = [0] * len(table)
 
-        # Claw and Arm motors
-        claw_motor.spin(FORWARD, control_r1, PERCENT)
- 
-        # and the auxilary motors
-        lift_motor.spin(FORWARD, control_l2, PERCENT)
-        # No need to run too fast
-        sleep(10)
+        def step():
+            buttons = state.buttons
+            i = 0
+            for slot, up, down in table:
+                value = 0
+                if buttons & up:
+                    value = max_speed
+                if buttons & down:
+                    value -= max_speed
+                value = slew(outputs[i], value)
+                outputs[i] = value
+                spin(slot, value)
+                i += 1
+
+        return step
+
+robot = Robot(ROBOT_CONFIG)
+
+# device names from the config are globals, as they were before the config;
+# this runs once at startup, the loops only use the robot's tables
+globals().update(robot.devices)
+
+# extra per-tick input consumers, each called with the controller snapshot
+INPUT_HOOKS = []
+
+def input_step():
+    robot.state.read()
+    for hook in INPUT_HOOKS:
+        hook(robot.state)
+
+# the pose estimate, readable from any thread
+odometry = robot.odometry
+telemetry_log = robot.log
+
+# Record telemetry and print it to the console (telemetry_log.enabled)
+TELEMETRY_LOG = ROBOT_CONFIG["telemetry_log"]["enabled"]
+
+# record this tick's input, drive outputs and pose into the telemetry log
+def log_step():
+    if not TELEMETRY_LOG:
+        return
+    state = robot.state
+    row = telemetry_log.row
+    row[0] = state.buttons
+    axes = state.axes
+    row[1] = axes[0]
+    row[2] = axes[1]
+    row[3] = axes[2]
+    row[4] = axes[3]
+    row[5] = robot.drive_outputs[0]
+    row[6] = robot.drive_outputs[1]
+    # the pose loop runs in this thread, so its state can be read directly
+    pose = odometry.state
+    row[7] = pose[0]
+    row[8] = pose[1]
+    # the heading is cumulative; wrap it to [-180, 180) so it fits the int16
+    heading = pose[2] % 360
+    if heading >= 180:
+        heading -= 360
+    row[9] = heading
+    telemetry_log.commit(state.time)
+
+# flush the telemetry log to the console while it is enabled, for its own thread
+def telemetry_task():
+    if TELEMETRY_LOG:
+        telemetry_log.run()
+
+# Brain screen fields; only the ones whose text changed are redrawn
+SCREEN_FIELDS = (("commands", 1), ("pose", 2), ("loop1", 3), ("loop2", 4), ("loop3", 5))
+LOOP_FIELDS = ("loop1", "loop2", "loop3")
+screen = ScreenLayout(SCREEN_FIELDS, robot.periods["telemetry"])
+
+# command rates, pose and loop timing on the brain screen; this only updates
+# the fields, the program draws them from a thread of its own (screen.run)
+def telemetry_step():
+    screen.set("commands", robot.writer.status())
+    x, y, heading = odometry.pose()
+    screen.set("pose", "x %d y %d h %d" % (x, y, heading))
+    scheduler = robot.scheduler
+    for i in range(min(len(LOOP_FIELDS), len(scheduler.tasks))):
+        screen.set(LOOP_FIELDS[i], scheduler.status(i))
+
+#
+# All motors are controlled from this function which is run as a separate thread.
+# The input, drive, button and screen field loops all run from it, the drive and
+# button loops reading the controller snapshot taken at the start of the tick.
+# The telemetry log records each drive tick; the program flushes it to the
+# console from a thread of its own (telemetry_task), so printing never
+# delays a drive tick.
+#
+def drive_task():
+    scheduler = robot.scheduler
+    scheduler.add("input", input_step, robot.periods["drive"])
+    scheduler.add("pose", odometry.update, robot.periods["drive"])
+    scheduler.add("drive", robot.drive_step(), robot.periods["drive"])
+    scheduler.add("log", log_step, robot.periods["drive"])
+    scheduler.add("arm", robot.button_step(), robot.periods["arm"])
+    scheduler.add("telem", telemetry_step, robot.periods["telemetry"])
+    scheduler.run()
+# ---- END ROBOT RUNTIME ----
+
+# Record controller input for offline replay with sim/replay.py
+RECORD_INPUT = True
+RECORD_CAPACITY = 512
+RECORD_BATCH = 16
+RECORD_FLUSH_MS = 250
+
+#
+# Input recorder. Logs every controller snapshot that differs from the one
+# before it as a 10 byte little endian record: time (msec, uint32), buttons
+# (uint16) and axes A-D (int8), into a ring buffer. Like the telemetry log,
+# the recorder's own thread (run) prints the records written since its last
+# flush every RECORD_FLUSH_MS as hex lines
+#
+#     #VEXREC START
+#     #VEXREC <sequence number of the first record> <records as hex>
+#
+# so a recording is never cut short however long the session runs; the ring
+# only has to hold the records of one flush period (at most one per 20 ms
+# drive tick). If the flush falls more than the ring's capacity behind, the
+# oldest records are overwritten and counted in lost. sim/replay.py turns
+# the console capture back into a file and replays it.
+#
+RECORD_SIZE = 10
+
+class InputRecorder:
+    def __init__(self, capacity, batch, flush_ms):
+        self.capacity = capacity
+        self.batch = batch
+        self.flush_ms = flush_ms
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.written = 0
+        self.flushed = 0
+        self.lost = 0
+        self.started = False
+        self.buttons = -1
+        self.axes = None
+
+    def log(self, state):
+        axes = state.axes
+        if state.buttons == self.buttons and axes == self.axes:
+            return
+        self.buttons = state.buttons
+        self.axes = list(axes)
+
+        t = int(state.time)
+        i = (self.written % self.capacity) * RECORD_SIZE
+        buf = self.buffer
+        buf[i] = t & 0xFF
+        buf[i + 1] = (t >> 8) & 0xFF
+        buf[i + 2] = (t >> 16) & 0xFF
+        buf[i + 3] = (t >> 24) & 0xFF
+        buf[i + 4] = state.buttons & 0xFF
+        buf[i + 5] = (state.buttons >> 8) & 0xFF
+        buf[i + 6] = axes[0] & 0xFF
+        buf[i + 7] = axes[1] & 0xFF
+        buf[i + 8] = axes[2] & 0xFF
+        buf[i + 9] = axes[3] & 0xFF
+        self.written += 1
+
+    # print every record not flushed yet, oldest first
+    def flush(self):
+        if not self.started:
+            print("#VEXREC START")
+            self.started = True
+        written = self.written
+        if written - self.flushed > self.capacity:
+            self.lost += written - self.flushed - self.capacity
+            self.flushed = written - self.capacity
+        while self.flushed < written:
+            count = min(self.batch, written - self.flushed)
+            # a batch may wrap around the end of the ring
+            start = (self.flushed % self.capacity) * RECORD_SIZE
+            end = start + count * RECORD_SIZE
+            if end <= len(self.buffer):
+                data = self.buffer[start:end]
+            else:
+                data = self.buffer[start:] + self.buffer[:end - len(self.buffer)]
+            print("#VEXREC %d %s" % (self.flushed, "".join(["%02x" % b for b in data])))
+            self.flushed += count
+
+    # flush every flush_ms forever, for its own thread
+    def run(self):
+        while True:
+            sleep(self.flush_ms)
+            self.flush()
+
+input_recorder = InputRecorder(RECORD_CAPACITY, RECORD_BATCH, RECORD_FLUSH_MS)
+
+# log each controller snapshot for replay
+def record_step(state):
+    if RECORD_INPUT:
+        input_recorder.log(state)
+
+INPUT_HOOKS.append(record_step)
 
 # Run the drive code
 drive = Thread(drive_task)
 
+# Print the telemetry log to the console from its own thread
+log_flush = Thread(telemetry_task)
+
+# Print the input recording from its own thread
+record_flush = Thread(input_recorder.run)
+
+# Draw the brain screen fields from their own thread
+screen_draw = Thread(screen.run)
+
 # Python now drops into REPL
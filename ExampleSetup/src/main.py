@@ -24,57 +24,30 @@ claw_motor = Motor(Ports.PORT4)
 lift_motor = Motor(Ports.PORT11)
 
 # Sensors
+brain_inertial = Inertial()
 optical_sensor = Optical(Ports.PORT1)
 touch_led_sensor = Touchled(Ports.PORT2)
 distance_sensor = Distance(Ports.PORT9)
-LUpRelease = Event()
-LDownPress = Event()
-LUpPress = Event()
-LDownRelease = Event()
-RDownPress = Event()
-RDownRelease = Event()
-RUpPress = Event()
-RUpRelease = Event()
-
-def clr_prnt(message):
-    brain.screen.clear_screen()
-    brain.screen.set_cursor(1,1)
-    brain.screen.print(message)
 
-def setup_motors():
-    clr_prnt("Initializing...")
-    lift_motor.set_velocity(100, PERCENT)
-    claw_motor.set_velocity(100, PERCENT)
+# The controller, for driving the claw and lift by hand
+controller = Controller()
 
+# Claw and lift events, posted by the controller buttons or by autonomous code
+LUP_PRESS = 0
+LUP_RELEASE = 1
+LDOWN_PRESS = 2
+LDOWN_RELEASE = 3
+RUP_PRESS = 4
+RUP_RELEASE = 5
+RDOWN_PRESS = 6
+RDOWN_RELEASE = 7
 
-def autonomous_code():
-    # autonomous code
-    wait(1, SECONDS)
-    clr_prnt("Autonomous Code...")
-    drivetrain.drive_for(FORWARD, 200, MM)
-    drivetrain.drive_for(REVERSE, 200, MM)
-    # open claw
-    clr_prnt("Open claw...")
-    RUpPress.broadcast()
-    drivetrain.turn_for(LEFT, 45, DEGREES)
-    drivetrain.drive_for(FORWARD, 200, MM)
-    RUpRelease.broadcast()
-    wait(0.5, SECONDS)
-    # close claw
-    clr_prnt("Close claw...")
-    RDownPress.broadcast()
-    wait(1, SECONDS)
-    # lift motor up
-    clr_prnt("Lift...")
-    LDownPress.broadcast()
-    wait(2, SECONDS)
-    LDownRelease.broadcast()
-    drivetrain.turn_for(RIGHT, 45, DEGREES)
-    # lift motoro down
-    clr_prnt("Lower...")
-    LUpPress.broadcast()
-    wait(1.5, SECONDS)
-    LUpRelease.broadcast()
+# Mechanisms; events for the same mechanism coalesce within a tick
+LIFT = 0
+CLAW = 1
+MECHANISM_COUNT = 2
+
+DISPATCH_TICK_MS = 10
 
 #### LIFT MOTOR UP CALLBACK ####
 def cbLDownPress():
@@ -104,17 +77,761 @@ def cbRUpPress():
 def cbRUpRelease():
     claw_motor.stop()
 
-# system event handlers
-LDownPress(cbLDownPress)
-LUpPress(cbLUpPress)
-LDownRelease(cbLDownRelease)
-LUpRelease(cbLUpRelease)
-RDownPress(cbRDownPress)
-RUpPress(cbRUpPress)
-RDownRelease(cbRDownRelease)
-RUpRelease(cbRUpRelease)
-# add 15ms delay to make sure events are registered correctly.
-wait(15, MSEC)
+# event -> (mechanism, handler), indexed by event id
+EVENT_TABLE = (
+    (LIFT, cbLUpPress),
+    (LIFT, cbLUpRelease),
+    (LIFT, cbLDownPress),
+    (LIFT, cbLDownRelease),
+    (CLAW, cbRUpPress),
+    (CLAW, cbRUpRelease),
+    (CLAW, cbRDownPress),
+    (CLAW, cbRDownRelease),
+)
+
+#
+# Event dispatcher. Events are posted from any thread and run through
+# EVENT_TABLE. Each mechanism gets at most one handler run per dispatcher
+# tick: the first event posted for a mechanism in a tick runs straight away
+# in the posting thread, as Event.broadcast did, and any later ones wait for
+# the dispatcher's own thread at the start of the next tick, where only the
+# last of them runs. So a press and release posted together run the press
+# now and the release within a tick. The table is complete before anything
+# can post, so no event can arrive before its handler exists. Latency is
+# measured from post() to the end of the handler's motor command.
+#
+class Dispatcher:
+    def __init__(self, table, mechanisms, tick_ms=DISPATCH_TICK_MS):
+        self.table = table
+        self.tick_ms = tick_ms
+        self.pending = [-1] * mechanisms
+        self.posted_at = [0] * mechanisms
+        self.ran = [False] * mechanisms
+        self.dispatched = 0
+        self.coalesced = 0
+        self.latency_total = 0
+        self.latency_max = 0
+
+    # run event now, or on the next tick if its mechanism already ran in this one
+    def post(self, event):
+        mechanism = self.table[event][0]
+        posted = brain.timer.time(MSEC)
+        if not self.ran[mechanism]:
+            self.ran[mechanism] = True
+            self.run_event(event, posted)
+            return
+        if self.pending[mechanism] >= 0:
+            self.coalesced += 1
+        self.pending[mechanism] = event
+        self.posted_at[mechanism] = posted
+
+    # handler that posts event, for controller button callbacks
+    def poster(self, event):
+        return lambda: self.post(event)
+
+    def run_event(self, event, posted):
+        self.table[event][1]()
+        latency = brain.timer.time(MSEC) - posted
+        self.dispatched += 1
+        self.latency_total += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    # start a tick: run the events that waited for it
+    def tick(self):
+        pending = self.pending
+        for mechanism in range(len(pending)):
+            event = pending[mechanism]
+            self.ran[mechanism] = event >= 0
+            if event >= 0:
+                pending[mechanism] = -1
+                self.run_event(event, self.posted_at[mechanism])
+
+    def run(self):
+        while True:
+            self.tick()
+            sleep(self.tick_ms)
+
+    # average post-to-command latency (msec)
+    def latency_mean(self):
+        if self.dispatched == 0:
+            return 0
+        return self.latency_total / self.dispatched
+
+dispatcher = Dispatcher(EVENT_TABLE, MECHANISM_COUNT)
+
+def setup_motors():
+    show_status("Initializing...")
+    lift_motor.set_velocity(100, PERCENT)
+    claw_motor.set_velocity(100, PERCENT)
+
+
+# ---- BEGIN MOTION PROFILE: generated by tools/robot_config.py from tools/motion_profile.py, do not edit ----
+import math
+
+PROFILE_TRAPEZOID = "trapezoid"
+PROFILE_SCURVE = "scurve"
+
+# Smart motor speed at 100 percent, degrees per second
+MOTOR_DPS_AT_FULL = 720.0
+
+#
+# Fraction of the way through a ramp, 0 to 1, for progress 0 to 1.
+#
+def ramp_shape(progress, shape):
+    if shape == PROFILE_SCURVE:
+        return (1 - math.cos(math.pi * progress)) / 2
+    return progress
+
+#
+# Teleop slew limiter. steps[v] is the largest change in output allowed in
+# one tick while the output is at |v| percent, so a tick costs one list
+# index. A trapezoid ramps at a constant rate, reaching full speed from rest
+# in ramp_ms. An S-curve follows (1 - cos) / 2 over the same time: its steps
+# are smallest near rest and near full speed and largest at half speed,
+# never below min_step so the output always gets moving.
+#
+class SlewTable:
+    def __init__(self, ramp_ms, tick_ms, shape=PROFILE_SCURVE, min_step=1.0):
+        self.ramp_ms = ramp_ms
+        self.shape = shape
+        steps = []
+        for v in range(101):
+            if ramp_ms <= 0:
+                step = 200.0
+            elif shape == PROFILE_SCURVE:
+                step = math.pi * tick_ms / ramp_ms * math.sqrt(v * (100 - v))
+            else:
+                step = 100.0 * tick_ms / ramp_ms
+            if step < min_step:
+                step = min_step
+            steps.append(step)
+        self.steps = steps
+
+    # the output for this tick when moving from current towards target
+    def next(self, current, target):
+        if target > 100:
+            target = 100
+        elif target < -100:
+            target = -100
+        step = self.steps[int(abs(current))]
+        if target > current:
+            if current + step < target:
+                return current + step
+            return target
+        if current - step > target:
+            return current - step
+        return target
+
+#
+# Velocity in percent for each tick of a move of `degrees` motor degrees.
+# The move ramps up over ramp_ms, cruises at velocity and ramps down over
+# ramp_ms to end at rest, every ramp following the given shape. A move too
+# short to reach velocity gets a lower peak instead, so the table always
+# covers exactly the requested distance. Velocities never drop below
+# min_velocity so the move can finish on its encoder.
+#
+def build_move_profile(degrees, velocity, ramp_ms, tick_ms, shape=PROFILE_SCURVE, min_velocity=5.0):
+    degrees = abs(degrees)
+    peak = abs(velocity)
+    ramp_s = ramp_ms / 1000.0
+    peak_dps = peak * MOTOR_DPS_AT_FULL / 100.0
+    # each ramp covers peak * ramp / 2 whatever its shape
+    if peak_dps * ramp_s > degrees:
+        peak_dps = degrees / ramp_s if ramp_s > 0 else peak_dps
+        peak = peak_dps * 100.0 / MOTOR_DPS_AT_FULL
+    cruise_s = 0.0
+    if peak_dps > 0:
+        cruise_s = (degrees - peak_dps * ramp_s) / peak_dps
+    total_ms = 2 * ramp_ms + cruise_s * 1000.0
+
+    table = []
+    t = tick_ms / 2.0
+    while t < total_ms:
+        if t < ramp_ms:
+            v = peak * ramp_shape(t / ramp_ms, shape)
+        elif t > total_ms - ramp_ms:
+            v = peak * ramp_shape((total_ms - t) / ramp_ms, shape)
+        else:
+            v = peak
+        if v < min_velocity:
+            v = min_velocity
+        table.append(v)
+        t += tick_ms
+    if not table:
+        table.append(min_velocity)
+    return table
+# ---- END MOTION PROFILE ----
+
+# ---- BEGIN ODOMETRY: generated by tools/robot_config.py from tools/odometry.py, do not edit ----
+import math
+
+#
+# Pose estimator for a differential drive. Each update takes the change in
+# the drive encoders since the last one for distance, and the change in
+# heading from the inertial sensor blended with the heading change the
+# encoders imply (heading_weight 1 trusts the inertial sensor only), then
+# advances (x, y, heading) along the mean heading of the step.
+#
+# x is to the right and y forward of the starting pose, in mm; heading is
+# in degrees, clockwise like the inertial sensor. The update keeps its
+# state in preallocated lists and builds no tuples or lists per tick.
+#
+# The latest pose is published lock-free for other threads: it is written
+# to the inactive one of two buffers, each guarded by a sequence number
+# that is odd while the buffer is being written, and then the active index
+# is flipped. pose() retries if it raced with a write.
+#
+class PoseEstimator:
+    def __init__(self, inertial, left, right, wheel_travel_mm=200, track_width_mm=176,
+                 heading_weight=1.0, period_ms=10):
+        self.inertial = inertial
+        self.left = tuple(left)
+        self.right = tuple(right)
+        self.mm_per_degree = wheel_travel_mm / 360.0
+        self.track_width_mm = track_width_mm
+        self.heading_weight = heading_weight
+        self.period_ms = period_ms
+        # x, y, heading (deg), last left, last right, last inertial rotation
+        self.state = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        # published poses: x, y, heading, sequence
+        self.buffers = ([0.0, 0.0, 0.0, 0], [0.0, 0.0, 0.0, 0])
+        self.active = 0
+        self.updates = 0
+        self.reset(0, 0, 0)
+
+    def _side(self, motors):
+        total = 0.0
+        for motor in motors:
+            total += motor.position(DEGREES)
+        return total / len(motors)
+
+    # restart the estimate at the given pose, e.g. at a known field position
+    def reset(self, x, y, heading):
+        state = self.state
+        state[0] = x
+        state[1] = y
+        state[2] = heading
+        state[3] = self._side(self.left)
+        state[4] = self._side(self.right)
+        state[5] = self.inertial.rotation(DEGREES)
+        self._publish()
+
+    def update(self):
+        state = self.state
+        left = self._side(self.left)
+        right = self._side(self.right)
+        rotation = self.inertial.rotation(DEGREES)
+
+        d_left = (left - state[3]) * self.mm_per_degree
+        d_right = (right - state[4]) * self.mm_per_degree
+        d_imu = rotation - state[5]
+        d_encoder = math.degrees((d_left - d_right) / self.track_width_mm)
+        d_heading = self.heading_weight * d_imu + (1 - self.heading_weight) * d_encoder
+
+        distance = (d_left + d_right) / 2
+        mid = math.radians(state[2] + d_heading / 2)
+        state[0] += distance * math.sin(mid)
+        state[1] += distance * math.cos(mid)
+        state[2] += d_heading
+        state[3] = left
+        state[4] = right
+        state[5] = rotation
+        self.updates += 1
+        self._publish()
+
+    def _publish(self):
+        buf = self.buffers[1 - self.active]
+        buf[3] += 1
+        buf[0] = self.state[0]
+        buf[1] = self.state[1]
+        buf[2] = self.state[2]
+        buf[3] += 1
+        self.active = 1 - self.active
+
+    # the latest (x, y, heading); safe to call from any thread
+    def pose(self):
+        while True:
+            buf = self.buffers[self.active]
+            seq = buf[3]
+            x = buf[0]
+            y = buf[1]
+            heading = buf[2]
+            if seq % 2 == 0 and buf[3] == seq:
+                return x, y, heading
+
+    # the latest heading only, without building a tuple
+    def heading(self):
+        while True:
+            buf = self.buffers[self.active]
+            seq = buf[3]
+            heading = buf[2]
+            if seq % 2 == 0 and buf[3] == seq:
+                return heading
+
+    # update forever at period_ms against a fixed deadline, for its own thread
+    def run(self):
+        deadline = brain.timer.time(MSEC)
+        while True:
+            self.update()
+            deadline += self.period_ms
+            now = brain.timer.time(MSEC)
+            if deadline > now:
+                sleep(deadline - now)
+            else:
+                deadline = now
+# ---- END ODOMETRY ----
+
+# ---- BEGIN TELEMETRY LOG: generated by tools/robot_config.py from tools/telemetry_log.py, do not edit ----
+#
+# Telemetry log. Each record is a uint32 time in msec followed by one int16
+# per channel, little endian. A channel is a (name, scale) pair and is
+# stored as int(value * scale), so scale 10 keeps one decimal place.
+#
+# The hot loop fills the preallocated `row` list and calls commit(), which
+# packs it into the next slot of a preallocated ring buffer; nothing is
+# allocated per record. flush() runs from a slower background loop and
+# prints the records written since the last flush as hex lines
+#
+#     #VEXTLM HEADER <record size> name:scale,name:scale,...
+#     #VEXTLM <sequence number of the first record> <records as hex>
+#
+# with at most batch records per line. If the flush falls more than the
+# ring's capacity behind, the oldest records are overwritten and counted in
+# lost; the sequence numbers let the decoder see the gap.
+#
+class TelemetryLog:
+    def __init__(self, channels, capacity=256, batch=16, flush_ms=250):
+        self.names = tuple([name for name, scale in channels])
+        self.scales = tuple([scale for name, scale in channels])
+        self.record_size = 4 + 2 * len(channels)
+        self.capacity = capacity
+        self.batch = batch
+        self.flush_ms = flush_ms
+        self.buffer = bytearray(capacity * self.record_size)
+        self.row = [0] * len(channels)
+        self.written = 0
+        self.flushed = 0
+        self.lost = 0
+        self.header_sent = False
+
+    # pack row into the ring as a record stamped with time t (msec)
+    def commit(self, t):
+        buf = self.buffer
+        i = (self.written % self.capacity) * self.record_size
+        t = int(t)
+        buf[i] = t & 0xFF
+        buf[i + 1] = (t >> 8) & 0xFF
+        buf[i + 2] = (t >> 16) & 0xFF
+        buf[i + 3] = (t >> 24) & 0xFF
+        i += 4
+        row = self.row
+        scales = self.scales
+        for c in range(len(row)):
+            v = int(row[c] * scales[c])
+            if v > 32767:
+                v = 32767
+            elif v < -32768:
+                v = -32768
+            buf[i] = v & 0xFF
+            buf[i + 1] = (v >> 8) & 0xFF
+            i += 2
+        self.written += 1
+
+    # print every record not flushed yet, oldest first
+    def flush(self):
+        if not self.header_sent:
+            fields = []
+            for c in range(len(self.names)):
+                fields.append("%s:%s" % (self.names[c], self.scales[c]))
+            print("#VEXTLM HEADER %d %s" % (self.record_size, ",".join(fields)))
+            self.header_sent = True
+        written = self.written
+        if written - self.flushed > self.capacity:
+            self.lost += written - self.flushed - self.capacity
+            self.flushed = written - self.capacity
+        size = self.record_size
+        while self.flushed < written:
+            count = min(self.batch, written - self.flushed)
+            # a batch may wrap around the end of the ring
+            start = (self.flushed % self.capacity) * size
+            end = start + count * size
+            if end <= len(self.buffer):
+                data = self.buffer[start:end]
+            else:
+                data = self.buffer[start:] + self.buffer[:end - len(self.buffer)]
+            print("#VEXTLM %d %s" % (self.flushed, "".join(["%02x" % b for b in data])))
+            self.flushed += count
+
+    # flush every flush_ms forever, for its own thread
+    def run(self):
+        while True:
+            sleep(self.flush_ms)
+            self.flush()
+# ---- END TELEMETRY LOG ----
+
+# ---- BEGIN SCREEN LAYOUT: generated by tools/robot_config.py from tools/screen_layout.py, do not edit ----
+#
+# Brain screen layout. Each field is a named text line on its own screen
+# row. set() only stores the new text and marks the field dirty when it
+# differs from what is on screen, so it is cheap to call from any loop.
+# draw() then rewrites the dirty rows, padding with spaces over the end of
+# the old text instead of clearing, so nothing flickers. Drawing is rate
+# limited to one pass every refresh_ms; a call that comes sooner returns
+# at once and the changes are drawn on a later pass. Control loops should
+# only call set() and leave drawing to run() in a thread of its own; draw()
+# takes the dirty list before printing, so a field set meanwhile is kept
+# for the next pass.
+#
+class ScreenLayout:
+    def __init__(self, fields, refresh_ms=200):
+        self.rows = {}
+        self.text = {}
+        self.shown = {}
+        self.dirty = []
+        for name, row in fields:
+            self.rows[name] = row
+            self.text[name] = ""
+            self.shown[name] = ""
+        self.refresh_ms = refresh_ms
+        self.last_draw = -refresh_ms
+        self.draws = 0
+        self.lines_drawn = 0
+
+    # show text in the named field on the next draw
+    def set(self, name, text):
+        if text == self.text[name]:
+            return
+        self.text[name] = text
+        if name not in self.dirty:
+            self.dirty.append(name)
+
+    # redraw the fields that changed; force skips the rate limit
+    def draw(self, force=False):
+        if not self.dirty:
+            return
+        now = brain.timer.time(MSEC)
+        if not force and now - self.last_draw < self.refresh_ms:
+            return
+        self.last_draw = now
+        dirty = self.dirty
+        self.dirty = []
+        for name in dirty:
+            text = self.text[name]
+            old = self.shown[name]
+            brain.screen.set_cursor(self.rows[name], 1)
+            if len(old) > len(text):
+                brain.screen.print(text + " " * (len(old) - len(text)))
+            else:
+                brain.screen.print(text)
+            self.shown[name] = text
+            self.lines_drawn += 1
+        self.draws += 1
+
+    # draw every refresh_ms forever, for its own thread
+    def run(self):
+        while True:
+            self.draw()
+            sleep(self.refresh_ms)
+# ---- END SCREEN LAYOUT ----
+
+# Autonomous tuning. Mechanism moves end on the first of: the encoder moved
+# the given degrees, the motor current shows it stalled against a hard stop
+# or an object, or the timeout expired.
+AUTON_START_DELAY_MS = 1000
+AUTON_POLL_MS = 10
+# The fixed-wait routine ran each mechanism for a set time at the 100%
+# velocity setup_motors gives it (120 rpm, 720 degrees a second). Each
+# degree target is that time at that speed, so an unobstructed move turns
+# as far as it used to, and each timeout is the old time plus a margin so
+# the encoder ends an unobstructed move. The claw used to open for as long
+# as the 45 degree turn and 200 mm drive took at the drivetrain's default
+# 50%: 1346 ms.
+MECHANISM_DEG_PER_S = 720
+CLAW_OPEN_MS = 1346
+CLAW_CLOSE_MS = 1000
+LIFT_UP_MS = 2000
+LIFT_DOWN_MS = 1500
+MECHANISM_TIMEOUT_MARGIN_MS = 250
+CLAW_OPEN_DEG = MECHANISM_DEG_PER_S * CLAW_OPEN_MS // 1000
+CLAW_CLOSE_DEG = MECHANISM_DEG_PER_S * CLAW_CLOSE_MS // 1000
+LIFT_UP_DEG = MECHANISM_DEG_PER_S * LIFT_UP_MS // 1000
+LIFT_DOWN_DEG = MECHANISM_DEG_PER_S * LIFT_DOWN_MS // 1000
+STALL_AMPS = 0.8
+# ignore the start-up current spike for this long
+STALL_IGNORE_MS = 100
+
+# Drive moves: velocity (percent), ramp shape and time, and drivetrain geometry
+AUTON_DRIVE_VELOCITY = 50
+AUTON_TURN_VELOCITY = 50
+AUTON_PROFILE = PROFILE_SCURVE
+AUTON_RAMP_MS = 200
+AUTON_CREEP_MS = 500
+WHEEL_TRAVEL_MM = 200
+TRACK_WIDTH_MM = 176
+# Drive moves hold their starting heading: percent per degree of error
+HEADING_HOLD_GAIN = 2.0
+
+# Pose from the inertial sensor and drive encoders, updated in its own thread
+odometry = PoseEstimator(brain_inertial, [left_motor], [right_motor], WHEEL_TRAVEL_MM, TRACK_WIDTH_MM)
+
+# One telemetry record per engine tick, flushed to the console in its own thread
+telemetry_log = TelemetryLog((
+    ("step", 1), ("drive_left", 10), ("drive_right", 10),
+    ("x_mm", 1), ("y_mm", 1), ("heading_deg", 10),
+    ("claw_deg", 1), ("lift_deg", 1), ("claw_amps", 1000), ("lift_amps", 1000),
+), 256, 16, 250)
+
+# Brain screen: status messages, pose and battery, redrawn only where they changed
+SCREEN_REFRESH_MS = 200
+screen = ScreenLayout((("status", 1), ("pose", 2), ("battery", 3)), SCREEN_REFRESH_MS)
+
+def show_status(message):
+    screen.set("status", message)
+
+# refresh the pose and battery fields and draw whatever changed
+def screen_task():
+    while True:
+        x, y, heading = odometry.pose()
+        screen.set("pose", "x %d y %d h %d" % (x, y, heading))
+        screen.set("battery", "battery %d%%" % brain.battery.capacity())
+        screen.draw()
+        sleep(SCREEN_REFRESH_MS)
+
+#
+# Motion engine. A routine is a list of steps and each step starts its
+# actions together, moving on once all of its foreground actions are done.
+# Every tick the engine calls update() on each running action, which
+# advances it and returns True once it has finished.
+# Background actions keep running into the following steps and are only
+# stopped when they finish, when another action takes their motor, or at
+# the end of the routine.
+#
+#
+# Drive and turn moves follow a velocity profile precomputed per tick at
+# startup, so a tick costs one table index. A drive ends when the drive
+# encoders have covered the distance, steering to hold the heading it
+# started on; a turn ends when the odometry heading has changed by `turn`
+# degrees, so wheel slip does not shorten or lengthen it. If the table runs
+# out first the last (slowest) velocity is held for up to AUTON_CREEP_MS.
+#
+class ProfiledMove:
+    def __init__(self, left_sign, right_sign, degrees, velocity, turn=0):
+        self.left_sign = left_sign
+        self.right_sign = right_sign
+        self.degrees = degrees
+        self.turn = turn
+        self.table = build_move_profile(degrees, velocity, AUTON_RAMP_MS, AUTON_POLL_MS, AUTON_PROFILE)
+        self.creep_ticks = AUTON_CREEP_MS // AUTON_POLL_MS
+        self.motor = left_motor
+        self.background = False
+        self.index = 0
+        self.last = None
+        self.left_start = 0
+        self.right_start = 0
+        self.heading_start = 0
+
+    def start(self):
+        self.index = 0
+        self.last = None
+        self.left_start = left_motor.position(DEGREES)
+        self.right_start = right_motor.position(DEGREES)
+        self.heading_start = odometry.heading()
+        self.update()
+
+    def update(self):
+        error = self.heading_start - odometry.heading()
+        if self.turn:
+            if abs(error) >= self.turn:
+                return True
+            correction = 0
+        else:
+            travelled = (abs(left_motor.position(DEGREES) - self.left_start)
+                         + abs(right_motor.position(DEGREES) - self.right_start)) / 2
+            if travelled >= self.degrees:
+                return True
+            correction = HEADING_HOLD_GAIN * error
+        table = self.table
+        i = self.index
+        if i >= len(table):
+            if i >= len(table) + self.creep_ticks:
+                return True
+            i = len(table) - 1
+        self.index += 1
+        v = table[i]
+        if v != self.last or correction:
+            left_motor.spin(FORWARD, v * self.left_sign + correction, PERCENT)
+            right_motor.spin(FORWARD, v * self.right_sign - correction, PERCENT)
+            self.last = v
+        return False
+
+    def finish(self):
+        left_motor.stop()
+        right_motor.stop()
+
+# drive straight for distance_mm
+def DriveAction(direction, distance_mm, velocity=AUTON_DRIVE_VELOCITY):
+    sign = 1
+    if direction == REVERSE:
+        sign = -1
+    return ProfiledMove(sign, sign, distance_mm / WHEEL_TRAVEL_MM * 360, velocity)
+
+# turn on the spot by angle degrees
+def TurnAction(direction, angle, velocity=AUTON_TURN_VELOCITY):
+    sign = 1
+    if direction == LEFT:
+        sign = -1
+    arc_mm = math.pi * TRACK_WIDTH_MM * angle / 360
+    return ProfiledMove(sign, -sign, arc_mm / WHEEL_TRAVEL_MM * 360, velocity, angle)
+
+#
+# Runs a mechanism by posting its press event until the encoder has moved
+# degrees, the motor stalls or timeout_ms passes, then posts the release
+# event unless hold is set (e.g. to keep gripping an object).
+#
+class MechanismAction:
+    def __init__(self, motor, press, release, degrees, timeout_ms, hold=False, background=False):
+        self.motor = motor
+        self.press = press
+        self.release = release
+        self.degrees = degrees
+        self.timeout_ms = timeout_ms
+        self.hold = hold
+        self.background = background
+        self.started = 0
+        self.start_position = 0
+        self.reason = None
+
+    def start(self):
+        self.started = brain.timer.time(MSEC)
+        self.start_position = self.motor.position(DEGREES)
+        self.reason = None
+        dispatcher.post(self.press)
+
+    def update(self):
+        elapsed = brain.timer.time(MSEC) - self.started
+        if abs(self.motor.position(DEGREES) - self.start_position) >= self.degrees:
+            self.reason = "position"
+        elif elapsed > STALL_IGNORE_MS and self.motor.current(AMP) >= STALL_AMPS:
+            self.reason = "stall"
+        elif elapsed >= self.timeout_ms:
+            self.reason = "timeout"
+        return self.reason is not None
+
+    def finish(self):
+        if not self.hold:
+            dispatcher.post(self.release)
+
+class MotionEngine:
+    def __init__(self, poll_ms=AUTON_POLL_MS):
+        self.poll_ms = poll_ms
+        self.running = []
+        self.step_times = []
+        self.total_ms = 0
+        self.step = 0
+
+    # stop a running action early, e.g. when its motor is needed elsewhere
+    def cancel(self, action):
+        action.finish()
+        self.running.remove(action)
+
+    # check every running action once, finishing those that are done
+    def poll(self):
+        for action in list(self.running):
+            if action.update():
+                action.finish()
+                self.running.remove(action)
+        self.log()
+
+    # record this tick's drive outputs, pose and mechanisms in the telemetry log
+    def log(self):
+        row = telemetry_log.row
+        row[0] = self.step
+        row[1] = left_motor.velocity(PERCENT)
+        row[2] = right_motor.velocity(PERCENT)
+        x, y, heading = odometry.pose()
+        row[3] = x
+        row[4] = y
+        # the heading is cumulative; wrap it to [-180, 180) so it fits the int16
+        heading = heading % 360
+        if heading >= 180:
+            heading -= 360
+        row[5] = heading
+        row[6] = claw_motor.position(DEGREES)
+        row[7] = lift_motor.position(DEGREES)
+        row[8] = claw_motor.current(AMP)
+        row[9] = lift_motor.current(AMP)
+        telemetry_log.commit(brain.timer.time(MSEC))
+
+    def run(self, routine):
+        started = brain.timer.time(MSEC)
+        for step in routine:
+            self.step += 1
+            step_started = brain.timer.time(MSEC)
+            for action in step:
+                for other in list(self.running):
+                    if action.motor is not None and other.motor is action.motor:
+                        self.cancel(other)
+                action.start()
+                self.running.append(action)
+            sleep(self.poll_ms)
+            self.poll()
+            while [a for a in step if a in self.running and not a.background]:
+                sleep(self.poll_ms)
+                self.poll()
+            self.step_times.append(brain.timer.time(MSEC) - step_started)
+        while self.running:
+            sleep(self.poll_ms)
+            self.poll()
+        self.total_ms = brain.timer.time(MSEC) - started
+        return self.total_ms
+
+AUTON_ROUTINE = (
+    (DriveAction(FORWARD, 200),),
+    (DriveAction(REVERSE, 200),),
+    # open the claw while turning and driving up to the object
+    (MechanismAction(claw_motor, RUP_PRESS, RUP_RELEASE, CLAW_OPEN_DEG,
+                     CLAW_OPEN_MS + MECHANISM_TIMEOUT_MARGIN_MS, background=True),
+     TurnAction(LEFT, 45)),
+    (DriveAction(FORWARD, 200),),
+    # close the claw until it grips the object, and keep gripping
+    (MechanismAction(claw_motor, RDOWN_PRESS, RDOWN_RELEASE, CLAW_CLOSE_DEG,
+                     CLAW_CLOSE_MS + MECHANISM_TIMEOUT_MARGIN_MS, hold=True),),
+    # lift, then turn back once the lift has stopped
+    (MechanismAction(lift_motor, LDOWN_PRESS, LDOWN_RELEASE, LIFT_UP_DEG, LIFT_UP_MS + MECHANISM_TIMEOUT_MARGIN_MS),),
+    (TurnAction(RIGHT, 45),),
+    # lower
+    (MechanismAction(lift_motor, LUP_PRESS, LUP_RELEASE, LIFT_DOWN_DEG,
+                     LIFT_DOWN_MS + MECHANISM_TIMEOUT_MARGIN_MS),),
+)
+
+auton_engine = MotionEngine()
+
+def autonomous_code():
+    # autonomous code
+    wait(AUTON_START_DELAY_MS, MSEC)
+    show_status("Autonomous Code...")
+    auton_engine.run(AUTON_ROUTINE)
+    telemetry_log.flush()
+    show_status("Auton %d ms" % (AUTON_START_DELAY_MS + auton_engine.total_ms))
+    screen.draw(True)
+    print("Autonomous routine %d ms, steps %s" % (AUTON_START_DELAY_MS + auton_engine.total_ms, auton_engine.step_times))
+    print("Dispatch %d events, %d coalesced, latency avg %d max %d ms" % (
+        dispatcher.dispatched, dispatcher.coalesced, dispatcher.latency_mean(), dispatcher.latency_max))
+
+# controller buttons post the same events as autonomous code
+controller.buttonLUp.pressed(dispatcher.poster(LUP_PRESS))
+controller.buttonLUp.released(dispatcher.poster(LUP_RELEASE))
+controller.buttonLDown.pressed(dispatcher.poster(LDOWN_PRESS))
+controller.buttonLDown.released(dispatcher.poster(LDOWN_RELEASE))
+controller.buttonRUp.pressed(dispatcher.poster(RUP_PRESS))
+controller.buttonRUp.released(dispatcher.poster(RUP_RELEASE))
+controller.buttonRDown.pressed(dispatcher.poster(RDOWN_PRESS))
+controller.buttonRDown.released(dispatcher.poster(RDOWN_RELEASE))
 
+ws1 = Thread( dispatcher.run )
 ws2 = Thread( autonomous_code )
+ws3 = Thread( odometry.run )
+ws4 = Thread( telemetry_log.run )
+ws5 = Thread( screen_task )
 setup_motors()
@@ -0,0 +1,312 @@
+"""
+End-to-end benchmarks for the control loops and the vision pipeline.
+
+Three groups, each runnable on its own:
+
+    control     host time per drive tick of every robot program's drive_task,
+                run under the simulated vex module with the sweep driver
+    autonomous  duration of ExampleSetup's autonomous_code on the simulated
+                clock, with the claw and lift against their hard stops
+    vision      ms/frame of VEXImageMatcher.extract_image_features and
+                match_image_to_data on synthetic images, for each matcher
+                backend and training-set size (needs numpy and OpenCV)
+
+Results are written as JSON so runs can be kept and compared; --compare
+prints the change in every timing against an earlier results file.
+
+Usage:
+    python benchmarks/bench.py -o bench.json
+    python benchmarks/bench.py control autonomous --repeat 5
+    python benchmarks/bench.py vision --sizes 4,16,64 --compare bench.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (os.path.join(REPO_ROOT, "sim"), os.path.join(REPO_ROOT, "kajhkfdhgksdfhk", "src")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import harness  # noqa: E402
+
+CONTROL_PROGRAMS = (
+    "2025-2026Season/main.py",
+    "2025-2026Season/src/main.py",
+    "kajhkfdhgksdfhk/src/main.py",
+)
+AUTON_PROGRAM = "ExampleSetup/src/main.py"
+# Claw and lift travel between hard stops, as in the harness usage example
+AUTON_LIMITS = ("4=-300:300", "11=-1000:0")
+GROUPS = ("control", "autonomous", "vision")
+# Settings recorded with the results, not measured, so never compared
+SETTING_FIELDS = ("drive_period_ms",)
+
+
+def _run_quietly(path, **kwargs):
+    """
+    Run a program under the harness with its console output discarded.
+
+    Returns:
+        tuple: (harness report, the program's globals)
+    """
+    program = {}
+    setup = kwargs.pop("setup", None)
+
+    def capture(globals_):
+        program.update(globals_)
+        if setup is not None:
+            setup(globals_)
+
+    report = harness.run_program(os.path.join(REPO_ROOT, path), setup=capture, console=io.StringIO(), **kwargs)
+    if report["errors"]:
+        raise RuntimeError("%s: %s" % (path, report["errors"][0]["error"]))
+    return report, program
+
+
+def bench_control(duration_s=30.0, repeat=3):
+    """
+    Time every robot program's drive_task per drive tick.
+
+    A drive tick is one drive period of simulated time, covering the input,
+    pose, drive, log and arm loops due in it; its host time is the thread's
+    busy time divided by the number of drive periods simulated.
+
+    Args:
+        duration_s: Simulated seconds per run.
+        repeat: Runs per program; the median is reported.
+
+    Returns:
+        list: Per program, robot name, drive mode, us_per_tick (median and
+            min), worst single loop run, motor command rate and overruns.
+    """
+    results = []
+    for path in CONTROL_PROGRAMS:
+        per_tick = []
+        worst = []
+        for _ in range(repeat):
+            report, program = _run_quietly(path, duration_ms=duration_s * 1000.0,
+                                           driver=harness.DRIVERS["sweep"])
+            robot = program["robot"]
+            thread = [t for t in report["kernel"].tasks if t.name == "drive_task"][0]
+            ticks = report["sim_ms"] / robot.periods["drive"]
+            per_tick.append(1e6 * thread.busy_wall / ticks)
+            worst.append(1e6 * thread.busy_max)
+        results.append({
+            "program": path,
+            "robot": robot.name,
+            "drive_mode": robot.drive_mode,
+            "drive_period_ms": robot.periods["drive"],
+            "us_per_tick": statistics.median(per_tick),
+            "us_per_tick_min": min(per_tick),
+            "us_max_loop_run": statistics.median(worst),
+            "motor_commands_per_s": report["motor_commands_per_s"],
+            "overruns": sum(task.overruns for task in robot.scheduler.tasks),
+        })
+    return results
+
+
+def bench_autonomous():
+    """
+    Run ExampleSetup's autonomous routine to completion on the simulated clock.
+
+    Returns:
+        dict: routine_ms (from the program's start), per-step times, the
+            engine's own total and the host time the run took.
+    """
+    report, program = _run_quietly(AUTON_PROGRAM, duration_ms=60000, until_done=["autonomous_code"],
+                                   setup=harness.motor_limits(AUTON_LIMITS))
+    engine = program["auton_engine"]
+    return {
+        "program": AUTON_PROGRAM,
+        "routine_ms": report["routine_ms"],
+        "engine_ms": engine.total_ms,
+        "step_ms": list(engine.step_times),
+        "motor_commands": report["motor_commands"],
+        "host_s": report["wall_s"],
+    }
+
+
+def bench_vision(sizes=(4, 16, 64), backends=("bruteforce", "flann"), frames=10, seed=0):
+    """
+    Time feature extraction and matching on synthetic images.
+
+    For each training-set size a fresh set of images is generated with
+    ai.synthetic_training_set and indexed once; the queries are perturbed views
+    of training images (ai.perturb_image, as in ai.benchmark_extractors),
+    written to disk so extract_image_features and match_image_to_data run end
+    to end.
+
+    Args:
+        sizes: Training-set sizes.
+        backends: Matcher backend names.
+        frames: Query frames per size.
+        seed: Seed for the images and perturbations.
+
+    Returns:
+        list: Per size and backend, index_s (the first backend's includes
+            extracting the training set, later ones reuse its feature store),
+            extract_ms_per_frame, match_ms_per_frame (extraction included) and
+            accuracy.
+    """
+    import cv2
+    import numpy as np
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import ai
+
+    results = []
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        with tempfile.TemporaryDirectory() as directory:
+            data_file, images = ai.synthetic_training_set(directory, size, rng)
+            queries = []
+            for i in range(frames):
+                path = os.path.join(directory, "query%03d.png" % i)
+                cv2.imwrite(path, ai.perturb_image(images[i % size], rng))
+                queries.append((path, i % size))
+
+            for backend in backends:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    matcher = ai.VEXImageMatcher(data_file, backend=backend)
+                index_s = matcher.reindex_stats["seconds"]
+
+                start = time.perf_counter()
+                for path, _ in queries:
+                    matcher.extract_image_features(path)
+                extract_s = time.perf_counter() - start
+
+                correct = 0
+                start = time.perf_counter()
+                for path, expected in queries:
+                    best = matcher.match_image_to_data(path, confidence_threshold=0.0)["best_match"]
+                    correct += best is not None and best["object_id"] == expected
+                match_s = time.perf_counter() - start
+
+                results.append({
+                    "training_objects": size,
+                    "backend": backend,
+                    "frames": frames,
+                    "index_s": index_s,
+                    "extract_ms_per_frame": 1000.0 * extract_s / frames,
+                    "match_ms_per_frame": 1000.0 * match_s / frames,
+                    "accuracy": correct / frames,
+                })
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timings(value, path=""):
+    """
+    Flatten a results tree into {path: number} for every timing and rate
+    field. Rows in a list are keyed by their identifying fields rather than
+    their position.
+    """
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(_timings(item, path + "/" + key))
+    elif isinstance(value, list) and value and isinstance(value[0], dict):
+        for row in value:
+            name = ",".join(str(row[k]) for k in ("program", "training_objects", "backend") if k in row)
+            flat.update(_timings(row, path + "[" + name + "]"))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        leaf = path.rsplit("/", 1)[-1]
+        if leaf in SETTING_FIELDS:
+            return flat
+        if leaf.startswith(("us_", "ms_")) or leaf.endswith(("_ms", "_s", "_ms_per_frame")):
+            flat[path] = value
+    return flat
+
+
+def compare(previous, current):
+    """
+    Return (path, old, new, change) for every timing present in both runs,
+    change being new / old - 1.
+    """
+    old = _timings(previous)
+    new = _timings(current)
+    rows = []
+    for path in sorted(set(old) & set(new)):
+        change = new[path] / old[path] - 1 if old[path] else None
+        rows.append((path, old[path], new[path], change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the control loops and the vision pipeline")
+    parser.add_argument("groups", nargs="*", metavar="GROUP",
+                        help="benchmark groups to run: %s (default: all)" % ", ".join(GROUPS))
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="JSON", help="show the change against an earlier results file")
+    parser.add_argument("--repeat", type=int, default=3, help="control: runs per program (median reported)")
+    parser.add_argument("--duration", type=float, default=30.0, help="control: simulated seconds per run")
+    parser.add_argument("--sizes", default="4,16,64", help="vision: training-set sizes")
+    parser.add_argument("--backends", default="bruteforce,flann", help="vision: matcher backends")
+    parser.add_argument("--frames", type=int, default=10, help="vision: query frames per size")
+    args = parser.parse_args(argv)
+    for group in args.groups:
+        if group not in GROUPS:
+            parser.error("unknown group %s (choose from %s)" % (group, ", ".join(GROUPS)))
+    groups = args.groups or GROUPS
+
+    results = {
+        "meta": {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        }
+    }
+    if "control" in groups:
+        results["control"] = bench_control(args.duration, args.repeat)
+        for row in results["control"]:
+            print("control    %-28s %-7s %7.1f us/tick (min %.1f)  %5.1f cmd/s  %d overruns"
+                  % (row["program"], row["drive_mode"], row["us_per_tick"], row["us_per_tick_min"],
+                     row["motor_commands_per_s"], row["overruns"]))
+    if "autonomous" in groups:
+        results["autonomous"] = row = bench_autonomous()
+        print("autonomous %-28s %7.0f ms simulated  steps %s" % (row["program"], row["routine_ms"], row["step_ms"]))
+    if "vision" in groups:
+        try:
+            results["vision"] = bench_vision([int(s) for s in args.sizes.split(",")], args.backends.split(","),
+                                             args.frames)
+        except ImportError as e:
+            print("vision     skipped: %s" % e)
+        for row in results.get("vision", []):
+            print("vision     %3d objects %-10s extract %7.2f ms/frame  match %7.2f ms/frame  accuracy %.2f"
+                  % (row["training_objects"], row["backend"], row["extract_ms_per_frame"],
+                     row["match_ms_per_frame"], row["accuracy"]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print("\nchange against %s (%s):" % (args.compare, previous.get("meta", {}).get("commit")))
+        for path, old, new, change in compare(previous, results):
+            print("  %-70s %10.2f -> %10.2f  %s" % (path, old, new, "%+.1f%%" % (100 * change)
+                                                    if change is not None else "n/a"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
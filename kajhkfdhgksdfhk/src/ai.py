@@ -1,57 +1,1352 @@
 import cv2
 import numpy as np
+import collections
+import hashlib
 import json
+import math
+import multiprocessing
 import os
+import queue
+import threading
+import time
+from collections.abc import Mapping
 from pathlib import Path
 try:
     from vexiq import *
 except ImportError:
     print("Warning: VEX IQ 2nd generation library not available. Running in simulation mode.")
 
+
+def _file_digest(path):
+    """
+    Compute the SHA-1 hash of a file's contents.
+    
+    Args:
+        path (str): Path to the file
+        
+    Returns:
+        str: Hex digest of the file contents
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+FEATURE_STORE_MAGIC = b"VEXFS001"
+FEATURE_STORE_VERSION = 3
+FEATURE_STORE_ALIGN = 64
+KEYPOINT_FIELDS = ("x", "y", "size", "angle", "response", "octave")
+HISTOGRAM_BINS = 32
+
+
+def _align(offset):
+    return (offset + FEATURE_STORE_ALIGN - 1) // FEATURE_STORE_ALIGN * FEATURE_STORE_ALIGN
+
+
+def _keypoints_to_array(keypoints):
+    """
+    Pack OpenCV keypoints into a float32 array with KEYPOINT_FIELDS columns.
+    
+    Args:
+        keypoints (list): cv2.KeyPoint objects (may be None or empty)
+        
+    Returns:
+        np.ndarray: Array of shape (len(keypoints), len(KEYPOINT_FIELDS))
+    """
+    if not keypoints:
+        return np.zeros((0, len(KEYPOINT_FIELDS)), dtype=np.float32)
+    return np.array([(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave)
+                     for kp in keypoints], dtype=np.float32)
+
+
+def global_histogram(image):
+    """
+    Compute a normalized intensity histogram used as a cheap global descriptor.
+    
+    Args:
+        image (np.ndarray): Grayscale image (None gives an all-zero histogram)
+        
+    Returns:
+        np.ndarray: float32 array of HISTOGRAM_BINS values summing to 1 (or 0)
+    """
+    if image is None:
+        return np.zeros(HISTOGRAM_BINS, dtype=np.float32)
+    histogram = cv2.calcHist([image], [0], None, [HISTOGRAM_BINS], [0, 256]).ravel()
+    total = histogram.sum()
+    return (histogram / total if total else histogram).astype(np.float32)
+
+
+class FeatureStore:
+    """
+    Read-only, memory-mapped store of training keypoints and descriptors.
+    
+    All objects share one contiguous keypoint array and one contiguous
+    descriptor array; rows offsets[i]:offsets[i + 1] belong to object i.
+    File layout (little endian, array sections 64-byte aligned):
+    
+        magic (8 bytes) | header length (uint32) | JSON header
+        offsets      int64[num_objects + 1]
+        histograms   float32[num_objects, HISTOGRAM_BINS]
+        keypoints    float32[num_rows, len(KEYPOINT_FIELDS)]
+        descriptors  descriptor_dtype[num_rows, descriptor_dim]
+    
+    Descriptors are float32 for SIFT and uint8 for the binary ORB/AKAZE
+    descriptors; the header records the dtype and the extractor settings.
+    
+    Because the arrays are opened with numpy.memmap, opening a store is cheap
+    and the pages are shared by every process that maps the same file.
+    """
+    
+    def __init__(self, path):
+        """
+        Open a feature store written by FeatureStore.write.
+        
+        Args:
+            path (str): Path to the feature store file
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(FEATURE_STORE_MAGIC)) != FEATURE_STORE_MAGIC:
+                raise ValueError(f"{path} is not a VEX feature store")
+            header_len = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+        if self.header.get("version") != FEATURE_STORE_VERSION:
+            raise ValueError(f"{path} has format version {self.header.get('version')}, "
+                             f"expected {FEATURE_STORE_VERSION}")
+        
+        self.objects = self.header["objects"]
+        num_rows = self.header["num_rows"]
+        dim = self.header["descriptor_dim"]
+        dtype = np.dtype(self.header["descriptor_dtype"])
+        offsets_at, histograms_at, keypoints_at, descriptors_at, _ = FeatureStore._layout(
+            header_len, len(self.objects), num_rows, dim * dtype.itemsize)
+        
+        self.offsets = np.memmap(path, dtype="<i8", mode="r", offset=offsets_at,
+                                 shape=(len(self.objects) + 1,))
+        if self.objects:
+            self.histograms = np.memmap(path, dtype="<f4", mode="r", offset=histograms_at,
+                                        shape=(len(self.objects), HISTOGRAM_BINS))
+        else:
+            self.histograms = np.zeros((0, HISTOGRAM_BINS), dtype=np.float32)
+        if num_rows:
+            self.keypoints = np.memmap(path, dtype="<f4", mode="r", offset=keypoints_at,
+                                       shape=(num_rows, len(KEYPOINT_FIELDS)))
+            self.descriptors = np.memmap(path, dtype=dtype, mode="r", offset=descriptors_at,
+                                         shape=(num_rows, dim))
+        else:
+            self.keypoints = np.zeros((0, len(KEYPOINT_FIELDS)), dtype=np.float32)
+            self.descriptors = np.zeros((0, dim), dtype=dtype)
+    
+    def __len__(self):
+        return len(self.objects)
+    
+    def keypoints_for(self, i):
+        """
+        Return the keypoint rows of object i as a view into the store.
+        """
+        return self.keypoints[self.offsets[i]:self.offsets[i + 1]]
+    
+    def descriptors_for(self, i):
+        """
+        Return the descriptors of object i as a view, or None if it has none.
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        if start == end:
+            return None
+        return self.descriptors[start:end]
+    
+    def close(self):
+        """
+        Drop the memory maps so the file can be replaced.
+        """
+        self.offsets = self.histograms = self.keypoints = self.descriptors = None
+    
+    @staticmethod
+    def _layout(header_len, num_objects, num_rows, descriptor_bytes):
+        offsets_at = _align(len(FEATURE_STORE_MAGIC) + 4 + header_len)
+        histograms_at = _align(offsets_at + 8 * (num_objects + 1))
+        keypoints_at = _align(histograms_at + 4 * num_objects * HISTOGRAM_BINS)
+        descriptors_at = _align(keypoints_at + 4 * num_rows * len(KEYPOINT_FIELDS))
+        end = descriptors_at + num_rows * descriptor_bytes
+        return offsets_at, histograms_at, keypoints_at, descriptors_at, end
+    
+    @staticmethod
+    def write(path, records, descriptor_dim, descriptor_dtype="<f4", extractor=None):
+        """
+        Write a feature store file.
+        
+        Args:
+            path (str): Destination path (replaced atomically)
+            records (list): Dicts with image_path, mtime_ns, size, sha1, num_keypoints,
+                histogram, keypoints and descriptors (None if no features)
+            descriptor_dim (int): Length of one descriptor
+            descriptor_dtype (str): NumPy dtype of the descriptors
+            extractor (dict): FeatureExtractor.config() of the extractor that produced them
+        """
+        descriptor_dtype = np.dtype(descriptor_dtype)
+        counts = [0 if r["descriptors"] is None else len(r["descriptors"]) for r in records]
+        offsets = np.zeros(len(records) + 1, dtype="<i8")
+        offsets[1:] = np.cumsum(counts)
+        num_rows = int(offsets[-1])
+        
+        header = json.dumps({
+            "version": FEATURE_STORE_VERSION,
+            "descriptor_dim": descriptor_dim,
+            "descriptor_dtype": descriptor_dtype.str,
+            "extractor": extractor,
+            "num_rows": num_rows,
+            "keypoint_fields": list(KEYPOINT_FIELDS),
+            "objects": [{key: r[key] for key in ("image_path", "mtime_ns", "size", "sha1", "num_keypoints")}
+                        for r in records]
+        }).encode("utf-8")
+        offsets_at, histograms_at, keypoints_at, descriptors_at, end = FeatureStore._layout(
+            len(header), len(records), num_rows, descriptor_dim * descriptor_dtype.itemsize)
+        
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(FEATURE_STORE_MAGIC)
+            f.write(np.array([len(header)], dtype="<u4").tobytes())
+            f.write(header)
+            f.seek(offsets_at)
+            f.write(offsets.tobytes())
+            f.seek(histograms_at)
+            for r in records:
+                f.write(np.asarray(r["histogram"], dtype="<f4").tobytes())
+            f.seek(keypoints_at)
+            for r, count in zip(records, counts):
+                if count:
+                    f.write(np.ascontiguousarray(r["keypoints"][:count], dtype="<f4").tobytes())
+            f.seek(descriptors_at)
+            for r, count in zip(records, counts):
+                if count:
+                    f.write(np.ascontiguousarray(r["descriptors"], dtype=descriptor_dtype).tobytes())
+            f.truncate(end)
+        os.replace(tmp_path, path)
+
+
+class FeatureExtractor:
+    """
+    Configurable keypoint detector and descriptor extractor.
+    
+    SIFT gives 128-float descriptors compared with L2 distance; ORB and AKAZE
+    give binary descriptors compared with Hamming distance and are much faster
+    to extract and match. Frames can be downscaled before extraction and the
+    number of keypoints capped (strongest responses kept); keypoint coordinates
+    are reported in the original image's scale.
+    """
+    
+    METHODS = ("sift", "orb", "akaze")
+    
+    def __init__(self, method="sift", max_dimension=None, max_keypoints=None):
+        """
+        Args:
+            method (str): One of FeatureExtractor.METHODS
+            max_dimension (int): Downscale so the longer side is at most this many pixels
+            max_keypoints (int): Keep at most this many keypoints per image
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown feature extractor '{method}', expected one of {self.METHODS}")
+        self.method = method
+        self.max_dimension = max_dimension
+        self.max_keypoints = max_keypoints
+        
+        if method == "sift":
+            self.detector = cv2.SIFT_create(nfeatures=max_keypoints or 0)
+            self.norm_type = cv2.NORM_L2
+            self.descriptor_dtype = "<f4"
+        elif method == "orb":
+            self.detector = cv2.ORB_create(nfeatures=max_keypoints or 500)
+            self.norm_type = cv2.NORM_HAMMING
+            self.descriptor_dtype = "|u1"
+        else:
+            if not hasattr(cv2, "AKAZE_create"):
+                raise ValueError("AKAZE is not available in this OpenCV build")
+            self.detector = cv2.AKAZE_create()
+            self.norm_type = cv2.NORM_HAMMING
+            self.descriptor_dtype = "|u1"
+        self.descriptor_size = self.detector.descriptorSize()
+    
+    def config(self):
+        """
+        Return the settings that determine the extracted features.
+        """
+        return {"method": self.method, "max_dimension": self.max_dimension,
+                "max_keypoints": self.max_keypoints}
+    
+    def store_suffix(self):
+        """
+        Return the feature store file suffix for this configuration.
+        
+        The default SIFT configuration keeps the plain '.fstore' name.
+        """
+        if self.config() == {"method": "sift", "max_dimension": None, "max_keypoints": None}:
+            return ".fstore"
+        parts = [self.method]
+        if self.max_dimension:
+            parts.append(f"d{self.max_dimension}")
+        if self.max_keypoints:
+            parts.append(f"k{self.max_keypoints}")
+        return "." + "-".join(parts) + ".fstore"
+    
+    def detect_and_compute(self, image):
+        """
+        Detect keypoints and compute descriptors on a grayscale image.
+        
+        Args:
+            image (np.ndarray): Grayscale image
+            
+        Returns:
+            tuple: (keypoints, descriptors); descriptors is None if nothing was found
+        """
+        scale = 1.0
+        if self.max_dimension and max(image.shape[:2]) > self.max_dimension:
+            scale = self.max_dimension / max(image.shape[:2])
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        if self.max_keypoints and self.method == "akaze":
+            # AKAZE has no feature cap of its own: keep the strongest responses
+            keypoints = self.detector.detect(image, None)
+            keypoints = sorted(keypoints, key=lambda kp: kp.response, reverse=True)[:self.max_keypoints]
+            keypoints, descriptors = self.detector.compute(image, keypoints)
+        else:
+            keypoints, descriptors = self.detector.detectAndCompute(image, None)
+        
+        if scale != 1.0:
+            for kp in keypoints:
+                kp.pt = (kp.pt[0] / scale, kp.pt[1] / scale)
+                kp.size = kp.size / scale
+        if descriptors is not None and not len(descriptors):
+            descriptors = None
+        return keypoints, descriptors
+
+
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+
+
+class BruteForceBackend:
+    """
+    Exact matcher backend: brute-force k-NN against each training object in turn.
+    """
+    
+    name = "bruteforce"
+    # Cost is proportional to the objects asked for, so early exit saves work
+    incremental = True
+    
+    def __init__(self):
+        self.entries = []
+        self.norm_type = cv2.NORM_L2
+    
+    def build(self, descriptor_index, norm_type=cv2.NORM_L2):
+        """
+        Prepare the backend for the given descriptor index.
+        
+        Args:
+            descriptor_index (list): Entries from VEXImageMatcher.build_descriptor_index
+            norm_type (int): cv2.NORM_L2 for float descriptors, cv2.NORM_HAMMING for binary
+        """
+        self.entries = descriptor_index
+        self.norm_type = norm_type
+    
+    def knn_distances(self, desc_query, subset=None):
+        """
+        Find the two nearest training descriptors of every query descriptor, per object.
+        
+        Args:
+            desc_query (np.ndarray): Query descriptors
+            subset (list): Index entries to match (default: all)
+            
+        Returns:
+            tuple: (nearest, second) float64 arrays of shape (num_entries, num_query);
+                entries without a complete pair are np.inf
+        """
+        entries = self.entries if subset is None else [self.entries[i] for i in subset]
+        nearest = np.full((len(entries), len(desc_query)), np.inf)
+        second = np.full((len(entries), len(desc_query)), np.inf)
+        for i, entry in enumerate(entries):
+            desc_train = entry["descriptors"]
+            if desc_train is None or len(desc_train) < 2:
+                continue
+            # Same distances as BFMatcher.knnMatch(k=2), without building DMatch objects
+            dist, _ = cv2.batchDistance(desc_query, desc_train,
+                                        cv2.CV_32S if self.norm_type == cv2.NORM_HAMMING else cv2.CV_32F,
+                                        normType=self.norm_type, K=2)
+            nearest[i] = dist[:, 0]
+            second[i] = dist[:, 1]
+        return nearest, second
+
+
+class FlannBackend:
+    """
+    Approximate matcher backend: one FLANN index over all training descriptors.
+    
+    Float descriptors (SIFT) use randomized KD-trees; binary descriptors (ORB,
+    AKAZE) use a locality-sensitive hashing index with Hamming distance.
+    
+    Every descriptor in the tree is labelled with its training object, so a
+    query frame is matched against all objects in a single k-NN search. Each
+    object's nearest and second-nearest distances are taken from the k results;
+    when only one of an object's descriptors is among them, the k-th distance
+    stands in for the second nearest (a lower bound, so the ratio test can only
+    become stricter than the exact result).
+    """
+    
+    name = "flann"
+    # One search covers every object, so scoring a subset saves nothing
+    incremental = False
+    
+    def __init__(self, trees=4, checks=64, k=8):
+        """
+        Args:
+            trees (int): Number of randomized KD-trees
+            checks (int): Leaf checks per query (higher is slower but more exact)
+            k (int): Neighbours retrieved per query descriptor across all objects
+        """
+        self.trees = trees
+        self.checks = checks
+        self.k = k
+        self.entries = []
+        self.index = None
+        self.labels = np.zeros(0, dtype=np.int32)
+        self.num_descriptors = np.zeros(0, dtype=np.int64)
+        self.norm_type = cv2.NORM_L2
+    
+    def build(self, descriptor_index, norm_type=cv2.NORM_L2):
+        """
+        Build the FLANN index over the descriptors of every training object.
+        
+        Args:
+            descriptor_index (list): Entries from VEXImageMatcher.build_descriptor_index
+            norm_type (int): cv2.NORM_L2 for float descriptors, cv2.NORM_HAMMING for binary
+        """
+        self.entries = descriptor_index
+        self.norm_type = norm_type
+        self.num_descriptors = np.array([0 if entry["descriptors"] is None else len(entry["descriptors"])
+                                         for entry in descriptor_index], dtype=np.int64)
+        blocks = []
+        labels = []
+        for i, entry in enumerate(descriptor_index):
+            if entry["descriptors"] is not None:
+                blocks.append(entry["descriptors"])
+                labels.append(np.full(len(entry["descriptors"]), i, dtype=np.int32))
+        
+        if not blocks:
+            self.index = None
+            self.labels = np.zeros(0, dtype=np.int32)
+            return
+        self.labels = np.concatenate(labels)
+        if norm_type == cv2.NORM_HAMMING:
+            self._train = np.ascontiguousarray(np.vstack(blocks), dtype=np.uint8)
+            params = {"algorithm": FLANN_INDEX_LSH, "table_number": 6, "key_size": 12, "multi_probe_level": 1}
+        else:
+            self._train = np.ascontiguousarray(np.vstack(blocks), dtype=np.float32)
+            params = {"algorithm": FLANN_INDEX_KDTREE, "trees": self.trees}
+        self.index = cv2.flann_Index(self._train, params)
+    
+    def knn_distances(self, desc_query, subset=None):
+        """
+        Find each object's two nearest descriptors for every query descriptor in one pass.
+        
+        Args:
+            desc_query (np.ndarray): Query descriptors
+            subset (list): Index entries to return (default: all)
+            
+        Returns:
+            tuple: (nearest, second) float64 arrays of shape (num_entries, num_query);
+                entries without a complete pair are np.inf
+        """
+        nearest = np.full((len(self.entries), len(desc_query)), np.inf)
+        second = np.full((len(self.entries), len(desc_query)), np.inf)
+        if self.index is None:
+            return (nearest, second) if subset is None else (nearest[subset], second[subset])
+        
+        k = min(self.k, len(self.labels))
+        indices, dists = self.index.knnSearch(np.ascontiguousarray(desc_query, dtype=self._train.dtype), k,
+                                              params={"checks": self.checks})
+        dists = dists.astype(np.float64)
+        if self.norm_type != cv2.NORM_HAMMING:
+            # FLANN reports squared L2 distances
+            dists = np.sqrt(dists)
+        found = indices >= 0
+        labels = np.where(found, self.labels[np.maximum(indices, 0)], -1)
+        
+        # Occurrence number of each neighbour's label within its row (0 = nearest, 1 = second)
+        same_label = labels[:, :, None] == labels[:, None, :]
+        occurrence = np.count_nonzero(same_label & np.tri(k, k, -1, dtype=bool), axis=2)
+        
+        for rank, target in ((0, nearest), (1, second)):
+            rows, cols = np.nonzero(found & (occurrence == rank))
+            target[labels[rows, cols], rows] = dists[rows, cols]
+        
+        # Objects seen once among the k neighbours: the farthest neighbour bounds their second nearest
+        farthest = np.where(found, dists, -np.inf).max(axis=1)
+        missing = np.isfinite(nearest) & np.isinf(second)
+        second = np.where(missing, farthest[None, :], second)
+        
+        # Match BFMatcher: an object needs two descriptors to form a pair at all
+        nearest[self.num_descriptors < 2] = np.inf
+        if subset is not None:
+            return nearest[subset], second[subset]
+        return nearest, second
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+_END_OF_STREAM = object()
+
+
+def iter_frames(source):
+    """
+    Yield frames from a camera, video, image directory or iterable of frames.
+    
+    Args:
+        source: Camera index (int), cv2.VideoCapture, path to a video file,
+            path to a directory of images (read in name order), or an iterable
+            of ndarrays and/or image paths
+            
+    Yields:
+        np.ndarray: Decoded frames
+    """
+    if isinstance(source, (int, str, os.PathLike)) and not (
+            isinstance(source, (str, os.PathLike)) and os.path.isdir(source)):
+        source = cv2.VideoCapture(source if isinstance(source, int) else os.fspath(source))
+    
+    if isinstance(source, cv2.VideoCapture):
+        try:
+            while True:
+                ok, frame = source.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            source.release()
+    elif isinstance(source, (str, os.PathLike)):
+        for path in sorted(Path(source).iterdir()):
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                frame = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+                if frame is not None:
+                    yield frame
+    elif isinstance(source, np.ndarray):
+        yield source
+    else:
+        for frame in source:
+            if isinstance(frame, (str, os.PathLike)):
+                frame = cv2.imread(os.fspath(frame), cv2.IMREAD_GRAYSCALE)
+                if frame is None:
+                    continue
+            yield frame
+
+
+def score_matches(nearest, second, num_kp_train, num_kp_query, ratio=0.75):
+    """
+    Apply Lowe's ratio test and compute match confidence for a batch of objects.
+    
+    Args:
+        nearest (np.ndarray): Nearest-neighbour distances, shape (num_objects, num_query)
+        second (np.ndarray): Second-nearest distances, same shape
+        num_kp_train (np.ndarray): Keypoint count of each training object
+        num_kp_query (int): Keypoint count of the query frame
+        ratio (float): Lowe's ratio threshold
+        
+    Returns:
+        tuple: (good_matches, confidence) arrays of shape (num_objects,)
+    """
+    num_kp_train = np.asarray(num_kp_train)
+    good = np.count_nonzero(nearest < ratio * second, axis=1)
+    confidence = good / np.maximum(np.maximum(num_kp_train, num_kp_query), 1)
+    confidence = np.where((num_kp_train > 0) & (num_kp_query > 0), confidence, 0.0)
+    return good, confidence
+
+
+MATCHER_BACKENDS = {
+    BruteForceBackend.name: BruteForceBackend,
+    FlannBackend.name: FlannBackend
+}
+
+
+class _StageTimer:
+    """
+    Context manager that records the time spent inside it as one stage sample.
+    """
+    
+    __slots__ = ("stats", "name", "start")
+    
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.stats.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    """
+    Shared do-nothing timer handed out while profiling is disabled.
+    """
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class PipelineStats:
+    """
+    Per-stage latency histograms for the vision pipeline.
+    
+    Samples go into fixed log-spaced buckets (BUCKETS_PER_DECADE per decade
+    from 1 microsecond to 100 seconds), so recording is O(1) and memory does
+    not grow with the number of frames; percentiles are reported as the upper
+    edge of the bucket that contains them (within about 12%). Each sample can
+    also be appended to a JSON Lines log. While disabled, stage() returns a
+    shared no-op context manager and record() returns immediately.
+    """
+    
+    BUCKETS_PER_DECADE = 20
+    MIN_SECONDS = 1e-6
+    NUM_BUCKETS = 8 * BUCKETS_PER_DECADE + 1
+    
+    def __init__(self, enabled=False, log_path=None):
+        """
+        Args:
+            enabled (bool): Start recording immediately
+            log_path (str): Optional JSON Lines file receiving every sample
+        """
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._log = None
+        self.reset()
+        if enabled:
+            self.enable(log_path)
+    
+    def enable(self, log_path=None):
+        """
+        Start recording; with log_path, also append every sample to that file.
+        """
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            self._log = open(log_path, "a") if log_path else None
+            self.enabled = True
+    
+    def disable(self):
+        """
+        Stop recording and close the log file (collected statistics are kept).
+        """
+        with self._lock:
+            self.enabled = False
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+    
+    def reset(self):
+        """
+        Discard all collected samples.
+        """
+        with self._lock:
+            self._stages = {}
+    
+    def stage(self, name):
+        """
+        Return a context manager timing one execution of a stage.
+        
+        Args:
+            name (str): Stage name, e.g. "decode", "extract", "match"
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+    
+    def record(self, name, seconds):
+        """
+        Record one sample for a stage.
+        
+        Args:
+            name (str): Stage name
+            seconds (float): Duration of the sample
+        """
+        if not self.enabled:
+            return
+        bucket = 0
+        if seconds > self.MIN_SECONDS:
+            bucket = min(int(math.log10(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_DECADE) + 1,
+                         self.NUM_BUCKETS - 1)
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {"count": 0, "total": 0.0, "max": 0.0,
+                                              "buckets": [0] * self.NUM_BUCKETS}
+            stage["count"] += 1
+            stage["total"] += seconds
+            stage["max"] = max(stage["max"], seconds)
+            stage["buckets"][bucket] += 1
+            if self._log is not None:
+                self._log.write(json.dumps({"time": time.time(), "stage": name, "ms": 1000.0 * seconds}) + "\n")
+    
+    def summary(self):
+        """
+        Summarize every stage recorded so far.
+        
+        Returns:
+            dict: Per stage, count, mean_ms, p50_ms, p95_ms, p99_ms and max_ms
+        """
+        with self._lock:
+            stages = {name: dict(stage, buckets=list(stage["buckets"])) for name, stage in self._stages.items()}
+        
+        report = {}
+        for name, stage in stages.items():
+            report[name] = {"count": stage["count"],
+                            "mean_ms": 1000.0 * stage["total"] / stage["count"],
+                            "max_ms": 1000.0 * stage["max"]}
+            for label, quantile in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+                report[name][label] = 1000.0 * min(self._quantile(stage, quantile), stage["max"])
+        return report
+    
+    def _quantile(self, stage, quantile):
+        target = quantile * stage["count"]
+        seen = 0
+        for bucket, count in enumerate(stage["buckets"]):
+            seen += count
+            if seen >= target and count:
+                return self.MIN_SECONDS * 10 ** (bucket / self.BUCKETS_PER_DECADE)
+        return stage["max"]
+
+
+TRAINING_MANIFEST_VERSION = 1
+# Object fields kept in the manifest itself; any other field is loaded on demand
+MANIFEST_SUMMARY_KEYS = ("id", "name", "image_path")
+ACTION_PORT_KEYS = ("motor_port", "distance_sensor_port", "color_sensor_port")
+
+
+def _object_digest(obj):
+    """
+    Hash a training object's canonical JSON (sorted keys, no whitespace).
+    
+    Returns:
+        tuple: (hex digest, canonical JSON bytes)
+    """
+    blob = json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest(), blob
+
+
+class LazyTrainingObject(Mapping):
+    """
+    Read-only view of one training object backed by a TrainingManifest entry.
+    
+    The summary fields (MANIFEST_SUMMARY_KEYS) are answered from the manifest;
+    the first access to any other field, such as sensor_data, reads the whole
+    object from the manifest's objects file and keeps it.
+    """
+    
+    def __init__(self, manifest, entry):
+        self._manifest = manifest
+        self._entry = entry
+        self._data = None
+    
+    @property
+    def loaded(self):
+        return self._data is not None
+    
+    @property
+    def ports(self):
+        """
+        The smart ports named by the object's sensor_data action, from the manifest.
+        """
+        return self._entry["ports"]
+    
+    def _load(self):
+        if self._data is None:
+            self._data = self._manifest.load_object(self._entry)
+        return self._data
+    
+    def __getitem__(self, key):
+        summary = self._entry["summary"]
+        if key in summary:
+            return summary[key]
+        if key in MANIFEST_SUMMARY_KEYS:
+            raise KeyError(key)
+        return self._load()[key]
+    
+    def __contains__(self, key):
+        if key in MANIFEST_SUMMARY_KEYS:
+            return key in self._entry["summary"]
+        return key in self._load()
+    
+    def __iter__(self):
+        return iter(self._load())
+    
+    def __len__(self):
+        return len(self._load())
+
+
+class TrainingManifest:
+    """
+    Per-object index of a training data file, so objects load on demand.
+    
+    Two files sit next to the data file:
+    
+        <data_file>.manifest.json   version, signature of <data_file>.json and
+                                    one entry per object: content hash, summary
+                                    fields, action ports and where its JSON is
+        <data_file>.objects         every object's canonical JSON, back to back
+    
+    While the data file's mtime and size (or content hash) match the manifest,
+    the data file is not parsed at all. When it changes, it is parsed once,
+    every object is hashed and compared with the previous manifest, and the
+    counts of added, removed, changed and unchanged objects are kept in
+    self.changes. Objects are keyed by id (image_path if they have none).
+    """
+    
+    def __init__(self, data_file):
+        """
+        Args:
+            data_file (str): Training data file, without the .json extension
+        """
+        self.source_path = data_file + ".json"
+        self.path = data_file + ".manifest.json"
+        self.objects_path = data_file + ".objects"
+        self.entries = []
+        self.changes = {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+        self.reparsed = False
+    
+    def load(self, full=False):
+        """
+        Open the manifest, rebuilding it if the data file changed.
+        
+        Args:
+            full (bool): Ignore the existing manifest and rebuild from scratch
+            
+        Returns:
+            list: LazyTrainingObject per training object, in data-file order
+        """
+        # A load that fails part way must not report the previous load's counts
+        self.changes = {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+        self.reparsed = False
+        stat = os.stat(self.source_path)
+        previous = None if full else self._read()
+        if previous is not None and (previous["source"]["mtime_ns"], previous["source"]["size"]) == \
+                (stat.st_mtime_ns, stat.st_size):
+            self.entries = previous["entries"]
+        else:
+            digest = _file_digest(self.source_path)
+            if previous is not None and previous["source"]["sha1"] == digest:
+                # Touched but identical: only the recorded signature is stale
+                self.entries = previous["entries"]
+                self._write(stat, digest, None)
+            else:
+                self._rebuild(previous, stat, digest)
+        if not self.reparsed:
+            self.changes = {"added": 0, "removed": 0, "changed": 0, "unchanged": len(self.entries)}
+        return [LazyTrainingObject(self, entry) for entry in self.entries]
+    
+    def load_object(self, entry):
+        """
+        Read one object's full JSON from the objects file.
+        
+        Raises:
+            ValueError: If the objects file was rebuilt since the entry was read
+        """
+        with open(self.objects_path, "rb") as f:
+            f.seek(entry["offset"])
+            blob = f.read(entry["length"])
+        if hashlib.sha1(blob).hexdigest() != entry["sha1"]:
+            raise ValueError(f"{self.objects_path} changed since its manifest was loaded")
+        return json.loads(blob.decode("utf-8"))
+    
+    def _read(self):
+        if not os.path.exists(self.path) or not os.path.exists(self.objects_path):
+            return None
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable training manifest {self.path}: {e}")
+            return None
+        if manifest.get("version") != TRAINING_MANIFEST_VERSION:
+            return None
+        return manifest
+    
+    def _rebuild(self, previous, stat, digest):
+        with open(self.source_path) as f:
+            objects = json.load(f).get("objects", [])
+        old = {}
+        if previous is not None:
+            for entry in previous["entries"]:
+                old[entry["key"]] = entry["sha1"]
+        
+        entries = []
+        blobs = []
+        offset = 0
+        changes = {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+        for obj in objects:
+            sha1, blob = _object_digest(obj)
+            key = json.dumps(obj.get("id", obj.get("image_path")))
+            if key not in old:
+                changes["added"] += 1
+            elif old.pop(key) == sha1:
+                changes["unchanged"] += 1
+            else:
+                changes["changed"] += 1
+            action = obj.get("sensor_data") or {}
+            entries.append({
+                "key": key,
+                "sha1": sha1,
+                "offset": offset,
+                "length": len(blob),
+                "summary": {k: obj[k] for k in MANIFEST_SUMMARY_KEYS if k in obj},
+                "ports": {k: action[k] for k in ACTION_PORT_KEYS if k in action}
+            })
+            blobs.append(blob)
+            offset += len(blob)
+        changes["removed"] = len(old)
+        
+        self.entries = entries
+        self.changes = changes
+        self.reparsed = True
+        self._write(stat, digest, blobs)
+    
+    def _write(self, stat, digest, blobs):
+        """
+        Write the manifest (and the objects file, unless blobs is None), each
+        replaced atomically, objects first so the manifest never points past it.
+        """
+        if blobs is not None:
+            with open(self.objects_path + ".tmp", "wb") as f:
+                for blob in blobs:
+                    f.write(blob)
+            os.replace(self.objects_path + ".tmp", self.objects_path)
+        manifest = {
+            "version": TRAINING_MANIFEST_VERSION,
+            "source": {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": digest},
+            "entries": self.entries
+        }
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class DeviceRegistry:
+    """
+    VEX IQ 2nd generation device handles keyed by port and device type.
+    
+    Each handle is created once, on first use, and reused for every frame.
+    A port can only ever hold one type of device: declaring it as a second
+    type raises ValueError.
+    """
+    
+    def __init__(self):
+        self.kinds = {}
+        self.motors = {}
+        self.sensors = {}
+    
+    def declare(self, kind, port):
+        """
+        Reserve a port for a device type.
+        
+        Args:
+            kind (str): "motor", "distance" or "color"
+            port: Smart port the device is plugged into
+        """
+        existing = self.kinds.setdefault(port, kind)
+        if existing != kind:
+            raise ValueError(f"Port {port} is configured as both a {existing} and a {kind} device")
+    
+    def declare_action(self, action_config):
+        """
+        Reserve the ports referenced by an object's sensor_data action.
+        
+        Args:
+            action_config (dict): sensor_data of a training object
+        """
+        if "motor_port" in action_config:
+            self.declare("motor", action_config["motor_port"])
+        if "distance_sensor_port" in action_config:
+            self.declare("distance", action_config["distance_sensor_port"])
+        if "color_sensor_port" in action_config:
+            self.declare("color", action_config["color_sensor_port"])
+    
+    def motor(self, port):
+        """
+        Return the Motor on a port, creating it the first time.
+        """
+        self.declare("motor", port)
+        if port not in self.motors:
+            self.motors[port] = Motor(port)
+        return self.motors[port]
+    
+    def sensor(self, kind, port):
+        """
+        Return the distance or color sensor on a port, creating it the first time.
+        """
+        self.declare(kind, port)
+        if port not in self.sensors:
+            self.sensors[port] = DistanceSensor(port) if kind == "distance" else ColorSensor(port)
+        return self.sensors[port]
+    
+    def snapshot(self):
+        """
+        Read every registered sensor once.
+        
+        Returns:
+            dict: Readings keyed by port ({"distance_mm"} or {"color_detected", "hue"})
+        """
+        readings = {}
+        for port, kind in self.kinds.items():
+            if kind == "distance":
+                readings[port] = {"distance_mm": self.sensor(kind, port).distance(MM)}
+            elif kind == "color":
+                color = self.sensor(kind, port)
+                readings[port] = {"color_detected": color.color(), "hue": color.hue()}
+        return readings
+
+
 class VEXImageMatcher:
     """
     Machine learning module for VEX IQ 2nd generation robotics that matches camera images
     to training data and integrates with VEX IQ 2nd gen sensors and motors.
     """
     
-    def __init__(self, data_file="match dataVEX", iq_brain=None):
+    def __init__(self, data_file="match dataVEX", iq_brain=None, backend="bruteforce", extractor=None,
+                 profile=False):
+        """
+        Initialize the VEX IQ 2nd Generation Image Matcher
+        
+        Args:
+            data_file (str): Path to the match dataVEX file containing training data
+            iq_brain: VEX IQ 2nd generation brain instance for sensor/motor control
+            backend: Matcher backend name from MATCHER_BACKENDS, or a backend instance
+            extractor (FeatureExtractor): Feature extractor (default: full-resolution SIFT)
+            profile (bool): Record per-stage timings from the start (see enable_profiling)
+        """
+        self.stats = PipelineStats(enabled=profile)
+        self.data_file = data_file
+        self.extractor = extractor or FeatureExtractor()
+        self.store_file = data_file + self.extractor.store_suffix()
+        self.manifest = TrainingManifest(data_file)
+        self.training_data = {"objects": []}
+        self.feature_store = None
+        self.descriptor_index = []
+        self.extracted = 0
+        self.reindex_stats = None
+        self.iq_brain = iq_brain
+        self.backend = MATCHER_BACKENDS[backend]() if isinstance(backend, str) else backend
+        
+        # VEX IQ 2nd generation device handles, created once per port
+        self.devices = DeviceRegistry()
+        self.motors = self.devices.motors
+        self.sensors = self.devices.sensors
+        
+        # Empty index until the first load succeeds
+        self._index_arrays()
+        self.backend.build(self.descriptor_index, self.extractor.norm_type)
+        self.reindex()
+    
+    def reindex(self, full=False):
+        """
+        Bring the training objects, feature store and matcher index up to date.
+        
+        Only objects whose data changed are re-read and only images whose
+        content changed are re-extracted; the result is the same as a full
+        rebuild, which full=True forces. If the data file cannot be read, the
+        previous objects, feature store and index are kept unchanged.
+        
+        Args:
+            full (bool): Ignore the manifest and feature store and rebuild everything
+            
+        Returns:
+            dict: loaded (False if the data file could not be read), objects, the
+                manifest's added/removed/changed/unchanged counts (all 0 when
+                nothing was loaded), extracted (images re-extracted) and seconds
+        """
+        start = time.perf_counter()
+        self.extracted = 0
+        loaded = self.load_training_data(full=full)
+        if loaded:
+            self.build_descriptor_index(full=full)
+            changes = self.manifest.changes
+        else:
+            changes = {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+        self.reindex_stats = dict(changes,
+                                  loaded=loaded,
+                                  objects=len(self.training_data["objects"]),
+                                  extracted=self.extracted,
+                                  seconds=time.perf_counter() - start)
+        return self.reindex_stats
+    
+    def load_training_data(self, full=False):
+        """
+        Load the training objects from the match dataVEX file through its manifest.
+        
+        Only the manifest is read while the data file is unchanged; each
+        object's full data (e.g. sensor_data) is read the first time it is used.
+        The manifest and device registry are rebuilt on every load and only
+        replace the current ones once the whole load succeeded, so a port that
+        changed device type is not reported as a conflict with the old data.
+        
+        Args:
+            full (bool): Rebuild the manifest even if it is current
+            
+        Returns:
+            bool: False if the data file could not be read; the previous
+                training data is then kept
+            
+        Raises:
+            ValueError: If the training data uses one port for two device types
+        """
+        manifest = TrainingManifest(self.data_file)
+        try:
+            if os.path.exists(self.data_file + ".json"):
+                objects = manifest.load(full=full)
+                if manifest.reparsed:
+                    print(f"Loaded training data from {self.data_file}.json")
+            else:
+                print(f"Warning: {self.data_file} not found. Initialize with empty data.")
+                objects = []
+        except Exception as e:
+            print(f"Error loading training data: {e}")
+            return False
+        
+        # Port conflicts in the training data are configuration errors: fail now, not mid-match
+        devices = DeviceRegistry()
+        for obj in objects:
+            devices.declare_action(obj.ports)
+        
+        self.manifest = manifest
+        self.training_data = {"objects": objects}
+        self.devices = devices
+        self.motors = devices.motors
+        self.sensors = devices.sensors
+        return True
+    
+    def build_descriptor_index(self, full=False):
+        """
+        Open the feature store for the training objects, rebuilding it if stale.
+        
+        The store is reused as-is when every training image is unchanged (same
+        mtime and size, or same content hash). Otherwise only the changed images
+        are re-extracted and the store is rewritten. No store is created while
+        there are no training images.
+        
+        Args:
+            full (bool): Re-extract every image even if the store is current
+        
+        Returns:
+            list: One entry per training object with an image_path
+        """
+        image_paths = self._training_image_paths()
+        self.extracted = 0
+        # Without training images there is nothing to store; do not create one
+        store = self._open_feature_store() if image_paths else None
+        
+        if full and store is not None:
+            store.close()
+            store = None
+        if image_paths and (store is None or not self._feature_store_is_current(store, image_paths)):
+            self.build_feature_store(previous=store)
+            store = self._open_feature_store()
+        
+        self.feature_store = store
+        self.descriptor_index = []
+        if store is not None:
+            rows = {record["image_path"]: i for i, record in enumerate(store.objects)}
+            for obj in self.training_data.get("objects", []):
+                if "image_path" not in obj:
+                    continue
+                row = rows[obj["image_path"]]
+                self.descriptor_index.append({
+                    "object": obj,
+                    "num_keypoints": store.objects[row]["num_keypoints"],
+                    "histogram": store.histograms[row],
+                    "descriptors": store.descriptors_for(row)
+                })
+        
+        self._index_arrays()
+        self.backend.build(self.descriptor_index, self.extractor.norm_type)
+        return self.descriptor_index
+    
+    def _index_arrays(self):
+        """
+        Cache per-entry keypoint counts and descriptor presence as arrays for batch scoring.
+        """
+        self.num_kp_train = np.array([entry["num_keypoints"] for entry in self.descriptor_index], dtype=np.int64)
+        self.has_descriptors = np.array([entry["descriptors"] is not None for entry in self.descriptor_index],
+                                        dtype=bool)
+        self.histograms = np.array([entry["histogram"] for entry in self.descriptor_index],
+                                   dtype=np.float32).reshape(-1, HISTOGRAM_BINS)
+    
+    def set_matcher_backend(self, backend):
         """
-        Initialize the VEX IQ 2nd Generation Image Matcher
+        Switch the matcher backend and build it over the current descriptor index.
         
         Args:
-            data_file (str): Path to the match dataVEX file containing training data
-            iq_brain: VEX IQ 2nd generation brain instance for sensor/motor control
+            backend: Backend name from MATCHER_BACKENDS, or a backend instance
         """
-        self.data_file = data_file
-        self.training_data = {}
-        self.iq_brain = iq_brain
-        self.load_training_data()
-        self.sift = cv2.SIFT_create()
+        self.backend = MATCHER_BACKENDS[backend]() if isinstance(backend, str) else backend
+        self.backend.build(self.descriptor_index, self.extractor.norm_type)
+    
+    def build_feature_store(self, previous=None):
+        """
+        Extract features for all training images and write the feature store.
         
-        # VEX IQ 2nd generation device placeholders
-        self.motors = {}
-        self.sensors = {}
+        Args:
+            previous (FeatureStore): Existing store whose still-valid entries are
+                reused instead of being re-extracted
+            
+        Returns:
+            str: Path of the written feature store
+        """
+        reusable = {}
+        if previous is not None and previous.header.get("extractor") == self.extractor.config():
+            for i, record in enumerate(previous.objects):
+                reusable[record["image_path"]] = (i, record)
+        
+        records = []
+        for image_path in self._training_image_paths():
+            row, record = reusable.get(image_path, (None, None))
+            record = self._cached_features(image_path, record)
+            if record is not None:
+                # Copy out of the old mapping so it can be released before the rewrite
+                record = dict(record,
+                              histogram=np.array(previous.histograms[row]),
+                              keypoints=np.array(previous.keypoints_for(row)),
+                              descriptors=previous.descriptors_for(row))
+                if record["descriptors"] is not None:
+                    record["descriptors"] = np.array(record["descriptors"])
+            else:
+                record = self._extract_cache_entry(image_path)
+                self.extracted += 1
+            records.append(record)
+        
+        # Release every mapping of the old file before it is replaced, including
+        # the views the index arrays and the backend still hold
+        for store in (previous, self.feature_store):
+            if store is not None:
+                store.close()
+        self.feature_store = None
+        self.descriptor_index = []
+        self._index_arrays()
+        self.backend.build(self.descriptor_index, self.extractor.norm_type)
         
-    def load_training_data(self):
+        FeatureStore.write(self.store_file, records, self.extractor.descriptor_size,
+                           self.extractor.descriptor_dtype, self.extractor.config())
+        return self.store_file
+    
+    def _training_image_paths(self):
+        """
+        Return the distinct training image paths in data-file order.
+        
+        Returns:
+            list: Image paths referenced by the training objects
         """
-        Load training data from the match dataVEX file.
-        Supports JSON and CSV formats.
+        image_paths = []
+        for obj in self.training_data.get("objects", []):
+            if "image_path" in obj and obj["image_path"] not in image_paths:
+                image_paths.append(obj["image_path"])
+        return image_paths
+    
+    def _open_feature_store(self):
+        """
+        Memory-map the feature store next to the data file.
+        
+        Returns:
+            FeatureStore: The opened store, or None if missing or unreadable
         """
+        if not os.path.exists(self.store_file):
+            return None
         try:
-            if os.path.exists(self.data_file + ".json"):
-                with open(self.data_file + ".json", 'r') as f:
-                    self.training_data = json.load(f)
-                print(f"Loaded training data from {self.data_file}.json")
-            else:
-                print(f"Warning: {self.data_file} not found. Initialize with empty data.")
-                self.training_data = {"objects": []}
+            return FeatureStore(self.store_file)
         except Exception as e:
-            print(f"Error loading training data: {e}")
-            self.training_data = {"objects": []}
+            print(f"Warning: ignoring unreadable feature store {self.store_file}: {e}")
+            return None
+    
+    def _feature_store_is_current(self, store, image_paths):
+        """
+        Check that a feature store covers exactly the given, unchanged images.
+        
+        Args:
+            store (FeatureStore): Opened feature store
+            image_paths (list): Training image paths in data-file order
+            
+        Returns:
+            bool: True if the store can be used without rebuilding
+        """
+        if store.header.get("extractor") != self.extractor.config():
+            return False
+        if [record["image_path"] for record in store.objects] != image_paths:
+            return False
+        for record in store.objects:
+            current = self._cached_features(record["image_path"], record)
+            if current is None or current["mtime_ns"] != record["mtime_ns"]:
+                return False
+        return True
+    
+    def _cached_features(self, image_path, entry):
+        """
+        Return the stored record for an image if it is still valid.
+        
+        Args:
+            image_path (str): Path to the training image
+            entry (dict): Stored record for the image, or None
+            
+        Returns:
+            dict: Valid record (possibly with a refreshed mtime), or None
+        """
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            # Still missing: keep the empty record rather than retrying on every start
+            return entry if entry["mtime_ns"] is None else None
+        
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+        
+        # Touched but possibly identical content; only re-extract if the bytes changed
+        if entry["size"] == stat.st_size and entry["sha1"] == _file_digest(image_path):
+            return dict(entry, mtime_ns=stat.st_mtime_ns)
+        return None
+    
+    def _extract_cache_entry(self, image_path):
+        """
+        Extract features for a training image and wrap them as a store record.
+        
+        Args:
+            image_path (str): Path to the training image
+            
+        Returns:
+            dict: Record with file signature, keypoints and descriptors
+        """
+        keypoints, descriptors, image = self.extract_image_features(image_path)
+        try:
+            stat = os.stat(image_path)
+            record = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                      "sha1": _file_digest(image_path)}
+        except OSError:
+            record = {"mtime_ns": None, "size": None, "sha1": None}
+        
+        record["image_path"] = image_path
+        record["num_keypoints"] = len(keypoints) if keypoints else 0
+        record["histogram"] = global_histogram(image)
+        record["keypoints"] = _keypoints_to_array(keypoints)
+        record["descriptors"] = descriptors
+        return record
     
     def extract_image_features(self, image_path):
         """
-        Extract SIFT features from an image.
+        Extract features from an image file with the configured extractor.
         
         Args:
             image_path (str): Path to the image file
@@ -60,84 +1355,249 @@ class VEXImageMatcher:
             tuple: (keypoints, descriptors, image)
         """
         try:
-            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            with self.stats.stage("decode"):
+                image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
             if image is None:
                 print(f"Error: Could not load image from {image_path}")
                 return None, None, None
-                
-            keypoints, descriptors = self.sift.detectAndCompute(image, None)
-            return keypoints, descriptors, image
+            
+            return self.extract_frame_features(image)
         except Exception as e:
             print(f"Error extracting features: {e}")
             return None, None, None
     
-    def match_image_to_data(self, image_path, confidence_threshold=0.7):
+    def extract_frame_features(self, frame):
+        """
+        Extract features from an in-memory frame with the configured extractor.
+        
+        Args:
+            frame (np.ndarray): Grayscale or BGR image
+            
+        Returns:
+            tuple: (keypoints, descriptors, grayscale image)
+        """
+        with self.stats.stage("extract"):
+            image = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            keypoints, descriptors = self.extractor.detect_and_compute(image)
+        return keypoints, descriptors, image
+    
+    def match_image_to_data(self, image_path, confidence_threshold=0.7, top_k=None, first_confident=False):
         """
         Match an image against training data using feature matching.
         
         Args:
-            image_path (str): Path to the camera image to analyze
+            image_path: Path to the camera image to analyze, or the frame itself as an ndarray
             confidence_threshold (float): Minimum confidence for a match
+            top_k (int): Only find the K best matches, skipping candidates that
+                cannot beat them (None scores every object)
+            first_confident (bool): With top_k, stop at the first K candidates in
+                prefilter order that pass the threshold (see match_features)
             
         Returns:
             dict: Matching results with object info and confidence scores
         """
-        kp_test, desc_test, img_test = self.extract_image_features(image_path)
+        if isinstance(image_path, np.ndarray):
+            kp_test, desc_test, img_test = self.extract_frame_features(image_path)
+        else:
+            kp_test, desc_test, img_test = self.extract_image_features(image_path)
+        return self.match_features(kp_test, desc_test, confidence_threshold, top_k=top_k, image=img_test,
+                                   first_confident=first_confident)
+    
+    def match_features(self, kp_test, desc_test, confidence_threshold=0.7, top_k=None, image=None,
+                       first_confident=False):
+        """
+        Match already-extracted query features against the training data.
+        
+        With top_k, candidates are scored in order of histogram similarity to
+        the query image and scoring stops once K objects pass the threshold
+        and no remaining candidate's best possible confidence could beat the
+        K-th of them. The best possible confidence of an object is
+        num_query / max(num_train, num_query), since every good match uses a
+        distinct query descriptor.
+        
+        That bound is loose (real confidences sit well below it), so the exact
+        mode rarely skips anything. With first_confident, scoring instead stops
+        as soon as K candidates in prefilter order pass the threshold: the
+        results are the K most similar-looking confident objects, not
+        necessarily the K most confident ones, in exchange for skipping the rest.
         
+        Args:
+            kp_test (list): Query keypoints
+            desc_test (np.ndarray): Query descriptors (None if extraction failed)
+            confidence_threshold (float): Minimum confidence for a match
+            top_k (int): Number of best matches wanted (None scores every object)
+            image (np.ndarray): Grayscale query image, used to order candidates for top_k
+            first_confident (bool): With top_k, stop at the first K confident
+                candidates in prefilter order
+            
+        Returns:
+            dict: Matching results with object info and confidence scores; with
+                top_k also candidates_scored and candidates_skipped
+        """
         if desc_test is None:
             return {"matched": False, "error": "Could not extract features"}
         
-        matches_found = []
+        if top_k is not None and self.backend.incremental:
+            # Records its own match and score stages
+            selected, good_matches, confidence, skipped = self._score_top_k(
+                kp_test, desc_test, confidence_threshold, top_k, image, first_confident)
+        else:
+            with self.stats.stage("match"):
+                nearest, second = self.backend.knn_distances(desc_test)
+            with self.stats.stage("score"):
+                good_matches, confidence = score_matches(nearest, second, self.num_kp_train, len(kp_test))
+                
+                # Only objects with descriptors that reach the threshold become results
+                selected = np.nonzero(self.has_descriptors & (confidence >= confidence_threshold))[0]
+            skipped = 0
         
-        # Match against each training image/object
-        if "objects" in self.training_data:
-            for obj in self.training_data["objects"]:
-                if "image_path" in obj:
-                    kp_train, desc_train, img_train = self.extract_image_features(obj["image_path"])
-                    
-                    if desc_train is not None:
-                        # Use BFMatcher for feature matching
-                        bf = cv2.BFMatcher()
-                        matches = bf.knnMatch(desc_test, desc_train, k=2)
-                        
-                        # Apply Lowe's ratio test
-                        good_matches = []
-                        if matches:
-                            for match_pair in matches:
-                                if len(match_pair) == 2:
-                                    m, n = match_pair
-                                    if m.distance < 0.75 * n.distance:
-                                        good_matches.append(m)
-                        
-                        # Calculate confidence
-                        confidence = len(good_matches) / max(len(kp_train), len(kp_test), 1) if kp_train and kp_test else 0
-                        
-                        if confidence >= confidence_threshold:
-                            matches_found.append({
-                                "object_id": obj.get("id", "unknown"),
-                                "object_name": obj.get("name", "unknown"),
-                                "confidence": min(confidence, 1.0),
-                                "good_matches": len(good_matches),
-                                "sensor_data": obj.get("sensor_data", {})
-                            })
+        matches_found = []
+        for i in selected:
+            obj = self.descriptor_index[i]["object"]
+            matches_found.append({
+                "object_id": obj.get("id", "unknown"),
+                "object_name": obj.get("name", "unknown"),
+                "confidence": min(float(confidence[i]), 1.0),
+                "good_matches": int(good_matches[i]),
+                "sensor_data": obj.get("sensor_data", {})
+            })
         
         # Sort by confidence
         matches_found.sort(key=lambda x: x["confidence"], reverse=True)
         
-        return {
+        results = {
             "matched": len(matches_found) > 0,
             "best_match": matches_found[0] if matches_found else None,
             "all_matches": matches_found,
             "total_matches": len(matches_found)
         }
+        if top_k is not None:
+            del matches_found[top_k:]
+            results["total_matches"] = len(matches_found)
+            results["candidates_skipped"] = skipped
+            results["candidates_scored"] = int(self.has_descriptors.sum()) - skipped
+        return results
+    
+    def _score_top_k(self, kp_test, desc_test, confidence_threshold, top_k, image, first_confident=False):
+        """
+        Score candidates one at a time in prefilter order until the top K are settled.
+        
+        Matching and scoring alternate per candidate, so while profiling the
+        k-NN time is summed into one "match" sample and everything else
+        (prefilter, scoring, selection) into one "score" sample per query,
+        as on the full-scoring path.
+        
+        Returns:
+            tuple: (selected indices, good matches, confidence, number of candidates skipped);
+                good matches and confidence are full-length arrays, valid for selected indices
+        """
+        timed = self.stats.enabled
+        start = time.perf_counter() if timed else 0.0
+        match_seconds = 0.0
+        num_query = len(kp_test)
+        good_matches = np.zeros(len(self.descriptor_index), dtype=np.int64)
+        confidence = np.zeros(len(self.descriptor_index))
+        
+        bound = np.where(self.num_kp_train > 0,
+                         np.minimum(num_query / np.maximum(np.maximum(self.num_kp_train, num_query), 1), 1.0),
+                         0.0)
+        candidates = np.nonzero(self.has_descriptors & (bound >= confidence_threshold))[0]
+        if image is not None and len(candidates):
+            similarity = np.minimum(self.histograms[candidates], global_histogram(image)).sum(axis=1)
+            candidates = candidates[np.argsort(-similarity, kind="stable")]
+        
+        # Best confidence any not-yet-scored candidate could still reach
+        remaining_bound = np.maximum.accumulate(bound[candidates][::-1])[::-1]
+        
+        passing = []
+        scored = 0
+        for position, i in enumerate(candidates):
+            if timed:
+                match_start = time.perf_counter()
+                nearest, second = self.backend.knn_distances(desc_test, subset=[i])
+                match_seconds += time.perf_counter() - match_start
+            else:
+                nearest, second = self.backend.knn_distances(desc_test, subset=[i])
+            good, conf = score_matches(nearest, second, self.num_kp_train[i:i + 1], num_query)
+            good_matches[i], confidence[i] = good[0], conf[0]
+            scored += 1
+            if conf[0] >= confidence_threshold:
+                passing.append(i)
+                passing.sort(key=lambda j: confidence[j], reverse=True)
+                del passing[top_k:]
+            
+            more = position + 1 < len(candidates)
+            if len(passing) == top_k and (first_confident or not more
+                                          or remaining_bound[position + 1] <= confidence[passing[-1]]):
+                break
+        
+        skipped = int(self.has_descriptors.sum()) - scored
+        if timed:
+            self.stats.record("match", match_seconds)
+            self.stats.record("score", time.perf_counter() - start - match_seconds)
+        return passing, good_matches, confidence, skipped
+    
+    def compare_matcher_backends(self, image_paths, backends=("flann",)):
+        """
+        Compare approximate backends against brute force for recall and speed.
+        
+        Recall is the fraction of brute-force good matches (summed over frames
+        and objects) that a backend also finds; best-match agreement is the
+        fraction of frames whose highest-scoring object is the same.
+        
+        Args:
+            image_paths (list): Query images to evaluate
+            backends (tuple): Backend names or instances to compare
+            
+        Returns:
+            dict: Per backend name, ms_per_frame, recall and best_match_agreement
+        """
+        queries = []
+        for image_path in image_paths:
+            kp, desc, img = self.extract_image_features(image_path)
+            if desc is not None:
+                queries.append(desc)
+        
+        def run(backend):
+            backend.build(self.descriptor_index, self.extractor.norm_type)
+            start = time.perf_counter()
+            counts = [score_matches(*backend.knn_distances(desc), self.num_kp_train, len(desc))[0]
+                      for desc in queries]
+            elapsed = time.perf_counter() - start
+            return counts, 1000.0 * elapsed / max(len(queries), 1)
+        
+        exact, exact_ms = run(BruteForceBackend())
+        report = {BruteForceBackend.name: {"ms_per_frame": exact_ms, "recall": 1.0,
+                                           "best_match_agreement": 1.0}}
+        
+        for backend in backends:
+            backend = MATCHER_BACKENDS[backend]() if isinstance(backend, str) else backend
+            approx, approx_ms = run(backend)
+            found = total = agree = 0
+            for exact_frame, approx_frame in zip(exact, approx):
+                total += exact_frame.sum()
+                found += np.minimum(exact_frame, approx_frame).sum()
+                if len(exact_frame):
+                    agree += int(np.argmax(exact_frame) == np.argmax(approx_frame))
+            report[backend.name] = {
+                "ms_per_frame": approx_ms,
+                "recall": float(found / total) if total else 1.0,
+                "best_match_agreement": agree / len(queries) if queries else 1.0
+            }
+        
+        self.backend.build(self.descriptor_index, self.extractor.norm_type)
+        return report
     
-    def integrate_sensor_data(self, matched_object):
+    def integrate_sensor_data(self, matched_object, snapshot=None):
         """
         Integrate sensor readings with matched object data for VEX IQ 2nd generation.
         This interfaces with VEX IQ 2nd gen motors, distance sensors, color sensors, etc.
+        Device handles come from self.devices and are reused across frames.
         
         Args:
             matched_object (dict): Object data from match_image_to_data
+            snapshot (dict): Sensor readings from self.devices.snapshot() for this
+                frame (taken here if not given)
             
         Returns:
             dict: Integrated sensor and vision data
@@ -157,22 +1617,27 @@ class VEXImageMatcher:
         
         if self.iq_brain is not None:
             try:
+                # Validates this action's ports against every device already in use
+                self.devices.declare_action(action_config)
+                
                 # Example: Control motors on VEX IQ 2nd generation
                 if "motor_port" in action_config and "power" in action_config:
-                    motor = Motor(action_config["motor_port"])
+                    motor = self.devices.motor(action_config["motor_port"])
                     motor.spin(FORWARD, action_config["power"], PERCENT)
                 
+                # One read of every registered sensor per frame
+                if snapshot is None:
+                    snapshot = self.devices.snapshot()
+                
                 # Example: Read distance sensor data
                 if "distance_sensor_port" in action_config:
-                    distance = DistanceSensor(action_config["distance_sensor_port"])
-                    distance_reading = distance.distance(MM)
-                    result["distance_mm"] = distance_reading
+                    result["distance_mm"] = snapshot[action_config["distance_sensor_port"]]["distance_mm"]
                 
                 # Example: Read color sensor data
                 if "color_sensor_port" in action_config:
-                    color = ColorSensor(action_config["color_sensor_port"])
-                    result["color_detected"] = color.color()
-                    result["hue"] = color.hue()
+                    reading = snapshot[action_config["color_sensor_port"]]
+                    result["color_detected"] = reading["color_detected"]
+                    result["hue"] = reading["hue"]
                 
                 result["vex_iq_status"] = "Commands sent to VEX IQ 2nd generation brain"
                 
@@ -183,25 +1648,616 @@ class VEXImageMatcher:
         
         return result
     
-    def process_camera_stream(self, image_path):
+    def process_camera_stream(self, image_path, top_k=None, first_confident=False):
         """
         Process a single camera frame and return matched results.
+        For continuous camera input use stream_camera instead.
         
         Args:
-            image_path (str): Path to camera image
+            image_path: Path to camera image, or the frame itself as an ndarray
+            top_k (int): Only find the K best matches (1 is enough for best_match)
+            first_confident (bool): With top_k, stop at the first K confident
+                candidates in prefilter order
             
         Returns:
             dict: Processed results with best match and sensor integration
         """
-        # Match image to training data
-        match_results = self.match_image_to_data(image_path)
-        
+        with self.stats.stage("total"):
+            # Match image to training data
+            match_results = self.match_image_to_data(image_path, top_k=top_k, first_confident=first_confident)
+            return self._integrate_match(match_results)
+    
+    def _integrate_match(self, match_results):
         if match_results["matched"]:
             # Integrate with VEX sensors
-            sensor_integration = self.integrate_sensor_data(match_results["best_match"])
+            with self.stats.stage("sensors"):
+                sensor_integration = self.integrate_sensor_data(match_results["best_match"])
             match_results["sensor_integration"] = sensor_integration
         
         return match_results
+    
+    def enable_profiling(self, log_path=None):
+        """
+        Start recording per-stage timings (decode, extract, match, score, sensors, total).
+        
+        Args:
+            log_path (str): Optional JSON Lines file receiving every sample
+        """
+        self.stats.enable(log_path)
+    
+    def disable_profiling(self):
+        """
+        Stop recording per-stage timings; statistics collected so far are kept.
+        """
+        self.stats.disable()
+    
+    def get_stats(self):
+        """
+        Return per-stage latency statistics.
+        
+        Returns:
+            dict: Per stage, count, mean_ms, p50_ms, p95_ms, p99_ms and max_ms
+        """
+        return self.stats.summary()
+    
+    def reset_stats(self):
+        """
+        Discard the per-stage latency statistics collected so far.
+        """
+        self.stats.reset()
+    
+    def stream_camera(self, source, confidence_threshold=0.7, queue_size=2, drop_stale=True, top_k=None,
+                      integrate=True):
+        """
+        Match a stream of frames, pipelining decode, feature extraction and matching.
+        
+        Decoding and extraction each run in their own thread and hand frames on
+        through bounded queues. With drop_stale, a full queue discards its oldest
+        frame, so when matching falls behind the results skip ahead to recent
+        frames instead of building up latency.
+        
+        Args:
+            source: Anything accepted by iter_frames (camera index, cv2.VideoCapture,
+                video file, image directory, or an iterable of frames / image paths)
+            confidence_threshold (float): Minimum confidence for a match
+            queue_size (int): Capacity of each inter-stage queue
+            drop_stale (bool): Drop the oldest queued frame instead of blocking
+                (use False for offline sources where every frame must be scored)
+            top_k (int): Only find the K best matches per frame
+            integrate (bool): Act on each best match with integrate_sensor_data;
+                False only matches, for callers that actuate elsewhere
+            
+        Yields:
+            dict: Results as from process_camera_stream, plus frame_index,
+                captured_at (time.perf_counter() when the frame was decoded),
+                latency_ms (decode to result) and frames_dropped (so far)
+        """
+        decoded = queue.Queue(maxsize=queue_size)
+        extracted = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        dropped = [0]
+        
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.05)
+                    return
+                except queue.Full:
+                    # Only frames are ever discarded, never end-of-stream or errors
+                    if drop_stale and isinstance(item, tuple):
+                        try:
+                            q.get_nowait()
+                            dropped[0] += 1
+                        except queue.Empty:
+                            pass
+        
+        def decode_stage():
+            frames = iter_frames(source)
+            try:
+                requested = time.perf_counter()
+                for index, frame in enumerate(frames):
+                    if stop.is_set():
+                        return
+                    decoded_at = time.perf_counter()
+                    self.stats.record("decode", decoded_at - requested)
+                    put(decoded, (index, decoded_at, frame))
+                    requested = time.perf_counter()
+                put(decoded, _END_OF_STREAM)
+            except Exception as e:
+                put(decoded, e)
+            finally:
+                frames.close()
+        
+        def extract_stage():
+            while not stop.is_set():
+                try:
+                    item = decoded.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if not isinstance(item, tuple):
+                    put(extracted, item)
+                    return
+                index, started, frame = item
+                try:
+                    keypoints, descriptors, image = self.extract_frame_features(frame)
+                except Exception as e:
+                    put(extracted, e)
+                    return
+                put(extracted, (index, started, keypoints, descriptors, image))
+        
+        workers = [threading.Thread(target=decode_stage, daemon=True),
+                   threading.Thread(target=extract_stage, daemon=True)]
+        for worker in workers:
+            worker.start()
+        
+        try:
+            while True:
+                item = extracted.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                index, started, keypoints, descriptors, image = item
+                results = self.match_features(keypoints, descriptors, confidence_threshold, top_k=top_k, image=image)
+                if integrate:
+                    results = self._integrate_match(results)
+                results["frame_index"] = index
+                results["captured_at"] = started
+                latency = time.perf_counter() - started
+                self.stats.record("end_to_end", latency)
+                results["latency_ms"] = 1000.0 * latency
+                results["frames_dropped"] = dropped[0]
+                yield results
+        finally:
+            stop.set()
+
+
+class LatestValue:
+    """
+    Single-slot mailbox holding only the most recently published value.
+    
+    publish() replaces one attribute with a new (sequence, published_at,
+    value) tuple and read() returns that attribute, so with the GIL neither
+    side takes a lock or waits for the other, and a reader always sees a
+    consistent tuple. Values published between two reads are simply skipped.
+    """
+    
+    def __init__(self):
+        self._slot = (0, None, None)
+    
+    def publish(self, value, published_at=None):
+        """
+        Make value the latest one.
+        
+        Args:
+            value: Anything; it must not be modified after publishing
+            published_at (float): time.perf_counter() timestamp the value's age
+                is measured from (default: now)
+        """
+        sequence = self._slot[0] + 1
+        self._slot = (sequence, time.perf_counter() if published_at is None else published_at, value)
+    
+    def read(self):
+        """
+        Return (sequence, published_at, value); sequence is 0 until the first publish.
+        """
+        return self._slot
+
+
+class VisionActuationBridge:
+    """
+    Decouples image matching from motor control.
+    
+    A matcher thread runs VEXImageMatcher.stream_camera without acting on the
+    results and publishes each one into a LatestValue slot, stamped with the
+    time its frame was decoded. A separate actuator thread wakes every
+    period_ms against a fixed deadline, reads the slot and acts on a result it
+    has not used yet through integrate_sensor_data, so a slow match delays
+    only how fresh the vision data is, never the control loop itself.
+    
+    Every command records the age of the vision data it used (frame decode to
+    command). A result older than the age limit is not acted on, and once the
+    latest result goes stale the motors the bridge drove are stopped. By
+    default the limit follows the measured match latency (decode to result,
+    queueing included): AGE_LATENCY_FACTOR times its running mean plus one
+    actuator period, so a slow extractor still gets to act while a stalled
+    matcher is still noticed.
+    """
+    
+    AGE_LATENCY_FACTOR = 2.0
+    LATENCY_SMOOTHING = 0.2
+    
+    def __init__(self, matcher, source, period_ms=20, confidence_threshold=0.7, top_k=1, max_age_ms=None,
+                 history=256):
+        """
+        Args:
+            matcher (VEXImageMatcher): Matcher to run and actuate through
+            source: Frame source, anything accepted by iter_frames
+            period_ms (float): Actuator loop period
+            confidence_threshold (float): Minimum confidence for a match
+            top_k (int): Only find the K best matches per frame (1 is enough to act)
+            max_age_ms (float): Vision results older than this are not acted on
+                (default: derived from the measured match latency)
+            history (int): Number of recent commands kept in self.commands
+        """
+        self.matcher = matcher
+        self.source = source
+        self.period_ms = period_ms
+        self.confidence_threshold = confidence_threshold
+        self.top_k = top_k
+        self.max_age_ms = max_age_ms
+        self.latest = LatestValue()
+        self.commands = collections.deque(maxlen=history)
+        self.error = None
+        self._stop = threading.Event()
+        self._threads = []
+        self.reset_stats()
+    
+    def reset_stats(self):
+        self.frames = 0
+        self.latency_ms = None
+        self.ticks = 0
+        self.overruns = 0
+        self.jitter_max_ms = 0.0
+        self.command_count = 0
+        self.age_total_ms = 0.0
+        self.age_max_ms = 0.0
+        self.stale_skipped = 0
+        self.stops = 0
+    
+    def start(self):
+        """
+        Start the matcher and actuator threads.
+        """
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._match_loop, daemon=True),
+                         threading.Thread(target=self._actuate_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+    
+    def stop(self, timeout=2.0):
+        """
+        Stop both threads and wait for them to finish.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    @property
+    def matching(self):
+        """
+        True while the matcher thread still has frames to match.
+        """
+        return bool(self._threads) and self._threads[0].is_alive()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+    
+    def _match_loop(self):
+        frames = self.matcher.stream_camera(self.source, self.confidence_threshold, drop_stale=True,
+                                            top_k=self.top_k, integrate=False)
+        try:
+            for results in frames:
+                if self.latency_ms is None:
+                    self.latency_ms = results["latency_ms"]
+                else:
+                    self.latency_ms += self.LATENCY_SMOOTHING * (results["latency_ms"] - self.latency_ms)
+                self.latest.publish(results, results["captured_at"])
+                self.frames += 1
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            frames.close()
+    
+    def _actuate_loop(self):
+        period = self.period_ms / 1000.0
+        deadline = time.perf_counter()
+        used = 0
+        acting = False
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if deadline > now:
+                time.sleep(deadline - now)
+                now = time.perf_counter()
+            self.jitter_max_ms = max(self.jitter_max_ms, 1000.0 * (now - deadline))
+            
+            sequence, captured_at, results = self.latest.read()
+            if sequence:
+                age_ms = 1000.0 * (now - captured_at)
+                if age_ms > self.age_limit_ms():
+                    if sequence != used:
+                        self.stale_skipped += 1
+                        used = sequence
+                    if acting:
+                        self._stop_motors()
+                        acting = False
+                elif sequence != used:
+                    used = sequence
+                    if results["matched"]:
+                        self._command(results, age_ms)
+                        acting = True
+            
+            self.ticks += 1
+            deadline += period
+            end = time.perf_counter()
+            if end > deadline:
+                # Skip the missed periods instead of running them back to back
+                self.overruns += 1
+                deadline += period * math.ceil((end - deadline) / period)
+        if acting:
+            self._stop_motors()
+    
+    def age_limit_ms(self):
+        """
+        Return the age above which a vision result is no longer acted on.
+        """
+        if self.max_age_ms is not None:
+            return self.max_age_ms
+        return self.AGE_LATENCY_FACTOR * (self.latency_ms or 0.0) + self.period_ms
+    
+    def _command(self, results, age_ms):
+        with self.matcher.stats.stage("sensors"):
+            integration = self.matcher.integrate_sensor_data(results["best_match"])
+        self.matcher.stats.record("vision_age", age_ms / 1000.0)
+        self.command_count += 1
+        self.age_total_ms += age_ms
+        self.age_max_ms = max(self.age_max_ms, age_ms)
+        self.commands.append({
+            "frame_index": results["frame_index"],
+            "object_id": results["best_match"]["object_id"],
+            "vision_age_ms": age_ms,
+            "status": integration.get("vex_iq_status")
+        })
+    
+    def _stop_motors(self):
+        for motor in self.matcher.devices.motors.values():
+            motor.stop()
+        self.stops += 1
+    
+    def summary(self):
+        """
+        Summarize the run so far.
+        
+        Returns:
+            dict: frames matched with their mean match latency, actuator ticks,
+                overruns and worst jitter, commands sent with their mean and
+                max vision age, the age limit, stale results skipped and motor
+                stops
+        """
+        return {
+            "frames_matched": self.frames,
+            "match_latency_ms": self.latency_ms or 0.0,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "jitter_max_ms": self.jitter_max_ms,
+            "commands": self.command_count,
+            "vision_age_mean_ms": self.age_total_ms / self.command_count if self.command_count else 0.0,
+            "vision_age_max_ms": self.age_max_ms,
+            "max_age_ms": self.age_limit_ms(),
+            "stale_skipped": self.stale_skipped,
+            "motor_stops": self.stops
+        }
+
+
+# Per-process matcher used by batch_match_images workers
+_batch_matcher = None
+_batch_threshold = 0.7
+
+
+def _init_batch_worker(data_file, backend, confidence_threshold, extractor_config):
+    """
+    Process-pool initializer: open the shared feature store once per worker.
+    """
+    global _batch_matcher, _batch_threshold
+    # One OpenCV thread per worker; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    _batch_matcher = VEXImageMatcher(data_file, backend=backend,
+                                     extractor=FeatureExtractor(**extractor_config))
+    _batch_threshold = confidence_threshold
+
+
+def _match_batch_frame(image_path):
+    """
+    Process-pool task: match one image with the worker's matcher.
+    """
+    start = time.perf_counter()
+    results = _batch_matcher.match_image_to_data(image_path, _batch_threshold)
+    results["image_path"] = image_path
+    results["elapsed_ms"] = 1000.0 * (time.perf_counter() - start)
+    return results
+
+
+def expand_image_paths(paths):
+    """
+    Expand directories into the image files they contain (in name order).
+    
+    Args:
+        paths (list): Image files and/or directories
+        
+    Returns:
+        list: Image file paths
+    """
+    image_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            image_paths.extend(str(p) for p in sorted(Path(path).iterdir())
+                               if p.suffix.lower() in IMAGE_EXTENSIONS)
+        else:
+            image_paths.append(path)
+    return image_paths
+
+
+def batch_match_images(image_paths, output_path, data_file="match dataVEX", workers=None,
+                       backend="bruteforce", confidence_threshold=0.7, chunksize=4, extractor=None):
+    """
+    Match many images in parallel across a process pool and write JSON Lines.
+    
+    The feature store is built (if stale) once in the calling process; every
+    worker then memory-maps the same file, so training descriptors are shared
+    rather than copied or re-extracted per worker.
+    
+    Args:
+        image_paths (list): Images to match
+        output_path (str): JSON Lines file to write, one result per image in input order
+        data_file (str): Training data file, without the .json extension
+        workers (int): Number of worker processes (default: CPU count)
+        backend (str): Matcher backend name from MATCHER_BACKENDS
+        confidence_threshold (float): Minimum confidence for a match
+        chunksize (int): Images handed to a worker at a time
+        extractor (FeatureExtractor): Feature extractor (default: full-resolution SIFT)
+        
+    Returns:
+        dict: frames, workers, seconds and frames_per_second
+    """
+    workers = workers or os.cpu_count() or 1
+    extractor = extractor or FeatureExtractor()
+    VEXImageMatcher(data_file, backend=backend, extractor=extractor)
+    
+    start = time.perf_counter()
+    frames = 0
+    with multiprocessing.Pool(workers, initializer=_init_batch_worker,
+                              initargs=(data_file, backend, confidence_threshold, extractor.config())) as pool, \
+            open(output_path, "w") as out:
+        for results in pool.imap(_match_batch_frame, image_paths, chunksize):
+            out.write(json.dumps(results) + "\n")
+            frames += 1
+    elapsed = time.perf_counter() - start
+    
+    return {
+        "frames": frames,
+        "workers": workers,
+        "seconds": elapsed,
+        "frames_per_second": frames / elapsed if elapsed > 0 else 0.0
+    }
+
+
+DEFAULT_EXTRACTOR_CONFIGS = (
+    {"method": "sift"},
+    {"method": "sift", "max_dimension": 640, "max_keypoints": 1000},
+    {"method": "orb", "max_keypoints": 1000},
+    {"method": "orb", "max_dimension": 640, "max_keypoints": 500},
+    {"method": "akaze"},
+    {"method": "akaze", "max_dimension": 640, "max_keypoints": 500}
+)
+
+
+def perturb_image(image, rng):
+    """
+    Make a plausible camera view of a training image: small rotation and zoom,
+    a brightness shift and sensor noise.
+    
+    Args:
+        image (numpy.ndarray): Grayscale training image
+        rng (numpy.random.Generator): Source of the random perturbation
+        
+    Returns:
+        numpy.ndarray: The perturbed view, same shape and dtype uint8
+    """
+    h, w = image.shape[:2]
+    transform = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-15, 15), rng.uniform(0.85, 1.1))
+    view = cv2.warpAffine(image, transform, (w, h), borderMode=cv2.BORDER_REFLECT)
+    view = view.astype(np.float32) + rng.uniform(-20, 20) + rng.normal(0, 4, view.shape)
+    return np.clip(view, 0, 255).astype(np.uint8)
+
+
+def synthetic_training_set(directory, size, rng, image_shape=(240, 320)):
+    """
+    Write a training set of random textured images for benchmarks and tests.
+    
+    Each image is blurred noise with filled circles of random size and shade,
+    which gives every feature extractor plenty of distinct keypoints.
+    
+    Args:
+        directory (str): Directory to write the images and data file into
+        size (int): Number of training objects
+        rng (numpy.random.Generator): Source of the images
+        image_shape (tuple): (height, width) of each image
+        
+    Returns:
+        tuple: (data_file without .json, list of the grayscale images)
+    """
+    height, width = image_shape
+    images = []
+    objects = []
+    for i in range(size):
+        image = cv2.GaussianBlur((rng.random((height, width)) * 255).astype(np.uint8), (5, 5), 0)
+        for _ in range(25):
+            center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+            cv2.circle(image, center, int(rng.integers(4, 30)), int(rng.integers(0, 256)), -1)
+        path = os.path.join(directory, "object%03d.png" % i)
+        cv2.imwrite(path, image)
+        images.append(image)
+        objects.append({"id": i, "name": f"object {i}", "image_path": path,
+                        "sensor_data": {"motor_port": 1, "power": 50, "action": "drive"}})
+    data_file = os.path.join(directory, "match dataVEX")
+    with open(data_file + ".json", "w") as f:
+        json.dump({"objects": objects}, f)
+    return data_file, images
+
+
+def benchmark_extractors(data_file="match dataVEX", configs=DEFAULT_EXTRACTOR_CONFIGS, backend="bruteforce",
+                         seed=0):
+    """
+    Compare feature extractor configurations for speed and accuracy on the training set.
+    
+    Each training image is turned into a perturbed query (see perturb_image)
+    and matched against the training set; a query is correct when its best
+    match is the object it was made from.
+    
+    Args:
+        data_file (str): Training data file, without the .json extension
+        configs (tuple): FeatureExtractor keyword arguments, one dict per configuration
+        backend (str): Matcher backend name from MATCHER_BACKENDS
+        seed (int): Seed for the perturbations (the same queries are used for every config)
+        
+    Returns:
+        list: Per configuration, the config plus extract_ms, match_ms, accuracy and frames
+    """
+    report = []
+    for config in configs:
+        try:
+            extractor = FeatureExtractor(**config)
+        except ValueError as e:
+            print(f"Warning: skipping extractor {config}: {e}")
+            continue
+        matcher = VEXImageMatcher(data_file, backend=backend, extractor=extractor)
+        rng = np.random.default_rng(seed)
+        
+        extract_s = match_s = 0.0
+        frames = correct = 0
+        for entry in matcher.descriptor_index:
+            image = cv2.imread(entry["object"]["image_path"], cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            query = perturb_image(image, rng)
+            
+            start = time.perf_counter()
+            keypoints, descriptors, _ = matcher.extract_frame_features(query)
+            extracted = time.perf_counter()
+            results = matcher.match_features(keypoints, descriptors, confidence_threshold=0.0)
+            match_s += time.perf_counter() - extracted
+            extract_s += extracted - start
+            
+            frames += 1
+            best = results.get("best_match")
+            correct += best is not None and best["object_id"] == entry["object"].get("id", "unknown")
+        
+        report.append({
+            "config": extractor.config(),
+            "extract_ms": 1000.0 * extract_s / max(frames, 1),
+            "match_ms": 1000.0 * match_s / max(frames, 1),
+            "accuracy": correct / frames if frames else 0.0,
+            "frames": frames
+        })
+    return report
 
 
 # Example usage function
@@ -225,7 +2281,89 @@ def run_vex_image_matching(brain=None):
 
 
 if __name__ == "__main__":
-    # Initialize with optional VEX IQ 2nd generation brain
-    # In actual VEX IQ environment: brain = vexiq.Brain()
-    matcher = run_vex_image_matching(brain=None)
-    print("VEX IQ 2nd Generation Image Matcher initialized successfully")
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="VEX IQ 2nd Generation Image Matcher")
+    parser.add_argument("command", nargs="?", default="init",
+                        choices=["init", "build-store", "reindex", "compare-backends", "batch", "bridge",
+                                 "bench-extractors"],
+                        help="'init' loads the matcher, 'build-store' (re)writes the feature store, "
+                             "'reindex' updates the manifest and feature store for changed objects, "
+                             "'compare-backends' reports recall vs speed of each matcher backend, "
+                             "'batch' matches images in parallel and writes JSON Lines, "
+                             "'bridge' matches a camera (or the given images) while a separate loop "
+                             "acts on the latest result, "
+                             "'bench-extractors' compares feature extractor configurations")
+    parser.add_argument("images", nargs="*", help="query images or directories of images")
+    parser.add_argument("--data-file", default="match dataVEX",
+                        help="training data file, without the .json extension")
+    parser.add_argument("-o", "--output", default="matches.jsonl", help="batch: JSON Lines output file")
+    parser.add_argument("--workers", type=int, default=None, help="batch: worker processes (default: CPU count)")
+    parser.add_argument("--backend", default="bruteforce", choices=sorted(MATCHER_BACKENDS),
+                        help="batch: matcher backend")
+    parser.add_argument("--threshold", type=float, default=0.7, help="batch: confidence threshold")
+    parser.add_argument("--extractor", default="sift", choices=FeatureExtractor.METHODS,
+                        help="feature extractor")
+    parser.add_argument("--max-dimension", type=int, default=None,
+                        help="downscale images so the longer side is at most this many pixels")
+    parser.add_argument("--max-keypoints", type=int, default=None, help="keypoints kept per image")
+    parser.add_argument("--full", action="store_true", help="reindex: rebuild everything from scratch")
+    parser.add_argument("--period-ms", type=float, default=20.0, help="bridge: actuator loop period")
+    parser.add_argument("--max-age-ms", type=float, default=None,
+                        help="bridge: ignore vision results older than this "
+                             "(default: twice the measured match latency plus one period)")
+    args = parser.parse_args()
+    extractor = FeatureExtractor(args.extractor, args.max_dimension, args.max_keypoints)
+    
+    if args.command == "build-store":
+        matcher = VEXImageMatcher(args.data_file, extractor=extractor)
+        print(f"Feature store written to {matcher.store_file} "
+              f"({len(matcher.descriptor_index)} training objects)")
+    elif args.command == "reindex":
+        matcher = VEXImageMatcher(args.data_file, extractor=extractor)
+        stats = matcher.reindex(full=True) if args.full else matcher.reindex_stats
+        if not stats["loaded"]:
+            print(f"Could not read {args.data_file}.json; kept {stats['objects']} training objects")
+        else:
+            print(f"Reindexed {stats['objects']} training objects in {1000.0 * stats['seconds']:.1f} ms: "
+                  f"{stats['added']} added, {stats['removed']} removed, {stats['changed']} changed, "
+                  f"{stats['unchanged']} unchanged, {stats['extracted']} images re-extracted")
+    elif args.command == "compare-backends":
+        matcher = VEXImageMatcher(args.data_file, extractor=extractor)
+        report = matcher.compare_matcher_backends(expand_image_paths(args.images), backends=("flann",))
+        for name, row in report.items():
+            print(f"{name:>10}: {row['ms_per_frame']:8.2f} ms/frame  recall {row['recall']:.3f}  "
+                  f"best-match agreement {row['best_match_agreement']:.3f}")
+    elif args.command == "batch":
+        stats = batch_match_images(expand_image_paths(args.images), args.output, data_file=args.data_file,
+                                   workers=args.workers, backend=args.backend,
+                                   confidence_threshold=args.threshold, extractor=extractor)
+        print(f"Matched {stats['frames']} frames with {stats['workers']} workers in "
+              f"{stats['seconds']:.2f} s ({stats['frames_per_second']:.1f} frames/s) -> {args.output}")
+    elif args.command == "bridge":
+        matcher = VEXImageMatcher(args.data_file, extractor=extractor)
+        source = expand_image_paths(args.images) if args.images else 0
+        with VisionActuationBridge(matcher, source, args.period_ms, args.threshold,
+                                   max_age_ms=args.max_age_ms) as bridge:
+            while bridge.matching:
+                time.sleep(0.1)
+        if bridge.error is not None:
+            print(f"Matching stopped: {bridge.error}")
+        summary = bridge.summary()
+        print(f"Matched {summary['frames_matched']} frames ({summary['match_latency_ms']:.1f} ms latency); "
+              f"{summary['ticks']} actuator ticks "
+              f"({summary['overruns']} overruns, worst jitter {summary['jitter_max_ms']:.2f} ms); "
+              f"{summary['commands']} commands, vision age mean {summary['vision_age_mean_ms']:.1f} ms "
+              f"max {summary['vision_age_max_ms']:.1f} ms; {summary['stale_skipped']} stale results skipped "
+              f"(limit {summary['max_age_ms']:.1f} ms)")
+    elif args.command == "bench-extractors":
+        for row in benchmark_extractors(args.data_file, backend=args.backend):
+            config = row["config"]
+            print(f"{config['method']:>6} dim={config['max_dimension'] or 'full':>4} "
+                  f"kp={config['max_keypoints'] or 'all':>4}: extract {row['extract_ms']:7.2f} ms/frame  "
+                  f"match {row['match_ms']:7.2f} ms/frame  accuracy {row['accuracy']:.3f} ({row['frames']} frames)")
+    else:
+        # Initialize with optional VEX IQ 2nd generation brain
+        # In actual VEX IQ environment: brain = vexiq.Brain()
+        matcher = run_vex_image_matching(brain=None)
+        print("VEX IQ 2nd Generation Image Matcher initialized successfully")
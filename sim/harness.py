@@ -0,0 +1,300 @@
+"""
+Run a VEX IQ program under the simulated ``vex`` module and report timing.
+
+The program is executed unmodified (``from vex import *`` resolves to
+sim/vex.py) against a virtual clock, so a 60 s match takes well under a
+second of host time. The report covers each thread's loop period and jitter,
+the host time spent per loop iteration, motor command rates and, for programs
+whose threads finish, the duration of the routine.
+
+Usage:
+    python sim/harness.py 2025-2026Season/src/main.py --duration 10 --driver sweep
+    python sim/harness.py ExampleSetup/src/main.py --until-done autonomous_code --limit 4=-300:300 --limit 11=-1000:0
+    python sim/harness.py kajhkfdhgksdfhk/src/main.py --json
+    python sim/harness.py 2025-2026Season/main.py --driver sweep --drive 1,7:6,12 --slip 0.05
+    python sim/harness.py 2025-2026Season/main.py --driver sweep --console console.txt
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import vex  # noqa: E402
+
+
+def idle_driver(now_ms):
+    """
+    Controller input with the sticks centred and no buttons held.
+    """
+    return {}
+
+
+def sweep_driver(now_ms):
+    """
+    Deterministic driver input: the sticks sweep through their range and the
+    buttons are held in turn for 500 ms each, with idle gaps between.
+
+    Args:
+        now_ms: Virtual time in milliseconds.
+
+    Returns:
+        dict: Axis positions and button states keyed by controller attribute name.
+    """
+    phase = int(now_ms // 500)
+    state = {
+        "axisA": int(100 * ((now_ms % 4000) / 2000.0 - 1.0)),
+        "axisB": 0,
+        "axisC": int(60 * ((now_ms % 3000) / 1500.0 - 1.0)),
+        "axisD": int(-100 * ((now_ms % 5000) / 2500.0 - 1.0)),
+    }
+    buttons = vex.CONTROLLER_BUTTONS[:8]
+    if phase % 2 == 0:
+        state[buttons[(phase // 2) % len(buttons)]] = True
+    return state
+
+
+DRIVERS = {
+    "idle": idle_driver,
+    "sweep": sweep_driver,
+}
+
+
+def _thread_report(task):
+    periods = max(task.ticks - 1, 0)
+    return {
+        "name": task.name,
+        "iterations": task.ticks,
+        "period_mean_ms": task.period_sum / periods if periods else None,
+        "period_min_ms": task.period_min,
+        "period_max_ms": task.period_max if periods else None,
+        "jitter_ms": (task.period_max - task.period_min) if periods else None,
+        # both over the same runs: resume to the next sleep, join or return
+        "host_us_per_iteration": 1e6 * task.busy_wall / task.busy_runs if task.busy_runs else None,
+        "host_us_max_iteration": 1e6 * task.busy_max if task.busy_runs else None,
+        "finished_at_ms": task.finished_at,
+    }
+
+
+def motor_limits(specs):
+    """
+    Build a setup function that gives motors mechanical end stops.
+
+    Args:
+        specs: Strings of the form "PORT=LO:HI" with limits in degrees.
+
+    Returns:
+        function: Setup function for run_program.
+    """
+    limits = {}
+    for spec in specs:
+        port, bounds = spec.split("=")
+        low, high = bounds.split(":")
+        limits[int(port)] = (float(low), float(high))
+
+    def setup(program):
+        for value in list(program.values()):
+            if isinstance(value, vex.Motor) and value.port in limits:
+                value.sim_limits = limits[value.port]
+
+    return setup
+
+
+def drive_world(left_ports, right_ports, slip=0.0, gyro_drift_dps=0.0, wheel_travel=200.0, track_width=176.0):
+    """
+    Build a setup function that tracks the ground-truth pose of the drive
+    motors on the given ports. Programs whose DriveTrain already has motors
+    get one automatically; slip and gyro drift are applied to it either way.
+
+    Returns:
+        function: Setup function for run_program.
+    """
+    def setup(program):
+        kernel = vex.kernel()
+        if left_ports and right_ports:
+            motors = {}
+            for value in list(program.values()):
+                if isinstance(value, vex.Motor):
+                    motors[value.port] = value
+            kernel.attach_drive([motors[p] for p in left_ports], [motors[p] for p in right_ports],
+                                wheel_travel, track_width)
+        if kernel.world is not None:
+            kernel.world.slip = slip
+            kernel.world.gyro_drift_dps = gyro_drift_dps
+
+    return setup
+
+
+def _pose_report(kernel, program):
+    if kernel.world is None:
+        return None
+    kernel.world.update()
+    report = {"true": list(kernel.world.pose())}
+    estimator = program.get("odometry")
+    if estimator is not None and hasattr(estimator, "pose"):
+        estimate = list(estimator.pose())
+        report["estimate"] = estimate
+        report["position_error_mm"] = ((estimate[0] - report["true"][0]) ** 2
+                                       + (estimate[1] - report["true"][1]) ** 2) ** 0.5
+        report["heading_error_deg"] = estimate[2] - report["true"][2]
+    return report
+
+
+def run_program(path, duration_ms=10000, until_idle=False, driver=None, setup=None, until_done=None,
+                console=None):
+    """
+    Execute a brain program under the simulator and collect a timing report.
+
+    Args:
+        path: Path of the main.py to run.
+        duration_ms: Virtual time to simulate (the upper bound with until_idle).
+        until_idle: Stop as soon as every thread the program started has finished.
+        until_done: Names of thread functions to wait for instead of all of them.
+        driver: Function of virtual time returning controller input, or None for idle.
+        setup: Optional function called with the program's globals after its top
+            level has run and before its threads start, e.g. to set Motor.sim_limits.
+        console: Optional file that receives everything the program prints, as
+            the brain's console would, instead of stdout.
+
+    Returns:
+        dict: The report; "kernel" holds the finished Kernel for further inspection.
+    """
+    kernel = vex.reset()
+    kernel.controller_input = driver
+    path = os.path.abspath(path)
+
+    wall_start = time.perf_counter()
+    # exec into a dict we keep, so setup() can patch the program's live globals
+    program = {"__name__": "__main__", "__file__": path}
+    with open(path) as f:
+        code = compile(f.read(), path, "exec")
+    stdout = sys.stdout
+    if console is not None:
+        sys.stdout = console
+    try:
+        exec(code, program)
+        if setup is not None:
+            setup(program)
+        if until_idle or until_done:
+            kernel.run_until_idle(duration_ms, until_done)
+        else:
+            kernel.run_until(duration_ms)
+    finally:
+        sys.stdout = stdout
+    sim_ms = kernel.now
+    pose = _pose_report(kernel, program)
+    unfinished = [t.name for t in kernel.alive_tasks()]
+    kernel.shutdown()
+    wall_s = time.perf_counter() - wall_start
+
+    by_port = {}
+    by_command = {}
+    for _, port, command, _ in kernel.commands:
+        by_port[str(port)] = by_port.get(str(port), 0) + 1
+        by_command[command] = by_command.get(command, 0) + 1
+
+    awaited = [t for t in kernel.tasks if not until_done or t.name in until_done]
+    finished = [t.finished_at for t in awaited if t.finished_at is not None]
+    routine_done = len(finished) == len(awaited) and (until_done or not unfinished)
+    screen = program.get("brain").screen if isinstance(program.get("brain"), vex.Brain) else None
+    return {
+        "program": os.path.relpath(path),
+        "sim_ms": sim_ms,
+        "wall_s": wall_s,
+        "speedup": (sim_ms / 1000.0) / wall_s if wall_s > 0 else None,
+        "motor_commands": len(kernel.commands),
+        "motor_commands_per_s": 1000.0 * len(kernel.commands) / sim_ms if sim_ms else None,
+        "commands_by_port": by_port,
+        "commands_by_type": by_command,
+        "threads": [_thread_report(t) for t in kernel.tasks],
+        "unfinished_threads": unfinished,
+        "routine_ms": max(finished) if finished and routine_done else None,
+        "screen_operations": screen.operations if screen is not None else None,
+        "screen_clears": screen.clears if screen is not None else None,
+        "pose": pose,
+        "errors": [{"thread": name, "error": repr(e), "traceback": tb} for name, e, tb in kernel.errors],
+        "kernel": kernel,
+    }
+
+
+def print_report(report):
+    print("%s: %.0f ms simulated in %.3f s (%.0fx real time)"
+          % (report["program"], report["sim_ms"], report["wall_s"], report["speedup"] or 0))
+    rate = report["motor_commands_per_s"]
+    print("  motor commands: %d (%.1f/s)" % (report["motor_commands"], rate or 0))
+    for port, count in sorted(report["commands_by_port"].items()):
+        print("    port %-10s %d" % (port, count))
+    for t in report["threads"]:
+        if t["period_mean_ms"] is not None:
+            print("  thread %-16s %6d loops  period %.2f ms (min %.2f, max %.2f, jitter %.2f)  host %.1f us/loop (max %.1f)"
+                  % (t["name"], t["iterations"], t["period_mean_ms"], t["period_min_ms"], t["period_max_ms"],
+                     t["jitter_ms"], t["host_us_per_iteration"], t["host_us_max_iteration"]))
+        else:
+            print("  thread %-16s %6d sleeps  finished at %s ms"
+                  % (t["name"], t["iterations"], "%.0f" % t["finished_at_ms"] if t["finished_at_ms"] is not None else "-"))
+    if report["routine_ms"] is not None:
+        print("  routine duration: %.0f ms" % report["routine_ms"])
+    if report["screen_operations"] is not None:
+        print("  screen operations: %d (%d full clears)" % (report["screen_operations"], report["screen_clears"]))
+    pose = report["pose"]
+    if pose is not None:
+        print("  true pose: x %.1f mm, y %.1f mm, heading %.1f deg" % tuple(pose["true"]))
+        if "estimate" in pose:
+            print("  estimate:  x %.1f mm, y %.1f mm, heading %.1f deg (error %.1f mm, %.2f deg)"
+                  % tuple(pose["estimate"] + [pose["position_error_mm"], pose["heading_error_deg"]]))
+    for err in report["errors"]:
+        print("  error in %s: %s" % (err["thread"], err["error"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a VEX IQ program under the headless simulator")
+    parser.add_argument("program", help="path to the program's main.py")
+    parser.add_argument("--duration", type=float, default=10.0, help="simulated seconds (default 10)")
+    parser.add_argument("--until-idle", action="store_true", help="stop once every program thread has finished")
+    parser.add_argument("--until-done", action="append", metavar="THREAD",
+                        help="stop once the named thread function has finished (repeatable)")
+    parser.add_argument("--driver", choices=sorted(DRIVERS), default="idle", help="scripted controller input")
+    parser.add_argument("--limit", action="append", default=[], metavar="PORT=LO:HI",
+                        help="end stop in degrees for the motor on PORT, e.g. 4=-400:400 (repeatable)")
+    parser.add_argument("--drive", metavar="LEFT:RIGHT",
+                        help="track the true pose of the drive on these ports, e.g. 1,7:6,12")
+    parser.add_argument("--slip", type=float, default=0.0, help="fraction of wheel travel lost to slip")
+    parser.add_argument("--gyro-drift", type=float, default=0.0, help="inertial sensor drift in deg/s")
+    parser.add_argument("--console", metavar="PATH", help="write the program's console output to PATH")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    setups = []
+    if args.limit:
+        setups.append(motor_limits(args.limit))
+    if args.drive or args.slip or args.gyro_drift:
+        left, right = args.drive.split(":") if args.drive else ("", "")
+        setups.append(drive_world([int(p) for p in left.split(",") if p], [int(p) for p in right.split(",") if p],
+                                  args.slip, args.gyro_drift))
+
+    def setup(program):
+        for s in setups:
+            s(program)
+
+    console = open(args.console, "w") if args.console else None
+    try:
+        report = run_program(args.program, args.duration * 1000.0, args.until_idle, DRIVERS[args.driver],
+                             setup, args.until_done, console)
+    finally:
+        if console is not None:
+            console.close()
+    report.pop("kernel")
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
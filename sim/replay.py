@@ -0,0 +1,297 @@
+"""
+Record and replay driver-control sessions against the simulator.
+
+2025-2026Season/src/main.py logs controller snapshots into 10 byte records
+(time msec uint32, buttons uint16, axes A-D int8, little endian) and streams
+them to the console as ``#VEXREC`` lines. This tool turns a console
+capture into a .vexrec file, replays a recording through a program's
+unmodified drive_task under the simulator, and writes or checks the resulting
+motor command trace, so control changes can be regression-tested offline.
+
+Usage:
+    python sim/replay.py extract console.txt -o drive.vexrec
+    python sim/replay.py record 2025-2026Season/src/main.py --driver sweep -o drive.vexrec
+    python sim/replay.py replay 2025-2026Season/src/main.py drive.vexrec --trace trace.jsonl
+    python sim/replay.py replay 2025-2026Season/src/main.py drive.vexrec --expect trace.jsonl
+"""
+
+import argparse
+import bisect
+import contextlib
+import io
+import json
+import os
+import sys
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import harness  # noqa: E402
+
+RECORDING_MAGIC = b"VEXREC01"
+RECORD_SIZE = 10
+
+# Bit order of ControllerState.buttons
+BUTTON_NAMES = ("buttonLUp", "buttonLDown", "buttonRUp", "buttonRDown",
+                "buttonEUp", "buttonEDown", "buttonFUp", "buttonFDown")
+AXIS_NAMES = ("axisA", "axisB", "axisC", "axisD")
+
+
+def _int8(value):
+    return value - 256 if value > 127 else value
+
+
+def decode_records(data):
+    """
+    Decode packed input records.
+
+    Args:
+        data: Bytes holding a whole number of 10 byte records.
+
+    Returns:
+        list: (time_ms, buttons, axis_a, axis_b, axis_c, axis_d) tuples.
+    """
+    if len(data) % RECORD_SIZE:
+        raise ValueError("recording length %d is not a multiple of %d" % (len(data), RECORD_SIZE))
+    records = []
+    for i in range(0, len(data), RECORD_SIZE):
+        r = data[i:i + RECORD_SIZE]
+        records.append((r[0] | r[1] << 8 | r[2] << 16 | r[3] << 24, r[4] | r[5] << 8,
+                        _int8(r[6]), _int8(r[7]), _int8(r[8]), _int8(r[9])))
+    return records
+
+
+def encode_records(records):
+    out = bytearray()
+    for t, buttons, a, b, c, d in records:
+        t = int(t)
+        out += bytes((t & 0xFF, (t >> 8) & 0xFF, (t >> 16) & 0xFF, (t >> 24) & 0xFF,
+                      buttons & 0xFF, (buttons >> 8) & 0xFF, a & 0xFF, b & 0xFF, c & 0xFF, d & 0xFF))
+    return bytes(out)
+
+
+def parse_console(text):
+    """
+    Extract the records from a console capture. The recorder prints each
+    batch once, tagged with the sequence number of its first record, after a
+    #VEXREC START line; a restarted program starts a new recording, so only
+    the batches after the last START are used.
+
+    Args:
+        text: Console output from the brain.
+
+    Returns:
+        bytes: The packed records.
+
+    Raises:
+        ValueError: If there is no recording or records are missing from it.
+    """
+    batches = None
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0] != "#VEXREC":
+            continue
+        if fields[1:] == ["START"]:
+            batches = []
+        elif batches is not None and len(fields) == 3:
+            batches.append((int(fields[1]), bytes.fromhex(fields[2])))
+    if batches is None:
+        raise ValueError("no #VEXREC START found")
+    data = bytearray()
+    expected = 0
+    for seq, batch in batches:
+        if seq != expected:
+            raise ValueError("recording has records %d-%d missing" % (expected, seq - 1) if seq > expected
+                             else "recording repeats record %d" % seq)
+        data += batch
+        expected += len(batch) // RECORD_SIZE
+    return bytes(data)
+
+
+def read_recording(path):
+    """
+    Load a recording from a .vexrec file or directly from a console capture.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(RECORDING_MAGIC):
+        return decode_records(data[len(RECORDING_MAGIC):])
+    return decode_records(parse_console(data.decode("utf-8", "replace")))
+
+
+def write_recording(path, records):
+    with open(path, "wb") as f:
+        f.write(RECORDING_MAGIC)
+        f.write(encode_records(records))
+
+
+def recording_driver(records):
+    """
+    Controller input function for the simulator that holds each recorded
+    snapshot until the next one.
+
+    Args:
+        records: Decoded records in time order.
+
+    Returns:
+        function: Maps virtual time (ms) to a controller state dict.
+    """
+    times = [r[0] for r in records]
+    states = []
+    for _, buttons, *axes in records:
+        state = dict(zip(AXIS_NAMES, axes))
+        for bit, name in enumerate(BUTTON_NAMES):
+            state[name] = bool(buttons & (1 << bit))
+        states.append(state)
+
+    def driver(now_ms):
+        i = bisect.bisect_right(times, now_ms) - 1
+        return states[i] if i >= 0 else {}
+
+    return driver
+
+
+def _disable_recording(program):
+    if "RECORD_INPUT" in program:
+        program["RECORD_INPUT"] = False
+
+
+def replay(program_path, records, tail_ms=500, console=None):
+    """
+    Run a program under the simulator with recorded controller input.
+
+    Args:
+        program_path: The main.py to drive.
+        records: Decoded input records.
+        tail_ms: Extra time simulated after the last record.
+        console: File that receives the program's console output (default:
+            discarded, so telemetry batches do not flood stdout).
+
+    Returns:
+        dict: The harness report; report["kernel"].commands is the command trace.
+    """
+    duration = (records[-1][0] if records else 0) + tail_ms
+    return harness.run_program(program_path, duration, driver=recording_driver(records), setup=_disable_recording,
+                               console=io.StringIO() if console is None else console)
+
+
+def capture(program_path, driver, duration_ms, console=None):
+    """
+    Record a session in the simulator using the program's own InputRecorder,
+    decoding its console output as extract would. The program's console
+    output also goes to console (default: discarded).
+    """
+    program = {}
+    output = io.StringIO()
+    harness.run_program(program_path, duration_ms, driver=driver, setup=program.update, console=output)
+    recorder = program.get("input_recorder")
+    if recorder is None:
+        raise ValueError("%s has no input_recorder" % program_path)
+    # the records of the last flush period are still in the ring
+    with contextlib.redirect_stdout(output):
+        recorder.flush()
+    if console is not None:
+        console.write(output.getvalue())
+    return decode_records(parse_console(output.getvalue()))
+
+
+def _json_value(value):
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def trace_rows(commands):
+    return [{"t": t, "port": port, "command": command, "args": [_json_value(a) for a in args]}
+            for t, port, command, args in commands]
+
+
+def write_trace(path, commands):
+    with open(path, "w") as f:
+        for row in trace_rows(commands):
+            f.write(json.dumps(row) + "\n")
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_difference(expected, actual):
+    """
+    Return the index of the first differing trace row, or None if they match.
+    """
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            return i
+    if len(expected) != len(actual):
+        return min(len(expected), len(actual))
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay driver-control sessions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("extract", help="convert a console capture into a .vexrec file")
+    p.add_argument("console")
+    p.add_argument("-o", "--output", required=True)
+
+    p = sub.add_parser("record", help="record a scripted session in the simulator")
+    p.add_argument("program")
+    p.add_argument("--driver", choices=sorted(harness.DRIVERS), default="sweep")
+    p.add_argument("--duration", type=float, default=30.0, help="simulated seconds (default 30)")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--console", metavar="PATH", help="write the program's console output to PATH")
+
+    p = sub.add_parser("replay", help="replay a recording and produce the motor command trace")
+    p.add_argument("program")
+    p.add_argument("recording")
+    p.add_argument("--trace", help="write the command trace as JSON Lines")
+    p.add_argument("--expect", help="compare against a previously written trace")
+    p.add_argument("--console", metavar="PATH", help="write the program's console output to PATH")
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        records = read_recording(args.console)
+        write_recording(args.output, records)
+        print("%d records written to %s" % (len(records), args.output))
+        return 0
+
+    console = open(args.console, "w") if args.console else None
+    try:
+        if args.command == "record":
+            records = capture(args.program, harness.DRIVERS[args.driver], args.duration * 1000.0, console)
+        else:
+            records = read_recording(args.recording)
+            report = replay(args.program, records, console=console)
+    finally:
+        if console is not None:
+            console.close()
+
+    if args.command == "record":
+        write_recording(args.output, records)
+        print("%d records (%d bytes) written to %s" % (len(records), len(records) * RECORD_SIZE, args.output))
+        return 0
+
+    commands = report["kernel"].commands
+    print("%d records, %.0f ms replayed in %.3f s (%.0fx real time), %d motor commands"
+          % (len(records), report["sim_ms"], report["wall_s"], report["speedup"] or 0, len(commands)))
+    if args.trace:
+        write_trace(args.trace, commands)
+    if args.expect:
+        expected = read_trace(args.expect)
+        actual = json.loads(json.dumps(trace_rows(commands)))
+        i = first_difference(expected, actual)
+        if i is not None:
+            print("trace differs at row %d:" % i)
+            print("  expected %s" % (json.dumps(expected[i]) if i < len(expected) else "<end>"))
+            print("  actual   %s" % (json.dumps(actual[i]) if i < len(actual) else "<end>"))
+            return 1
+        print("trace matches %s" % args.expect)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1209 @@
+"""
+Headless stand-in for the VEX IQ 2nd generation ``vex`` Python module.
+
+Programs written for the brain (``from vex import *``) run unmodified on a
+desktop Python against a simulated clock:
+
+* ``sleep``/``wait`` advance virtual time instead of blocking, so a program
+  runs as fast as the host can execute its loop bodies.
+* ``Thread`` objects are real Python threads, but only one runs at a time and
+  they are resumed in virtual-time order, so runs are deterministic.
+* Every motor command is recorded in ``kernel().commands``.
+
+Use ``reset()`` to start a fresh simulation and harness.py to run a program
+under it and report loop timing, command rates and routine durations.
+"""
+
+import heapq
+import math
+import threading
+import time as _time
+import traceback
+
+
+# ---------------------------------------------------------------------------- #
+#   Units and enumerations                                                      #
+# ---------------------------------------------------------------------------- #
+
+class _Enum:
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+class DirectionType:
+    FORWARD = _Enum("direction", "FORWARD")
+    REVERSE = _Enum("direction", "REVERSE")
+
+
+class TurnType:
+    LEFT = _Enum("turn", "LEFT")
+    RIGHT = _Enum("turn", "RIGHT")
+
+
+class VelocityUnits:
+    PERCENT = _Enum("velocity", "PERCENT")
+    RPM = _Enum("velocity", "RPM")
+    DPS = _Enum("velocity", "DPS")
+
+
+class RotationUnits:
+    DEG = _Enum("rotation", "DEGREES")
+    REV = _Enum("rotation", "TURNS")
+
+
+class DistanceUnits:
+    MM = _Enum("distance", "MM")
+    IN = _Enum("distance", "INCHES")
+    CM = _Enum("distance", "CM")
+
+
+class TimeUnits:
+    SECONDS = _Enum("time", "SECONDS")
+    MSEC = _Enum("time", "MSEC")
+
+
+class BrakeType:
+    COAST = _Enum("brake", "COAST")
+    BRAKE = _Enum("brake", "BRAKE")
+    HOLD = _Enum("brake", "HOLD")
+
+
+class CurrentUnits:
+    AMP = _Enum("current", "AMP")
+
+
+class VoltageUnits:
+    VOLT = _Enum("voltage", "VOLT")
+    MV = _Enum("voltage", "MV")
+
+
+class AxisType:
+    XAXIS = _Enum("axis", "XAXIS")
+    YAXIS = _Enum("axis", "YAXIS")
+    ZAXIS = _Enum("axis", "ZAXIS")
+
+
+class OrientationType:
+    ROLL = _Enum("orientation", "ROLL")
+    PITCH = _Enum("orientation", "PITCH")
+    YAW = _Enum("orientation", "YAW")
+
+
+class FontType:
+    MONO12 = _Enum("font", "MONO12")
+    MONO15 = _Enum("font", "MONO15")
+    MONO20 = _Enum("font", "MONO20")
+    MONO30 = _Enum("font", "MONO30")
+    PROP20 = _Enum("font", "PROP20")
+
+
+class Color:
+    BLACK = _Enum("color", "BLACK")
+    WHITE = _Enum("color", "WHITE")
+    RED = _Enum("color", "RED")
+    GREEN = _Enum("color", "GREEN")
+    BLUE = _Enum("color", "BLUE")
+    YELLOW = _Enum("color", "YELLOW")
+    ORANGE = _Enum("color", "ORANGE")
+    PURPLE = _Enum("color", "PURPLE")
+    TRANSPARENT = _Enum("color", "TRANSPARENT")
+
+
+FORWARD = DirectionType.FORWARD
+REVERSE = DirectionType.REVERSE
+LEFT = TurnType.LEFT
+RIGHT = TurnType.RIGHT
+PERCENT = VelocityUnits.PERCENT
+RPM = VelocityUnits.RPM
+DPS = VelocityUnits.DPS
+DEGREES = RotationUnits.DEG
+TURNS = RotationUnits.REV
+MM = DistanceUnits.MM
+INCHES = DistanceUnits.IN
+CM = DistanceUnits.CM
+SECONDS = TimeUnits.SECONDS
+MSEC = TimeUnits.MSEC
+COAST = BrakeType.COAST
+BRAKE = BrakeType.BRAKE
+HOLD = BrakeType.HOLD
+AMP = CurrentUnits.AMP
+VOLT = VoltageUnits.VOLT
+XAXIS = AxisType.XAXIS
+YAXIS = AxisType.YAXIS
+ZAXIS = AxisType.ZAXIS
+ROLL = OrientationType.ROLL
+PITCH = OrientationType.PITCH
+YAW = OrientationType.YAW
+
+
+class Ports:
+    PORT1 = 1
+    PORT2 = 2
+    PORT3 = 3
+    PORT4 = 4
+    PORT5 = 5
+    PORT6 = 6
+    PORT7 = 7
+    PORT8 = 8
+    PORT9 = 9
+    PORT10 = 10
+    PORT11 = 11
+    PORT12 = 12
+
+
+# IQ 2nd generation smart motor free speed
+MOTOR_MAX_RPM = 120.0
+
+
+def _to_ms(value, units):
+    return value * 1000.0 if units is SECONDS else float(value)
+
+
+def _to_percent(value, units):
+    if units is RPM:
+        return 100.0 * value / MOTOR_MAX_RPM
+    if units is DPS:
+        return 100.0 * value / (MOTOR_MAX_RPM * 6.0)
+    return float(value)
+
+
+def _from_percent(value, units):
+    if units is RPM:
+        return value * MOTOR_MAX_RPM / 100.0
+    if units is DPS:
+        return value * MOTOR_MAX_RPM * 6.0 / 100.0
+    return value
+
+
+def _to_degrees(value, units):
+    return value * 360.0 if units is TURNS else float(value)
+
+
+def _to_mm(value, units):
+    if units is INCHES:
+        return value * 25.4
+    if units is CM:
+        return value * 10.0
+    return float(value)
+
+
+# ---------------------------------------------------------------------------- #
+#   Virtual-time kernel                                                         #
+# ---------------------------------------------------------------------------- #
+
+class SimulationExit(BaseException):
+    """
+    Raised inside simulated threads to unwind them when a run ends.
+    A BaseException so that program code catching Exception does not swallow it.
+    """
+
+
+class SimulationDeadlock(RuntimeError):
+    """
+    Raised when every simulated thread is blocked and none can ever resume.
+    """
+
+
+class _Task:
+    def __init__(self, name):
+        self.name = name
+        self.resume = threading.Event()
+        self.thread = None
+        self.finished = False
+        self.finished_at = None
+        self.stop_requested = False
+        self.joiners = []
+        self.waiting_for = set()
+        # Loop statistics: virtual time between sleeps and host time spent running
+        self.ticks = 0
+        self.last_sleep_at = None
+        self.period_sum = 0.0
+        self.period_min = None
+        self.period_max = 0.0
+        # host time of each run from resume to the next sleep, join or return
+        self.busy_wall = 0.0
+        self.busy_max = 0.0
+        self.busy_runs = 0
+        self.resumed_wall = _time.perf_counter()
+
+    def account(self):
+        """
+        Close the current run: add the host time since the task was resumed.
+        """
+        busy = _time.perf_counter() - self.resumed_wall
+        self.busy_wall += busy
+        self.busy_max = max(self.busy_max, busy)
+        self.busy_runs += 1
+
+
+class Kernel:
+    """
+    Discrete-event scheduler for simulated threads.
+
+    Exactly one task runs at a time. A task gives up control by sleeping (it
+    is queued to resume at now + delay) or by blocking until other tasks
+    finish; the task with the earliest resume time runs next and the virtual
+    clock jumps to that time.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.queue = []
+        self.seq = 0
+        self.stopping = False
+        self.main = _Task("main")
+        self.current = self.main
+        self.tasks = []
+        self.commands = []
+        self.errors = []
+        self.controller_input = None
+        self.heading = 0.0
+        self.rotation = 0.0
+        self.advance_hooks = []
+        self.main_waits_for_idle = False
+        self.idle_names = None
+        self.world = None
+
+    # -- scheduling ---------------------------------------------------------
+
+    def _push(self, task, wake):
+        self.seq += 1
+        heapq.heappush(self.queue, (wake, self.seq, task))
+
+    def _switch(self, task):
+        """
+        Hand control from `task` to the next runnable task and wait to be resumed.
+        """
+        if not self.queue:
+            raise SimulationDeadlock("all simulated threads are blocked")
+        wake, _, nxt = heapq.heappop(self.queue)
+        if wake > self.now:
+            self.now = wake
+            for hook in self.advance_hooks:
+                hook(self.now)
+        self.current = nxt
+        if nxt is not task:
+            nxt.resume.set()
+            task.resume.wait()
+            task.resume.clear()
+        task.resumed_wall = _time.perf_counter()
+        if task is not self.main and (self.stopping or task.stop_requested):
+            raise SimulationExit()
+
+    def sleep(self, ms):
+        task = self.current
+        if task is not self.main and (self.stopping or task.stop_requested):
+            raise SimulationExit()
+
+        task.account()
+        if task.last_sleep_at is not None:
+            period = self.now - task.last_sleep_at
+            task.period_sum += period
+            task.period_min = period if task.period_min is None else min(task.period_min, period)
+            task.period_max = max(task.period_max, period)
+        task.ticks += 1
+        task.last_sleep_at = self.now
+
+        self._push(task, self.now + max(float(ms), 0.0))
+        self._switch(task)
+
+    def join(self, tasks):
+        """
+        Block the current task until all of `tasks` have finished.
+        """
+        task = self.current
+        pending = [t for t in tasks if not t.finished]
+        if not pending:
+            return
+        task.account()
+        task.waiting_for = set(pending)
+        for t in pending:
+            t.joiners.append(task)
+        self._switch(task)
+
+    def spawn(self, func, args=(), name=None):
+        task = _Task(name or getattr(func, "__name__", "thread"))
+        self.tasks.append(task)
+
+        def run():
+            task.resume.wait()
+            task.resume.clear()
+            task.resumed_wall = _time.perf_counter()
+            try:
+                if not self.stopping:
+                    func(*args)
+            except SimulationExit:
+                pass
+            except Exception as e:
+                self.errors.append((task.name, e, traceback.format_exc()))
+            finally:
+                self._finish(task)
+
+        task.thread = threading.Thread(target=run, name="sim-" + task.name, daemon=True)
+        task.thread.start()
+        self._push(task, self.now)
+        return task
+
+    def _finish(self, task):
+        task.finished = True
+        task.finished_at = self.now
+        if not self.stopping:
+            # a run that ended by returning; unwinding at shutdown is not counted
+            task.account()
+        for joiner in task.joiners:
+            joiner.waiting_for.discard(task)
+            if not joiner.waiting_for:
+                self._push(joiner, self.now)
+        task.joiners = []
+        if self.stopping:
+            return
+        if self.main_waits_for_idle and not self._awaited_tasks():
+            # Nothing left to simulate: wake the main task right away
+            self.queue = [entry for entry in self.queue if entry[2] is not self.main]
+            heapq.heapify(self.queue)
+            self._push(self.main, self.now)
+        if not self.queue:
+            self.errors.append((task.name, SimulationDeadlock("no runnable task left"), ""))
+            self.main.resume.set()
+            return
+        wake, _, nxt = heapq.heappop(self.queue)
+        if wake > self.now:
+            self.now = wake
+            for hook in self.advance_hooks:
+                hook(self.now)
+        self.current = nxt
+        nxt.resume.set()
+
+    def alive_tasks(self):
+        return [t for t in self.tasks if not t.finished]
+
+    def _awaited_tasks(self):
+        alive = self.alive_tasks()
+        if self.idle_names is None:
+            return alive
+        return [t for t in alive if t.name in self.idle_names]
+
+    # -- running from the harness -------------------------------------------
+
+    def run_until(self, end_ms):
+        """
+        Let the simulated threads run until virtual time `end_ms`.
+        Must be called from the main (program) thread.
+        """
+        if end_ms > self.now:
+            self.sleep(end_ms - self.now)
+
+    def run_until_idle(self, max_ms, names=None):
+        """
+        Run until every simulated thread has finished, or until `max_ms`.
+        With `names`, only threads running those functions are waited for,
+        so a program with a service thread that never ends can still finish.
+        """
+        self.idle_names = set(names) if names else None
+        try:
+            if not self._awaited_tasks():
+                return
+            self.main_waits_for_idle = True
+            self.run_until(max_ms)
+        finally:
+            self.main_waits_for_idle = False
+            self.idle_names = None
+
+    def shutdown(self):
+        """
+        Unwind every simulated thread that is still running.
+        """
+        self.stopping = True
+        for task in self.alive_tasks():
+            self.current = task
+            task.resume.set()
+            task.thread.join(timeout=5.0)
+        self.current = self.main
+
+    def attach_drive(self, left, right, wheel_travel=200.0, track_width=176.0, slip=0.0, gyro_drift_dps=0.0):
+        """
+        Track the ground-truth pose of a differential drive made of the given
+        motors; the simulated Inertial sensor then reads its rotation.
+        """
+        self.world = DriveWorld(left, right, wheel_travel, track_width, slip, gyro_drift_dps)
+        self.advance_hooks.append(self.world.update)
+        return self.world
+
+    # -- recording ----------------------------------------------------------
+
+    def record(self, port, command, *args):
+        self.commands.append((self.now, port, command, args))
+
+    def controller_state(self):
+        if self.controller_input is None:
+            return {}
+        return self.controller_input(self.now)
+
+
+_kernel = Kernel()
+
+
+def kernel():
+    """
+    Return the kernel of the current simulation.
+    """
+    return _kernel
+
+
+def reset():
+    """
+    Discard the current simulation and start a new one at virtual time 0.
+    """
+    global _kernel
+    if _kernel is not None and _kernel.alive_tasks():
+        _kernel.shutdown()
+    _kernel = Kernel()
+    return _kernel
+
+
+def sleep(duration, units=MSEC):
+    _kernel.sleep(_to_ms(duration, units))
+
+
+def wait(duration, units=MSEC):
+    _kernel.sleep(_to_ms(duration, units))
+
+
+class DriveWorld:
+    """
+    Ground-truth pose of a differential drive, integrated from its motors'
+    positions every time virtual time advances. x is to the right and y
+    forward of the start in mm, rotation is clockwise in degrees. `slip` is
+    the fraction of encoder travel the wheels lose to the floor, and
+    `gyro_drift_dps` is added to what the inertial sensor reports.
+    """
+
+    def __init__(self, left, right, wheel_travel, track_width, slip, gyro_drift_dps):
+        self.left = list(left)
+        self.right = list(right)
+        self.mm_per_degree = wheel_travel / 360.0
+        self.track_width = track_width
+        self.slip = slip
+        self.gyro_drift_dps = gyro_drift_dps
+        self.x = 0.0
+        self.y = 0.0
+        self.rotation = 0.0
+        self._last = (self._side(self.left), self._side(self.right))
+
+    @staticmethod
+    def _side(motors):
+        return sum(m.position() for m in motors) / len(motors)
+
+    def update(self, now=None):
+        left, right = self._side(self.left), self._side(self.right)
+        scale = self.mm_per_degree * (1.0 - self.slip)
+        d_left = (left - self._last[0]) * scale
+        d_right = (right - self._last[1]) * scale
+        self._last = (left, right)
+        d_theta = (d_left - d_right) / self.track_width
+        mid = math.radians(self.rotation) + d_theta / 2
+        distance = (d_left + d_right) / 2
+        self.x += distance * math.sin(mid)
+        self.y += distance * math.cos(mid)
+        self.rotation += math.degrees(d_theta)
+
+    def imu_rotation(self):
+        return self.rotation + self.gyro_drift_dps * _kernel.now / 1000.0
+
+    def pose(self):
+        return self.x, self.y, self.rotation
+
+
+class Thread:
+    """
+    Simulated thread; starts running at the next scheduling point.
+    """
+
+    def __init__(self, callback, args=()):
+        self._task = _kernel.spawn(callback, tuple(args))
+
+    def stop(self):
+        self._task.stop_requested = True
+
+    @staticmethod
+    def sleep_for(duration, units=MSEC):
+        sleep(duration, units)
+
+
+class Event:
+    """
+    Broadcast event; each registered callback runs in its own thread.
+    """
+
+    def __init__(self, callback=None, arg=None):
+        self._callbacks = []
+        if callback is not None:
+            self.set(callback, arg)
+
+    def __call__(self, callback, arg=None):
+        self.set(callback, arg)
+
+    def set(self, callback, arg=None):
+        self._callbacks.append((callback, () if arg is None else tuple(arg)))
+
+    def broadcast(self):
+        return [_kernel.spawn(cb, args) for cb, args in self._callbacks]
+
+    def broadcast_and_wait(self, timeout=60000):
+        _kernel.join(self.broadcast())
+
+
+# ---------------------------------------------------------------------------- #
+#   Brain                                                                       #
+# ---------------------------------------------------------------------------- #
+
+class Timer:
+    def __init__(self):
+        self._base = _kernel.now
+
+    def time(self, units=MSEC):
+        elapsed = _kernel.now - self._base
+        return elapsed / 1000.0 if units is SECONDS else elapsed
+
+    def value(self):
+        return self.time(SECONDS)
+
+    def clear(self):
+        self._base = _kernel.now
+
+    def reset(self):
+        self.clear()
+
+    def system(self):
+        return _kernel.now
+
+    def event(self, callback, delay, arg=None):
+        def fire():
+            sleep(delay)
+            callback(*(() if arg is None else tuple(arg)))
+        _kernel.spawn(fire)
+
+
+class Screen:
+    """
+    160 x 108 pixel brain screen with a text cursor; keeps the rendered text
+    rows and counts every drawing call.
+    """
+
+    ROWS = 5
+    COLUMNS = 26
+
+    def __init__(self):
+        self.rows = [""] * (self.ROWS + 1)
+        self.row = 1
+        self.col = 1
+        self.operations = 0
+        self.clears = 0
+
+    def _op(self):
+        self.operations += 1
+
+    def print(self, *args, sep=" ", precision=2):
+        self._op()
+        text = sep.join(("%.*f" % (precision, a)) if isinstance(a, float) else str(a) for a in args)
+        if self.row < 1 or self.row > self.ROWS:
+            return
+        line = self.rows[self.row].ljust(self.col - 1)
+        line = line[:self.col - 1] + text + line[self.col - 1 + len(text):]
+        self.rows[self.row] = line[:self.COLUMNS]
+        self.col += len(text)
+
+    def set_cursor(self, row, col):
+        self._op()
+        self.row, self.col = int(row), int(col)
+
+    def new_line(self):
+        self._op()
+        self.row += 1
+        self.col = 1
+
+    def next_row(self):
+        self.new_line()
+
+    def clear_screen(self, color=None):
+        self._op()
+        self.clears += 1
+        self.rows = [""] * (self.ROWS + 1)
+        self.row = self.col = 1
+
+    def clear_row(self, row=None, color=None):
+        self._op()
+        if row is None:
+            row = self.row
+        if 1 <= row <= self.ROWS:
+            self.rows[row] = ""
+
+    def column(self):
+        return self.col
+
+    def print_at(self, *args, x=0, y=0, sep=" ", opaque=True):
+        self._op()
+
+    def set_font(self, font):
+        self._op()
+
+    def set_pen_color(self, color):
+        self._op()
+
+    def set_pen_width(self, width):
+        self._op()
+
+    def set_fill_color(self, color):
+        self._op()
+
+    def draw_pixel(self, x, y):
+        self._op()
+
+    def draw_line(self, x1, y1, x2, y2):
+        self._op()
+
+    def draw_rectangle(self, x, y, width, height, color=None):
+        self._op()
+
+    def draw_circle(self, x, y, radius, color=None):
+        self._op()
+
+    def render(self):
+        self._op()
+
+    def text(self):
+        """
+        Return the visible text rows (simulator only).
+        """
+        return self.rows[1:]
+
+
+class Battery:
+    def capacity(self):
+        return 100
+
+    def voltage(self, units=VOLT):
+        return 8.0 if units is VOLT else 8000.0
+
+    def current(self, units=AMP):
+        return 0.5
+
+
+class Button:
+    def __init__(self):
+        self._pressed = []
+        self._released = []
+
+    def pressing(self):
+        return False
+
+    def pressed(self, callback, arg=None):
+        self._pressed.append(callback)
+
+    def released(self, callback, arg=None):
+        self._released.append(callback)
+
+
+class Brain:
+    def __init__(self):
+        self.screen = Screen()
+        self.timer = Timer()
+        self.battery = Battery()
+        self.buttonLeft = Button()
+        self.buttonRight = Button()
+        self.buttonCheck = Button()
+
+    def play_sound(self, *args):
+        pass
+
+    def program_stop(self):
+        raise SimulationExit()
+
+
+# ---------------------------------------------------------------------------- #
+#   Motors and drivetrain                                                       #
+# ---------------------------------------------------------------------------- #
+
+class Motor:
+    """
+    Smart motor with ideal velocity response: position integrates the commanded
+    velocity exactly between commands. `sim_limits` (degrees) can be set to model
+    a mechanism end stop, where the motor stalls and draws stall current.
+    """
+
+    STALL_CURRENT = 1.2
+
+    def __init__(self, port, *args):
+        self.port = port
+        self.reverse = False
+        self.gear_ratio = 1.0
+        if args:
+            if isinstance(args[0], bool):
+                self.reverse = args[0]
+            else:
+                if isinstance(args[0], (int, float)):
+                    self.gear_ratio = float(args[0])
+                if len(args) > 1:
+                    self.reverse = bool(args[1])
+        self.sim_limits = None
+        self._velocity_setting = 50.0
+        self._max_torque = 100.0
+        self._stopping = COAST
+        self._timeout = None
+        self._commanded = 0.0
+        self._position = 0.0
+        self._target = None
+        self._stalled = False
+        self._updated_at = _kernel.now
+
+    def _update(self):
+        now = _kernel.now
+        dt = (now - self._updated_at) / 1000.0
+        self._updated_at = now
+        if dt <= 0 or self._commanded == 0.0:
+            return
+        position = self._position + self._commanded * MOTOR_MAX_RPM * 6.0 / 100.0 * dt
+        if self._target is not None and (position - self._target) * self._commanded >= 0:
+            position = self._target
+            self._target = None
+            self._commanded = 0.0
+        self._stalled = False
+        if self.sim_limits is not None:
+            low, high = self.sim_limits
+            if position <= low or position >= high:
+                position = min(max(position, low), high)
+                self._stalled = True
+        self._position = position
+
+    def _command(self, velocity_percent, target=None):
+        self._update()
+        self._commanded = max(-100.0, min(100.0, velocity_percent))
+        self._target = target
+
+    # -- commands -----------------------------------------------------------
+
+    def spin(self, direction, velocity=None, units=PERCENT):
+        value = self._velocity_setting if velocity is None else _to_percent(velocity, units)
+        _kernel.record(self.port, "spin", direction, value)
+        self._command(-value if direction is REVERSE else value)
+
+    def spin_for(self, direction, angle, units=DEGREES, velocity=None, units_v=PERCENT, wait=True):
+        value = abs(self._velocity_setting if velocity is None else _to_percent(velocity, units_v))
+        degrees = _to_degrees(angle, units)
+        if direction is REVERSE:
+            degrees = -degrees
+        _kernel.record(self.port, "spin_for", direction, degrees, value)
+        self._update()
+        self._command(math.copysign(value, degrees) if degrees else 0.0, self._position + degrees)
+        if wait:
+            self._wait_done()
+        return True
+
+    def spin_to_position(self, rotation, units=DEGREES, velocity=None, units_v=PERCENT, wait=True):
+        value = abs(self._velocity_setting if velocity is None else _to_percent(velocity, units_v))
+        target = _to_degrees(rotation, units)
+        _kernel.record(self.port, "spin_to_position", target, value)
+        self._update()
+        delta = target - self._position
+        self._command(math.copysign(value, delta) if delta else 0.0, target)
+        if wait:
+            self._wait_done()
+        return True
+
+    def _wait_done(self):
+        self._update()
+        if self._target is None or self._commanded == 0.0:
+            return
+        remaining = abs(self._target - self._position) / (abs(self._commanded) * MOTOR_MAX_RPM * 6.0 / 100.0)
+        sleep(remaining * 1000.0)
+        self._update()
+
+    def stop(self, mode=None):
+        _kernel.record(self.port, "stop", mode or self._stopping)
+        self._command(0.0)
+
+    def set_velocity(self, velocity, units=PERCENT):
+        _kernel.record(self.port, "set_velocity", velocity)
+        self._velocity_setting = _to_percent(velocity, units)
+
+    def set_max_torque(self, value, units=PERCENT):
+        _kernel.record(self.port, "set_max_torque", value)
+        self._max_torque = float(value)
+
+    def set_stopping(self, mode):
+        _kernel.record(self.port, "set_stopping", mode)
+        self._stopping = mode
+
+    def set_timeout(self, value, units=MSEC):
+        self._timeout = _to_ms(value, units)
+
+    def set_position(self, value, units=DEGREES):
+        self._update()
+        self._position = _to_degrees(value, units)
+
+    def reset_position(self):
+        self.set_position(0)
+
+    # -- state --------------------------------------------------------------
+
+    def position(self, units=DEGREES):
+        self._update()
+        return self._position / 360.0 if units is TURNS else self._position
+
+    def velocity(self, units=PERCENT):
+        self._update()
+        return 0.0 if self._stalled else _from_percent(self._commanded, units)
+
+    def current(self, units=AMP):
+        self._update()
+        if self._stalled and self._commanded:
+            return self.STALL_CURRENT * self._max_torque / 100.0
+        return 0.1 + 0.3 * abs(self._commanded) / 100.0 if self._commanded else 0.0
+
+    def torque(self, units=None):
+        return self.current() / self.STALL_CURRENT
+
+    def power(self, units=None):
+        return 8.0 * self.current()
+
+    def efficiency(self, units=PERCENT):
+        return 0.0 if self._stalled else 50.0
+
+    def temperature(self, units=None):
+        return 25.0
+
+    def is_done(self):
+        self._update()
+        return self._target is None or self._stalled
+
+    def is_spinning(self):
+        self._update()
+        return self._commanded != 0.0 and not self._stalled
+
+    def installed(self):
+        return True
+
+
+class MotorGroup:
+    def __init__(self, *motors):
+        self.motors = list(motors)
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            results = [getattr(m, name)(*args, **kwargs) for m in self.motors]
+            return results[0] if results else None
+        return call
+
+
+class DriveTrain:
+    """
+    Two-motor differential drive. Without motors (``DriveTrain()``) commands
+    are still recorded and timed but move nothing.
+    """
+
+    def __init__(self, lm=None, rm=None, wheel_travel=200, track_width=176, wheel_base=176,
+                 units=MM, external_gear_ratio=1.0):
+        self.lm = lm
+        self.rm = rm
+        self.wheel_travel = _to_mm(wheel_travel, units)
+        self.track_width = _to_mm(track_width, units)
+        self.gear_ratio = external_gear_ratio
+        if lm is not None and rm is not None and _kernel.world is None:
+            _kernel.attach_drive([lm], [rm], self.wheel_travel / self.gear_ratio, self.track_width)
+        self._drive_velocity = 50.0
+        self._turn_velocity = 50.0
+        self._done_at = _kernel.now
+
+    def _wheel_speed_mm(self, velocity_percent):
+        return abs(velocity_percent) / 100.0 * MOTOR_MAX_RPM / 60.0 * self.wheel_travel / self.gear_ratio
+
+    def _move(self, left_mm, right_mm, velocity_percent, wait):
+        speed = self._wheel_speed_mm(velocity_percent)
+        duration = 1000.0 * max(abs(left_mm), abs(right_mm)) / speed if speed else 0.0
+        self._done_at = _kernel.now + duration
+        for motor, mm in ((self.lm, left_mm), (self.rm, right_mm)):
+            if motor is not None and mm:
+                degrees = mm / self.wheel_travel * 360.0 * self.gear_ratio
+                motor.spin_for(FORWARD, degrees, DEGREES, abs(velocity_percent) * abs(mm) / max(abs(left_mm), abs(right_mm)),
+                               PERCENT, wait=False)
+        if wait:
+            sleep(duration)
+        return True
+
+    def drive_for(self, direction, distance, units=MM, velocity=None, units_v=PERCENT, wait=True):
+        value = self._drive_velocity if velocity is None else _to_percent(velocity, units_v)
+        mm = _to_mm(distance, units)
+        if direction is REVERSE:
+            mm = -mm
+        _kernel.record("drivetrain", "drive_for", direction, mm, value)
+        return self._move(mm, mm, value, wait)
+
+    def turn_for(self, direction, angle, units=DEGREES, velocity=None, units_v=PERCENT, wait=True):
+        value = self._turn_velocity if velocity is None else _to_percent(velocity, units_v)
+        degrees = _to_degrees(angle, units)
+        if direction is LEFT:
+            degrees = -degrees
+        arc = math.pi * self.track_width * degrees / 360.0
+        _kernel.record("drivetrain", "turn_for", direction, degrees, value)
+        _kernel.heading = (_kernel.heading + degrees) % 360.0
+        _kernel.rotation += degrees
+        return self._move(arc, -arc, value, wait)
+
+    def drive(self, direction, velocity=None, units=PERCENT):
+        value = self._drive_velocity if velocity is None else _to_percent(velocity, units)
+        _kernel.record("drivetrain", "drive", direction, value)
+        for motor in (self.lm, self.rm):
+            if motor is not None:
+                motor.spin(direction, value, PERCENT)
+
+    def turn(self, direction, velocity=None, units=PERCENT):
+        value = self._turn_velocity if velocity is None else _to_percent(velocity, units)
+        _kernel.record("drivetrain", "turn", direction, value)
+        if self.lm is not None:
+            self.lm.spin(FORWARD if direction is RIGHT else REVERSE, value, PERCENT)
+        if self.rm is not None:
+            self.rm.spin(REVERSE if direction is RIGHT else FORWARD, value, PERCENT)
+
+    def stop(self, mode=None):
+        _kernel.record("drivetrain", "stop", mode)
+        self._done_at = _kernel.now
+        for motor in (self.lm, self.rm):
+            if motor is not None:
+                motor.stop(mode)
+
+    def set_drive_velocity(self, velocity, units=PERCENT):
+        self._drive_velocity = _to_percent(velocity, units)
+
+    def set_turn_velocity(self, velocity, units=PERCENT):
+        self._turn_velocity = _to_percent(velocity, units)
+
+    def set_stopping(self, mode):
+        for motor in (self.lm, self.rm):
+            if motor is not None:
+                motor.set_stopping(mode)
+
+    def set_timeout(self, value, units=MSEC):
+        pass
+
+    def is_done(self):
+        return _kernel.now >= self._done_at
+
+    def is_moving(self):
+        return not self.is_done()
+
+
+# ---------------------------------------------------------------------------- #
+#   Controller and sensors                                                      #
+# ---------------------------------------------------------------------------- #
+
+CONTROLLER_BUTTONS = ("buttonLUp", "buttonLDown", "buttonRUp", "buttonRDown",
+                      "buttonEUp", "buttonEDown", "buttonFUp", "buttonFDown",
+                      "buttonL3", "buttonR3")
+CONTROLLER_AXES = ("axisA", "axisB", "axisC", "axisD")
+
+
+class _ControllerButton:
+    def __init__(self, name):
+        self.name = name
+
+    def pressing(self):
+        return bool(_kernel.controller_state().get(self.name, False))
+
+    def pressed(self, callback, arg=None):
+        _watch_edge(self.name, True, callback, arg)
+
+    def released(self, callback, arg=None):
+        _watch_edge(self.name, False, callback, arg)
+
+
+class _ControllerAxis:
+    def __init__(self, name):
+        self.name = name
+
+    def position(self):
+        return int(_kernel.controller_state().get(self.name, 0))
+
+    def changed(self, callback, arg=None):
+        pass
+
+
+def _watch_edge(name, rising, callback, arg):
+    """
+    Run `callback` in a new thread whenever a controller button changes state.
+    Inputs are sampled each time virtual time advances.
+    """
+    state = {"last": bool(_kernel.controller_state().get(name, False))}
+
+    def hook(now):
+        value = bool(_kernel.controller_state().get(name, False))
+        if value != state["last"]:
+            state["last"] = value
+            if value == rising:
+                _kernel.spawn(callback, () if arg is None else tuple(arg))
+
+    _kernel.advance_hooks.append(hook)
+
+
+class Controller:
+    """
+    IQ controller whose inputs come from ``kernel().controller_input``, a
+    function of virtual time (ms) returning a dict of axis positions
+    (-100..100) and button states keyed by attribute name.
+    """
+
+    def __init__(self, *args):
+        for name in CONTROLLER_BUTTONS:
+            setattr(self, name, _ControllerButton(name))
+        for name in CONTROLLER_AXES:
+            setattr(self, name, _ControllerAxis(name))
+
+    def set_deadband(self, value, units=PERCENT):
+        pass
+
+    def rumble(self, pattern):
+        pass
+
+
+class Inertial:
+    def __init__(self, *args):
+        self._heading_offset = 0.0
+        self._rotation_offset = 0.0
+
+    def calibrate(self):
+        pass
+
+    def is_calibrating(self):
+        return False
+
+    @staticmethod
+    def _true_rotation():
+        if _kernel.world is not None:
+            return _kernel.world.imu_rotation()
+        return _kernel.rotation
+
+    def heading(self, units=DEGREES):
+        return (self._true_rotation() + self._heading_offset) % 360.0
+
+    def rotation(self, units=DEGREES):
+        return self._true_rotation() + self._rotation_offset
+
+    def set_heading(self, value, units=DEGREES):
+        self._heading_offset = value - self._true_rotation()
+
+    def set_rotation(self, value, units=DEGREES):
+        self._rotation_offset = value - self._true_rotation()
+
+    def reset_heading(self):
+        self.set_heading(0)
+
+    def reset_rotation(self):
+        self.set_rotation(0)
+
+    def orientation(self, axis, units=DEGREES):
+        return self.heading() if axis is YAW else 0.0
+
+    def gyro_rate(self, axis, units=DPS):
+        return 0.0
+
+    def acceleration(self, axis):
+        return 1.0 if axis is ZAXIS else 0.0
+
+    def installed(self):
+        return True
+
+
+class _Sensor:
+    def __init__(self, port=None, *args):
+        self.port = port
+
+    def installed(self):
+        return True
+
+
+class Distance(_Sensor):
+    def object_distance(self, units=MM):
+        return 1000.0 if units is MM else 1000.0 / 25.4
+
+    def is_object_detected(self):
+        return False
+
+    def object_size(self):
+        return None
+
+    def object_velocity(self):
+        return 0.0
+
+
+class Optical(_Sensor):
+    def hue(self):
+        return 0.0
+
+    def brightness(self):
+        return 50.0
+
+    def color(self):
+        return Color.BLACK
+
+    def is_near_object(self):
+        return False
+
+    def set_light(self, *args):
+        pass
+
+    def set_light_power(self, *args):
+        pass
+
+    def object_detected(self, callback, arg=None):
+        pass
+
+    def object_lost(self, callback, arg=None):
+        pass
+
+
+class Touchled(_Sensor):
+    def pressing(self):
+        return False
+
+    def set_color(self, color):
+        pass
+
+    def set_brightness(self, value):
+        pass
+
+    def set_fade(self, value):
+        pass
+
+    def pressed(self, callback, arg=None):
+        pass
+
+    def released(self, callback, arg=None):
+        pass
+
+
+class Bumper(_Sensor):
+    def pressing(self):
+        return False
+
+    def pressed(self, callback, arg=None):
+        pass
+
+    def released(self, callback, arg=None):
+        pass
+
+
+class Gyro(Inertial):
+    pass
+
+
+# Device names used by the vexiq-style code in kajhkfdhgksdfhk/src/ai.py
+class DistanceSensor(Distance):
+    def distance(self, units=MM):
+        return self.object_distance(units)
+
+
+class ColorSensor(Optical):
+    pass
@@ -0,0 +1,75 @@
+"""
+Shared fixtures: the simulator, the desktop tools and the brain-side
+templates, loaded the way tools/robot_config.py renders them into programs.
+"""
+
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (os.path.join(REPO_ROOT, "sim"), os.path.join(REPO_ROOT, "tools")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import robot_config  # noqa: E402
+import vex  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    """
+    A fresh simulation at virtual time 0, shut down after the test.
+    """
+    kernel = vex.reset()
+    yield kernel
+    kernel.shutdown()
+
+
+@pytest.fixture
+def brain_module(sim):
+    """
+    Load brain-side templates into one namespace with the program's vex
+    imports and a brain, as a rendered program would have them.
+
+    Returns:
+        function: load(*templates) -> namespace, each template a path below
+            REPO_ROOT paired with its marker, e.g. ("tools/odometry.py", "# ODOMETRY").
+    """
+    def load(*templates, **globals_):
+        namespace = {"__name__": "brain_module"}
+        exec("from vex import *", namespace)
+        namespace["brain"] = vex.Brain()
+        namespace.update(globals_)
+        for path, marker in templates:
+            source = robot_config.template_source(os.path.join(REPO_ROOT, path), marker + "\n")
+            exec(compile(source, path, "exec"), namespace)
+        return namespace
+
+    return load
+
+
+def run_program(path, **kwargs):
+    """
+    Run a program under the harness with its console captured.
+
+    Returns:
+        tuple: (harness report, the program's globals, console text)
+    """
+    import io
+
+    import harness
+
+    program = {}
+    setup = kwargs.pop("setup", None)
+
+    def capture(globals_):
+        program.update(globals_)
+        if setup is not None:
+            setup(globals_)
+
+    console = io.StringIO()
+    report = harness.run_program(os.path.join(REPO_ROOT, path), setup=capture, console=console, **kwargs)
+    assert report["errors"] == [], report["errors"][0]["traceback"]
+    return report, program, console.getvalue()
@@ -0,0 +1,172 @@
+"""
+Tests for the image matcher in kajhkfdhgksdfhk/src/ai.py, on generated images.
+"""
+
+import json
+import os
+import sys
+import time
+import weakref
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kajhkfdhgksdfhk", "src"))
+
+import ai  # noqa: E402
+
+OBJECTS = 8
+
+
+@pytest.fixture(scope="module")
+def training_set(tmp_path_factory):
+    """
+    A data file of OBJECTS textured images, plus the images themselves.
+    """
+    return ai.synthetic_training_set(str(tmp_path_factory.mktemp("training")), OBJECTS,
+                                     np.random.default_rng(0))
+
+
+@pytest.fixture(scope="module")
+def matcher(training_set):
+    return ai.VEXImageMatcher(training_set[0])
+
+
+def test_first_confident_top_k_skips_candidates(matcher, training_set):
+    rng = np.random.default_rng(1)
+    skipped = 0
+    for i, image in enumerate(training_set[1]):
+        query = ai.perturb_image(image, rng)
+        exact = matcher.match_image_to_data(query, 0.3, top_k=1)
+        first = matcher.match_image_to_data(query, 0.3, top_k=1, first_confident=True)
+        assert first["best_match"]["object_id"] == i
+        assert exact["best_match"]["object_id"] == i
+        assert first["candidates_scored"] + first["candidates_skipped"] == OBJECTS
+        skipped += first["candidates_skipped"]
+    assert skipped > 0
+
+
+@pytest.mark.parametrize("top_k, first_confident", [(None, False), (1, False), (1, True)])
+def test_profiling_times_match_and_score_on_every_scoring_path(training_set, top_k, first_confident):
+    matcher = ai.VEXImageMatcher(training_set[0], profile=True)
+    matcher.stats.reset()
+    query = ai.perturb_image(training_set[1][3], np.random.default_rng(2))
+    for _ in range(2):
+        result = matcher.match_image_to_data(query, 0.3, top_k=top_k, first_confident=first_confident)
+        assert result["best_match"]["object_id"] == 3
+    summary = matcher.stats.summary()
+    assert summary["match"]["count"] == summary["score"]["count"] == 2
+    assert summary["score"]["mean_ms"] > 0
+
+
+def _write_objects(data_file, objects):
+    with open(data_file + ".json", "w") as f:
+        json.dump({"objects": objects}, f)
+
+
+def test_reindex_allows_port_to_change_device_type(training_set, tmp_path):
+    data_file = str(tmp_path / "match dataVEX")
+    image_path = str(tmp_path / "object.png")
+    cv2.imwrite(image_path, training_set[1][0])
+    _write_objects(data_file, [{"id": 0, "image_path": image_path, "sensor_data": {"motor_port": 7}}])
+    matcher = ai.VEXImageMatcher(data_file)
+    assert matcher.devices.kinds == {7: "motor"}
+
+    _write_objects(data_file, [{"id": 0, "image_path": image_path, "sensor_data": {"distance_sensor_port": 7}}])
+    matcher.reindex()
+    assert matcher.devices.kinds == {7: "distance"}
+    assert matcher.sensors is matcher.devices.sensors
+
+
+def test_reindex_keeps_previous_index_when_data_file_is_unreadable(training_set, tmp_path):
+    data_file = str(tmp_path / "match dataVEX")
+    image_path = str(tmp_path / "object.png")
+    cv2.imwrite(image_path, training_set[1][0])
+    _write_objects(data_file, [{"id": 0, "image_path": image_path, "sensor_data": {"motor_port": 7}}])
+    matcher = ai.VEXImageMatcher(data_file)
+    store_mtime = os.stat(matcher.store_file).st_mtime_ns
+    assert matcher.reindex_stats["loaded"] and matcher.reindex_stats["added"] == 1
+
+    with open(data_file + ".json", "w") as f:
+        f.write('{"objects": [')
+    stats = matcher.reindex()
+    # the failed load reports no changes, not the previous load's
+    assert stats["loaded"] is False
+    assert [stats[key] for key in ("added", "removed", "changed", "unchanged", "extracted")] == [0] * 5
+    assert stats["objects"] == 1
+    assert len(matcher.training_data["objects"]) == 1
+    assert len(matcher.descriptor_index) == 1
+    assert matcher.devices.kinds == {7: "motor"}
+    assert os.stat(matcher.store_file).st_mtime_ns == store_mtime
+
+
+def test_manifest_load_resets_changes_before_parsing(tmp_path):
+    data_file = str(tmp_path / "match dataVEX")
+    _write_objects(data_file, [{"id": 0, "image_path": "a.png"}, {"id": 1, "image_path": "b.png"}])
+    manifest = ai.TrainingManifest(data_file)
+    manifest.load()
+    assert manifest.changes == {"added": 2, "removed": 0, "changed": 0, "unchanged": 0}
+
+    with open(data_file + ".json", "w") as f:
+        f.write('{"objects": [')
+    with pytest.raises(ValueError):
+        manifest.load()
+    assert manifest.changes == {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+
+
+@pytest.mark.parametrize("backend", ["bruteforce", "flann"])
+def test_rebuild_in_place_releases_the_old_store_first(training_set, tmp_path, monkeypatch, backend):
+    data_file = str(tmp_path / "match dataVEX")
+    image_paths = [str(tmp_path / ("object%d.png" % i)) for i in range(2)]
+    for image_path, image in zip(image_paths, training_set[1]):
+        cv2.imwrite(image_path, image)
+    _write_objects(data_file, [{"id": i, "image_path": p, "sensor_data": {"motor_port": 1}}
+                               for i, p in enumerate(image_paths)])
+    matcher = ai.VEXImageMatcher(data_file, backend=backend)
+    store = matcher.feature_store
+    mappings = [weakref.ref(a) for a in (store.offsets, store.histograms, store.keypoints, store.descriptors)]
+    del store
+
+    replaced = []
+    replace = os.replace
+
+    def checked_replace(src, dst):
+        # nothing may still map the file being replaced
+        assert [mapping() for mapping in mappings] == [None] * len(mappings)
+        replaced.append(dst)
+        replace(src, dst)
+
+    monkeypatch.setattr(ai.os, "replace", checked_replace)
+    cv2.imwrite(image_paths[1], training_set[1][2])
+    stats = matcher.reindex()
+    assert replaced == [matcher.store_file]
+    assert stats["extracted"] == 1
+    result = matcher.match_image_to_data(training_set[1][2], 0.3)
+    assert result["best_match"]["object_id"] == 1
+
+
+def test_no_feature_store_is_written_without_training_objects(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    matcher = ai.VEXImageMatcher()
+    assert matcher.descriptor_index == [] and matcher.feature_store is None
+    assert os.listdir(tmp_path) == []
+    _write_objects("empty", [])
+    matcher = ai.VEXImageMatcher("empty")
+    assert not os.path.exists(matcher.store_file)
+
+
+def test_bridge_default_configuration_issues_commands(matcher, training_set, tmp_path):
+    paths = []
+    for i, image in enumerate(training_set[1]):
+        path = str(tmp_path / ("frame%d.png" % i))
+        cv2.imwrite(path, image)
+        paths.append(path)
+    with ai.VisionActuationBridge(matcher, paths) as bridge:
+        while bridge.matching:
+            time.sleep(0.01)
+    summary = bridge.summary()
+    assert summary["frames_matched"] > 0
+    assert summary["commands"] >= 1
+    assert summary["max_age_ms"] > summary["match_latency_ms"]
@@ -0,0 +1,165 @@
+"""
+ExampleSetup/src/main.py under the simulator: the autonomous routine's step
+order, how each mechanism move ends, and the event dispatcher's latency and
+coalescing.
+"""
+
+import pytest
+
+import harness
+from conftest import run_program
+
+PROGRAM = "ExampleSetup/src/main.py"
+CLAW_PORT = 4
+LIFT_PORT = 11
+DRIVE_PORTS = (7, 12)
+# one engine poll at the mechanisms' 720 degrees a second
+POLL_DEG = 7.2
+
+# routine steps holding a mechanism move
+CLAW_OPEN, CLAW_CLOSE, LIFT_UP, TURN_BACK, LOWER = 2, 4, 5, 6, 7
+
+
+def _run(setup=None):
+    report, program, _ = run_program(PROGRAM, duration_ms=15000, setup=setup)
+    engine = program["auton_engine"]
+    assert engine.total_ms > 0, "the routine did not finish"
+    return program, engine, report["kernel"].commands
+
+
+def _commands(commands, port, since=0.0):
+    return [c for c in commands if c[1] == port and c[0] >= since]
+
+
+def test_routine_steps_run_in_the_baseline_order():
+    program, engine, commands = _run()
+    routine = program["AUTON_ROUTINE"]
+    assert len(engine.step_times) == len(routine) == 8
+    assert [type(a).__name__ for step in routine for a in step] == [
+        "ProfiledMove", "ProfiledMove", "MechanismAction", "ProfiledMove", "ProfiledMove",
+        "MechanismAction", "MechanismAction", "ProfiledMove", "MechanismAction"]
+    assert routine[TURN_BACK][0].turn == 45
+
+    # the lift runs with the drive stopped and the turn back starts after it stops
+    lift = [c for c in _commands(commands, LIFT_PORT) if c[2] in ("spin", "stop")]
+    assert [c[2] for c in lift] == ["spin", "stop", "spin", "stop"]
+    lift_up_start, lift_up_end = lift[0][0], lift[1][0]
+    for port in DRIVE_PORTS:
+        assert [c for c in _commands(commands, port) if lift_up_start <= c[0] < lift_up_end] == []
+    turn = [c for c in _commands(commands, DRIVE_PORTS[0], lift_up_end) if c[2] == "spin"]
+    assert turn and turn[0][0] < lift[2][0]
+
+
+def test_unobstructed_moves_end_on_the_encoder_at_the_baseline_travel():
+    program, engine, commands = _run()
+    routine = program["AUTON_ROUTINE"]
+    claw_open = routine[CLAW_OPEN][0]
+    assert claw_open.reason == "position"
+    # the old routine opened the claw for the 1346 ms turn and drive
+    assert program["CLAW_OPEN_DEG"] == 969
+    claw = [c for c in _commands(commands, CLAW_PORT) if c[2] in ("spin", "stop")]
+    assert claw[1][2] == "stop"
+    deg_per_ms = program["MECHANISM_DEG_PER_S"] / 1000.0
+    assert (claw[1][0] - claw[0][0]) * deg_per_ms == pytest.approx(969, abs=2 * POLL_DEG)
+    assert routine[LIFT_UP][0].reason == "position"
+    assert routine[LOWER][0].reason == "position"
+
+
+def _object_in_claw(travel_deg):
+    """
+    Setup that puts an object in the claw once it starts closing, stopping it
+    after travel_deg.
+    """
+    def setup(program):
+        claw = program["claw_motor"]
+        close = program["AUTON_ROUTINE"][CLAW_CLOSE][0]
+
+        def place(now):
+            if claw.sim_limits is None and close.started:
+                claw.sim_limits = (close.start_position - travel_deg, 100000.0)
+
+        harness.vex.kernel().advance_hooks.append(place)
+
+    return setup
+
+
+def test_claw_close_ends_when_the_claw_stalls_on_the_object():
+    # the object stops the closing claw 300 degrees short of its target
+    program, engine, commands = _run(_object_in_claw(720 - 300))
+    close = program["AUTON_ROUTINE"][CLAW_CLOSE][0]
+    assert close.reason == "stall"
+    assert program["claw_motor"].current() >= program["STALL_AMPS"]
+    # stall detection waits out the start-up spike, then the poll after the stop
+    closing_ms = 1000.0 * (720 - 300) / program["MECHANISM_DEG_PER_S"]
+    assert engine.step_times[CLAW_CLOSE] < closing_ms + 2 * program["AUTON_POLL_MS"]
+    # the claw keeps gripping: no release was posted
+    assert _commands(commands, CLAW_PORT)[-1][2] == "spin"
+
+
+def test_lift_ends_on_its_timeout_when_neither_position_nor_stall_is_reached():
+    def weak_lift(program):
+        # stopped by an end stop at too little torque to read as a stall
+        harness.motor_limits(["%d=-600:100000" % LIFT_PORT])(program)
+        program["lift_motor"].set_max_torque(50, harness.vex.PERCENT)
+
+    program, engine, commands = _run(weak_lift)
+    lift_up = program["AUTON_ROUTINE"][LIFT_UP][0]
+    assert lift_up.reason == "timeout"
+    assert program["lift_motor"].current() < program["STALL_AMPS"]
+    timeout = program["LIFT_UP_MS"] + program["MECHANISM_TIMEOUT_MARGIN_MS"]
+    assert timeout <= engine.step_times[LIFT_UP] <= timeout + program["AUTON_POLL_MS"]
+
+
+# after the autonomous routine, so only the test drives the mechanisms
+MANUAL_START_MS = 12000
+
+
+def test_controller_press_runs_its_handler_without_waiting_for_a_tick():
+    presses = [(MANUAL_START_MS + 3, MANUAL_START_MS + 503), (MANUAL_START_MS + 1007, MANUAL_START_MS + 1250)]
+    edges = []
+
+    def driver(now):
+        return {"buttonLUp": any(a <= now < b for a, b in presses)}
+
+    def watch(program):
+        kernel = harness.vex.kernel()
+        program["controller"].buttonLUp.pressed(lambda: edges.append(kernel.now))
+        program["controller"].buttonLUp.released(lambda: edges.append(kernel.now))
+
+    report, program, _ = run_program(PROGRAM, duration_ms=MANUAL_START_MS + 2000, driver=driver, setup=watch)
+    lift = [c for c in report["kernel"].commands if c[1] == LIFT_PORT and c[0] >= MANUAL_START_MS]
+    # each edge commands the lift at the time it was seen, as Event.broadcast did
+    assert [(c[0], c[2]) for c in lift] == list(zip(edges, ["spin", "stop", "spin", "stop"]))
+    assert program["dispatcher"].latency_max == 0
+
+
+def test_burst_runs_the_first_event_now_and_the_last_on_the_next_tick():
+    posted = {}
+
+    def burst(program):
+        dispatcher = program["dispatcher"]
+
+        def post_burst():
+            program["sleep"](MANUAL_START_MS + 3)
+            posted["at"] = harness.vex.kernel().now
+            posted["before"] = (dispatcher.dispatched, dispatcher.coalesced)
+            for name in ("LUP_PRESS", "LUP_RELEASE", "LUP_PRESS", "LUP_RELEASE", "RUP_PRESS", "RUP_RELEASE"):
+                dispatcher.post(program[name])
+
+        program["Thread"](post_burst)
+
+    report, program, _ = run_program(PROGRAM, duration_ms=MANUAL_START_MS + 500, setup=burst)
+    dispatcher = program["dispatcher"]
+    tick_ms = program["DISPATCH_TICK_MS"]
+    at = posted["at"]
+    for port in (LIFT_PORT, CLAW_PORT):
+        commands = [c for c in report["kernel"].commands if c[1] == port and c[0] >= MANUAL_START_MS]
+        # the press runs as it is posted; the last event of the tick (a release) ends it
+        assert [c[2] for c in commands] == ["spin", "stop"]
+        assert commands[0][0] == at
+        assert at < commands[1][0] <= at + tick_ms
+    dispatched, coalesced = posted["before"]
+    # lift: press, then release/press/release coalesce into the last release
+    assert dispatcher.coalesced - coalesced == 2
+    assert dispatcher.dispatched - dispatched == 4
+    assert dispatcher.latency_max <= tick_ms
@@ -0,0 +1,123 @@
+"""
+PoseEstimator (tools/odometry.py) against the simulator's ground-truth drive.
+"""
+
+import math
+
+import pytest
+
+WHEEL_TRAVEL_MM = 200.0
+TRACK_WIDTH_MM = 176.0
+
+
+def _run_trajectory(sim, brain_module, segments, slip=0.0, gyro_drift_dps=0.0):
+    """
+    Drive (left %, right %, ms) segments with the estimator updating in its
+    own thread, and return (estimated pose, true pose, distance driven in mm).
+    """
+    odometry = brain_module(("tools/odometry.py", "# ODOMETRY"))
+    left, right = odometry["Motor"](1), odometry["Motor"](6)
+    world = sim.attach_drive([left], [right], WHEEL_TRAVEL_MM, TRACK_WIDTH_MM, slip, gyro_drift_dps)
+    estimator = odometry["PoseEstimator"](odometry["Inertial"](), [left], [right], WHEEL_TRAVEL_MM, TRACK_WIDTH_MM)
+    FORWARD, PERCENT = odometry["FORWARD"], odometry["PERCENT"]
+
+    def script():
+        for left_pct, right_pct, ms in segments:
+            left.spin(FORWARD, left_pct, PERCENT)
+            right.spin(FORWARD, right_pct, PERCENT)
+            odometry["sleep"](ms)
+        left.stop()
+        right.stop()
+
+    odometry["Thread"](estimator.run)
+    odometry["Thread"](script)
+    # a few estimator periods after the robot stopped, so the estimate settles
+    sim.run_until(sum(ms for _, _, ms in segments) + 100)
+    world.update()
+    travelled = (abs(left.position()) + abs(right.position())) / 2 * WHEEL_TRAVEL_MM / 360.0
+    return estimator.pose(), world.pose(), travelled
+
+
+def _errors(estimate, truth):
+    return math.hypot(estimate[0] - truth[0], estimate[1] - truth[1]), abs(estimate[2] - truth[2])
+
+
+# Without slip or drift the estimator integrates the same arcs as the world,
+# so it must match to within rounding and the tick a segment changes on
+EXACT_POSITION_MM = 2.0
+EXACT_HEADING_DEG = 0.5
+
+
+@pytest.mark.parametrize("name, segments, expected_heading", [
+    ("straight", [(50, 50, 2000)], 0.0),
+    ("spin", [(40, -40, 1500)], None),
+    ("arc", [(60, 30, 2500)], None),
+    ("square", [(50, 50, 1000), (40, -40, 650), (50, 50, 1000), (-40, 40, 650), (-50, -50, 1000)], 0.0),
+])
+def test_estimate_tracks_simulated_trajectory(sim, brain_module, name, segments, expected_heading):
+    estimate, truth, _ = _run_trajectory(sim, brain_module, segments)
+    position_error, heading_error = _errors(estimate, truth)
+    assert position_error < EXACT_POSITION_MM, (name, estimate, truth)
+    assert heading_error < EXACT_HEADING_DEG, (name, estimate, truth)
+    if expected_heading is not None:
+        assert truth[2] == pytest.approx(expected_heading)
+    else:
+        assert abs(truth[2]) > 10, "trajectory %s should turn" % name
+
+
+def test_estimate_error_is_bounded_by_slip_and_gyro_drift(sim, brain_module):
+    slip, drift_dps = 0.05, 0.5
+    segments = [(50, 50, 2000), (40, -40, 1000), (60, 30, 2000)]
+    estimate, truth, travelled = _run_trajectory(sim, brain_module, segments, slip, drift_dps)
+    position_error, heading_error = _errors(estimate, truth)
+    seconds = (sum(ms for _, _, ms in segments) + 100) / 1000.0
+    # the heading is off by the integrated drift; the encoders overstate
+    # every mm by the slip, and the drifted heading bends the path further
+    assert heading_error == pytest.approx(drift_dps * seconds, abs=EXACT_HEADING_DEG)
+    assert position_error < slip * travelled + math.radians(heading_error) * travelled
+
+
+class _RacingBuffer(list):
+    """
+    A published-pose buffer that runs `race` (the writer) right after a
+    reader has read item race_index, as a thread switch at that point would.
+    """
+
+    race = None
+    race_index = 0
+
+    def __getitem__(self, index):
+        value = list.__getitem__(self, index)
+        if index == self.race_index and self.race is not None:
+            race, self.race = self.race, None
+            race()
+        return value
+
+
+def _racing_estimator(brain_module, race_index):
+    odometry = brain_module(("tools/odometry.py", "# ODOMETRY"))
+    motor = odometry["Motor"](1)
+    estimator = odometry["PoseEstimator"](odometry["Inertial"](), [motor], [motor])
+    estimator.buffers = (_RacingBuffer(estimator.buffers[0]), _RacingBuffer(estimator.buffers[1]))
+
+    def publish_twice():
+        # the second publish lands on the buffer the reader is reading
+        for value in (1.0, 2.0):
+            estimator.state[0] = estimator.state[1] = estimator.state[2] = value
+            estimator._publish()
+
+    buf = estimator.buffers[estimator.active]
+    buf.race = publish_twice
+    buf.race_index = race_index
+    return estimator
+
+
+def test_pose_retries_instead_of_returning_a_torn_pose(brain_module):
+    # the writer overwrites the buffer after the reader took x but before y
+    estimator = _racing_estimator(brain_module, 0)
+    assert estimator.pose() == (2.0, 2.0, 2.0)
+
+
+def test_heading_retries_when_its_buffer_is_rewritten(brain_module):
+    estimator = _racing_estimator(brain_module, 2)
+    assert estimator.heading() == 2.0
@@ -0,0 +1,62 @@
+"""
+Recording driver input on the brain (2025-2026Season/src/main.py's
+InputRecorder) and replaying it with sim/replay.py.
+"""
+
+import pytest
+
+import harness
+import replay
+from conftest import REPO_ROOT, run_program
+
+PROGRAM = REPO_ROOT + "/2025-2026Season/src/main.py"
+
+
+def test_replay_reproduces_the_recorded_motor_trace(tmp_path):
+    duration_ms = 20000
+    direct, _, _ = run_program("2025-2026Season/src/main.py", duration_ms=duration_ms, driver=harness.sweep_driver)
+    direct_rows = replay.trace_rows(direct["kernel"].commands)
+
+    records = replay.capture(PROGRAM, harness.sweep_driver, duration_ms)
+    path = str(tmp_path / "drive.vexrec")
+    replay.write_recording(path, records)
+    replayed = replay.replay(PROGRAM, replay.read_recording(path))
+    assert replayed["errors"] == []
+    # the replay runs on past the last record; compare the recorded span
+    replayed_rows = [row for row in replay.trace_rows(replayed["kernel"].commands) if row["t"] < duration_ms]
+    direct_rows = [row for row in direct_rows if row["t"] < duration_ms]
+    assert len(direct_rows) > 100
+    assert replay.first_difference(direct_rows, replayed_rows) is None
+
+
+def _changing_every_tick(now_ms):
+    # a new stick position on every 20 ms drive tick, the recorder's worst case
+    return {"axisD": int(now_ms // 20) % 200 - 100}
+
+
+def test_a_full_match_is_recorded_without_loss():
+    duration_ms = 120000
+    _, program, console = run_program("2025-2026Season/src/main.py", duration_ms=duration_ms,
+                                      driver=_changing_every_tick)
+    recorder = program["input_recorder"]
+    assert recorder.written > 2 * recorder.capacity
+    assert recorder.lost == 0
+    records = replay.decode_records(replay.parse_console(console))
+    # everything but the last flush period reached the console
+    assert len(records) >= recorder.written - recorder.flush_ms // 20
+    assert records[-1][0] >= duration_ms - 2 * recorder.flush_ms
+    assert [r[0] for r in records] == sorted(r[0] for r in records)
+
+
+def test_parse_console_uses_the_last_start_and_rejects_gaps():
+    first = replay.encode_records([(0, 1, 0, 0, 0, 0)])
+    second = replay.encode_records([(20, 2, 5, 0, 0, -5), (40, 0, 0, 0, 0, 0)])
+    text = ("#VEXREC START\n#VEXREC 0 %s\nprogram restarted\n#VEXREC START\n#VEXREC 0 %s\n#VEXREC 2 %s\n"
+            % (first.hex(), second.hex(), first.hex()))
+    assert replay.parse_console(text) == second + first
+
+    with pytest.raises(ValueError) as e:
+        replay.parse_console("#VEXREC START\n#VEXREC 0 %s\n#VEXREC 3 %s\n" % (second.hex(), first.hex()))
+    assert "records 2-2 missing" in str(e.value)
+    with pytest.raises(ValueError):
+        replay.parse_console("#VEXTLM 0 00\n")
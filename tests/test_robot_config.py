@@ -0,0 +1,91 @@
+"""
+tools/robot_config.py: loading robot_config.json, the runtime's
+validate_config as the loader runs it, and rendering.
+"""
+
+import copy
+import json
+
+import pytest
+
+import robot_config
+
+
+@pytest.fixture(scope="module")
+def validate():
+    return robot_config.load_validator(robot_config.runtime_source())
+
+
+@pytest.fixture
+def config():
+    return copy.deepcopy(robot_config.load_robots()["season-tank"])
+
+
+def test_load_robots_merges_defaults_one_level_deep(tmp_path):
+    path = tmp_path / "robot_config.json"
+    path.write_text(json.dumps({
+        "defaults": {"max_speed": 75, "periods_ms": {"drive": 10, "arm": 20}, "motors": {"a": {"port": 1}}},
+        "robots": {"bot": {"max_speed": 50, "periods_ms": {"drive": 20}, "motors": {"b": {"port": 2}}}},
+    }))
+    robot = robot_config.load_robots(str(path))["bot"]
+    assert robot["name"] == "bot"
+    assert robot["max_speed"] == 50
+    assert robot["periods_ms"] == {"drive": 20, "arm": 20}
+    # nested dicts are merged one level deep only
+    assert robot["motors"] == {"a": {"port": 1}, "b": {"port": 2}}
+
+
+def test_repo_config_is_valid(validate):
+    for robot in robot_config.load_robots().values():
+        validate(robot)
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda c: c["motors"]["motor_aux_1"].update(port=1), "port 1 is used by both left_drive_1 and motor_aux_1"),
+    (lambda c: c["sensors"]["brain_inertial"].update(port=7), "port 7 is used by both left_drive_2 and brain_inertial"),
+    (lambda c: c["motors"]["motor_aux_1"].update(port=13), "motor_aux_1: port 13 is not 1-12"),
+    (lambda c: c["motors"]["motor_aux_1"].update(port="4"), "motor_aux_1: port 4 is not 1-12"),
+    (lambda c: c["motors"]["motor_aux_1"].update(buttons="EUp"), "motor_aux_1: buttons must be an [up, down] pair"),
+    (lambda c: c["motors"]["motor_aux_1"].update(buttons=["EUp"]), "motor_aux_1: buttons must be an [up, down] pair"),
+    (lambda c: c["motors"]["motor_aux_1"].update(buttons=["EUp", "EDown", "FUp"]),
+     "motor_aux_1: buttons must be an [up, down] pair"),
+    (lambda c: c["motors"]["motor_aux_1"].update(buttons=["EUp", "EUp"]), "motor_aux_1: button EUp is both up and down"),
+    (lambda c: c["motors"]["motor_aux_1"].update(buttons=["EUp", "Start"]), "motor_aux_1: unknown button Start"),
+    (lambda c: c["motors"]["motor_aux_2"].update(buttons=["EDown", "FDown"]),
+     "button EDown is mapped to both motor_aux_1 and motor_aux_2"),
+    (lambda c: c["motors"]["claw_motor"].update(stopping="GLIDE"), "claw_motor: unknown stopping mode GLIDE"),
+    (lambda c: c["drive"].update(left_axis="E"), "unknown controller axis E"),
+    (lambda c: c["drive"]["left"].append("ghost"), "drive motor ghost is not declared"),
+    (lambda c: c["sensors"]["brain_inertial"].update(type="Optical"), "brain_inertial is not an Inertial sensor"),
+    (lambda c: c["telemetry_log"].update(capacity=8, batch=16), "capacity 8 is smaller than its batch 16"),
+    (lambda c: c["telemetry_log"].update(enabled="yes"), "telemetry_log enabled must be true or false"),
+    (lambda c: c["slew"].update(shape="linear"), "unknown slew shape linear"),
+])
+def test_validate_rejects_bad_configs(validate, config, change, message):
+    change(config)
+    with pytest.raises(ValueError) as e:
+        validate(config)
+    assert message in str(e.value)
+
+
+def test_render_refuses_an_invalid_robot_before_writing(config):
+    config["motors"]["motor_aux_2"]["port"] = 12
+    with pytest.raises(ValueError) as e:
+        robot_config.render({"season-tank": config}, robot_config.runtime_source(), robot_config.module_sources())
+    assert str(e.value) == "robot season-tank: port 12 is used by both right_drive_2 and motor_aux_2"
+
+
+def test_rendered_programs_are_up_to_date():
+    results = robot_config.render(robot_config.load_robots(), robot_config.runtime_source(),
+                                  robot_config.module_sources())
+    stale = [path for path, (old, new) in results.items() if old != new]
+    assert stale == []
+
+
+def test_replace_block_keeps_the_text_around_it():
+    text = ("before\n" + robot_config._begin_marker("ODOMETRY") + "old\n"
+            + robot_config._end_marker("ODOMETRY") + "after\n")
+    new = robot_config.replace_block(text, "ODOMETRY", "new\n", "main.py")
+    assert new == text.replace("old\n", "new\n")
+    with pytest.raises(ValueError):
+        robot_config.replace_block("no markers\n", "ODOMETRY", "new\n", "main.py")
@@ -0,0 +1,78 @@
+"""
+The shared runtime (tools/robot_runtime.py) loaded with its modules and a
+robot's config, the way tools/robot_config.py renders it into a program.
+"""
+
+import os
+
+import pytest
+
+import robot_config
+import vex
+from conftest import REPO_ROOT
+
+DRIVE_TICK_MS = 20
+
+
+@pytest.fixture
+def runtime(sim, brain_module):
+    templates = [(os.path.relpath(path, REPO_ROOT), marker.strip()) for _, path, marker in robot_config.SHARED_MODULES]
+    templates.append((os.path.relpath(robot_config.RUNTIME_PATH, REPO_ROOT), robot_config.RUNTIME_MARKER.strip()))
+    return brain_module(*templates, ROBOT_CONFIG=robot_config.load_robots()["season-tank"],
+                        controller=vex.Controller())
+
+
+def _spins(sim, motor, since):
+    return [c for c in sim.commands[since:] if c[1] == motor.port and c[2] == "spin"]
+
+
+def _drive(writer, slot, values):
+    # one spin per drive tick, as the drive loop issues them
+    for value in values:
+        writer.spin(slot, value)
+        vex.sleep(DRIVE_TICK_MS)
+
+
+def test_motor_writer_suppresses_repeated_commands(sim, runtime):
+    writer = runtime["MotorWriter"](10000)
+    motor = vex.Motor(3)
+    slot = writer.add(motor)
+    assert writer.add(motor) == slot
+    start = len(sim.commands)
+    _drive(writer, slot, [50] * 10 + [-20] * 10 + [-20, 0, 0])
+    assert [c[3][1] for c in _spins(sim, motor, start)] == [50, -20, 0]
+    assert (writer.sent, writer.suppressed) == (3, 20)
+
+
+def test_motor_writer_resends_after_refresh_ms(sim, runtime):
+    writer = runtime["MotorWriter"](100)
+    motor = vex.Motor(3)
+    slot = writer.add(motor)
+    start = len(sim.commands)
+    _drive(writer, slot, [50] * 26)
+    # sent at 0 ms, then again at each tick at least 100 ms after the last send
+    assert [c[0] for c in _spins(sim, motor, start)] == [0, 100, 200, 300, 400, 500]
+    assert writer.suppressed == 20
+
+
+def test_motor_writer_never_resends_without_a_refresh(sim, runtime):
+    writer = runtime["MotorWriter"](0)
+    motor = vex.Motor(3)
+    slot = writer.add(motor)
+    start = len(sim.commands)
+    _drive(writer, slot, [75] * 250)
+    assert len(_spins(sim, motor, start)) == 1
+    assert writer.suppressed == 249
+
+
+def test_motor_writer_rates_are_per_second_since_creation(sim, runtime):
+    writer = runtime["MotorWriter"](0)
+    assert writer.rates() == (0, 0)
+    slots = [writer.add(vex.Motor(port)) for port in (2, 3)]
+    for tick in range(50):
+        for slot in slots:
+            writer.spin(slot, tick // 10)
+        vex.sleep(DRIVE_TICK_MS)
+    # 5 values on each of 2 motors in 1 s; the other 90 spins were repeats
+    assert writer.rates() == pytest.approx((10.0, 90.0))
+    assert writer.status() == "cmd/s 10 saved 90"
@@ -0,0 +1,192 @@
+"""
+The simulated vex module (sim/vex.py) and the harness report (sim/harness.py).
+"""
+
+import pytest
+
+import harness
+import vex
+from vex import (AMP, DEGREES, FORWARD, LEFT, MM, MSEC, PERCENT, REVERSE, RIGHT, SECONDS, DriveTrain,
+                 Event, Motor, Thread, Timer, sleep)
+
+# degrees per second at 100% velocity
+FULL_SPEED_DPS = vex.MOTOR_MAX_RPM * 6.0
+
+
+def test_sleep_advances_virtual_time_only(sim):
+    timer = Timer()
+    sleep(250)
+    sleep(1.5, SECONDS)
+    assert sim.now == 1750
+    assert timer.time(MSEC) == 1750
+    assert timer.time(SECONDS) == 1.75
+
+
+def test_threads_resume_in_virtual_time_order(sim):
+    log = []
+
+    def loop(name, period, count):
+        for _ in range(count):
+            log.append((sim.now, name))
+            sleep(period)
+
+    Thread(loop, ("fast", 10, 6))
+    Thread(loop, ("slow", 25, 3))
+    sim.run_until(100)
+    assert log == [(0, "fast"), (0, "slow"), (10, "fast"), (20, "fast"), (25, "slow"), (30, "fast"),
+                   (40, "fast"), (50, "slow"), (50, "fast")]
+    assert sim.alive_tasks() == []
+
+
+def test_thread_stop_unwinds_at_its_next_sleep(sim):
+    ticks = []
+
+    def loop():
+        while True:
+            ticks.append(sim.now)
+            sleep(10)
+
+    thread = Thread(loop)
+    sim.run_until(35)
+    thread.stop()
+    sim.run_until(100)
+    assert ticks == [0, 10, 20, 30]
+    assert sim.alive_tasks() == []
+
+
+def test_event_broadcast_runs_each_callback_in_its_own_thread(sim):
+    ran = []
+
+    def callback(name, delay):
+        sleep(delay)
+        ran.append((sim.now, name))
+
+    event = Event()
+    event(callback, ("a", 30))
+    event.set(callback, ("b", 10))
+    tasks = event.broadcast()
+    assert len(tasks) == 2 and ran == []
+    sim.run_until(50)
+    assert ran == [(10, "b"), (30, "a")]
+
+    ran.clear()
+    start = sim.now
+    event.broadcast_and_wait()
+    assert sim.now == start + 30
+    assert ran == [(start + 10, "b"), (start + 30, "a")]
+
+
+def test_motor_position_integrates_commanded_velocity(sim):
+    motor = Motor(1)
+    motor.spin(FORWARD, 50, PERCENT)
+    sleep(1000)
+    assert motor.position(DEGREES) == pytest.approx(0.5 * FULL_SPEED_DPS)
+    motor.spin(REVERSE, 25, PERCENT)
+    sleep(400)
+    assert motor.position(DEGREES) == pytest.approx(0.5 * FULL_SPEED_DPS - 0.25 * 0.4 * FULL_SPEED_DPS)
+    motor.stop()
+    sleep(1000)
+    assert motor.velocity(PERCENT) == 0
+    assert motor.current(AMP) == 0
+    assert [c[2] for c in sim.commands] == ["spin", "spin", "stop"]
+
+
+def test_motor_stalls_at_its_end_stop(sim):
+    motor = Motor(4)
+    motor.sim_limits = (-90.0, 90.0)
+    motor.spin(FORWARD, 100, PERCENT)
+    sleep(50)
+    assert not motor._stalled
+    assert motor.current(AMP) < Motor.STALL_CURRENT
+    sleep(1000)
+    assert motor.position(DEGREES) == 90.0
+    assert motor.velocity(PERCENT) == 0
+    assert motor.current(AMP) == Motor.STALL_CURRENT
+    assert not motor.is_spinning()
+    motor.set_max_torque(50, PERCENT)
+    assert motor.current(AMP) == pytest.approx(Motor.STALL_CURRENT / 2)
+    motor.spin(REVERSE, 100, PERCENT)
+    sleep(100)
+    assert motor.position(DEGREES) < 90.0 and motor.current(AMP) < Motor.STALL_CURRENT
+
+
+def test_spin_for_waits_until_the_target(sim):
+    motor = Motor(2)
+    motor.spin_for(FORWARD, 180, DEGREES, 25, PERCENT)
+    assert sim.now == pytest.approx(1000.0 * 180 / (0.25 * FULL_SPEED_DPS))
+    assert motor.position(DEGREES) == pytest.approx(180)
+    assert motor.is_done()
+    motor.spin_to_position(0, DEGREES, 50, PERCENT, wait=False)
+    assert not motor.is_done()
+    sleep(1000)
+    assert motor.position(DEGREES) == pytest.approx(0)
+
+
+def test_drivetrain_moves_take_distance_over_speed(sim):
+    left, right = Motor(1), Motor(6)
+    drivetrain = DriveTrain(left, right, 200, 176, 176, MM, 1)
+    wheel_mm_per_s = 0.5 * vex.MOTOR_MAX_RPM / 60.0 * 200
+
+    drivetrain.drive_for(FORWARD, 300, MM, 50, PERCENT)
+    assert sim.now == pytest.approx(1000.0 * 300 / wheel_mm_per_s)
+    assert left.position() == pytest.approx(300 / 200 * 360)
+    assert drivetrain.is_done()
+
+    start = sim.now
+    drivetrain.turn_for(RIGHT, 90, DEGREES, 50, PERCENT)
+    arc_mm = 3.141592653589793 * 176 * 90 / 360
+    assert sim.now - start == pytest.approx(1000.0 * arc_mm / wheel_mm_per_s)
+    assert sim.world.pose()[2] == pytest.approx(90, abs=0.01)
+
+    drivetrain.turn_for(LEFT, 90, DEGREES, 50, PERCENT, wait=False)
+    assert drivetrain.is_moving()
+    sleep(2000)
+    assert drivetrain.is_done()
+    assert sim.world.pose()[2] == pytest.approx(0, abs=0.01)
+
+
+def test_controller_button_edges_spawn_callbacks(sim):
+    presses = [(100, 300), (500, 520)]
+    sim.controller_input = lambda now: {"buttonEUp": any(a <= now < b for a, b in presses)}
+    controller = vex.Controller()
+    edges = []
+    controller.buttonEUp.pressed(lambda: edges.append(("pressed", sim.now)))
+    controller.buttonEUp.released(lambda: edges.append(("released", sim.now)))
+
+    def poll():
+        while True:
+            sleep(10)
+
+    Thread(poll)
+    sim.run_until(1000)
+    assert edges == [("pressed", 100), ("released", 300), ("pressed", 500), ("released", 520)]
+    assert not controller.buttonEUp.pressing()
+
+
+def test_run_until_idle_stops_when_the_program_finishes(sim):
+    Thread(sleep, (120,))
+    sim.run_until_idle(10000)
+    assert sim.now == 120
+
+
+def test_thread_report_mean_never_exceeds_max(tmp_path):
+    program = tmp_path / "main.py"
+    program.write_text(
+        "from vex import *\n"
+        "def busy():\n"
+        "    while True:\n"
+        "        total = 0\n"
+        "        for i in range(2000):\n"
+        "            total += i\n"
+        "        sleep(10)\n"
+        "def done():\n"
+        "    sleep(5)\n"
+        "Thread(busy)\n"
+        "Thread(done)\n")
+    report = harness.run_program(str(program), 500)
+    assert report["errors"] == []
+    for thread in report["threads"]:
+        assert thread["host_us_per_iteration"] <= thread["host_us_max_iteration"]
+    busy = report["threads"][0]
+    assert busy["iterations"] == 50
+    assert busy["period_mean_ms"] == 10
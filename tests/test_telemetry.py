@@ -0,0 +1,119 @@
+"""
+TelemetryLog (tools/telemetry_log.py) through the console to
+tools/telemetry_decode.py, and the runtime's use of it.
+"""
+
+import contextlib
+import csv
+import io
+
+import pytest
+
+import harness
+import telemetry_decode
+from conftest import run_program
+
+CHANNELS = (("buttons", 1), ("drive_left", 10), ("heading_deg", 10), ("amps", 1000))
+
+
+def _record(log, t):
+    row = log.row
+    row[0] = t % 256
+    row[1] = -t / 10.0
+    row[2] = ((t * 7) % 360) - 180.0
+    row[3] = 0.001 * (t % 1000)
+    log.commit(t)
+
+
+def test_round_trip_through_a_wrapping_ring(brain_module, tmp_path):
+    module = brain_module(("tools/telemetry_log.py", "# TELEMETRY"))
+    log = module["TelemetryLog"](CHANNELS, capacity=8, batch=3, flush_ms=100)
+    console = io.StringIO()
+    with contextlib.redirect_stdout(console):
+        for t in range(0, 60, 10):
+            _record(log, t)
+        log.flush()
+        # 11 records without a flush: the ring of 8 keeps the newest, 3 are lost
+        for t in range(60, 170, 10):
+            _record(log, t)
+        log.flush()
+        _record(log, 170)
+        log.flush()
+    assert log.lost == 3
+
+    text = console.getvalue()
+    lines = text.splitlines()
+    assert lines[0] == "#VEXTLM HEADER 12 buttons:1,drive_left:10,heading_deg:10,amps:1000"
+    assert all(len(line.split()[2]) <= 3 * 12 * 2 for line in lines[1:])
+
+    decoded = telemetry_decode.parse_console("noise before the log\n" + text)
+    assert decoded.channels == list(CHANNELS)
+    assert decoded.gaps() == [(6, 3)]
+    expected_times = [t for t in range(0, 180, 10) if not 60 <= t < 90]
+    rows = list(decoded.rows())
+    assert [row[1] for row in rows] == expected_times
+    assert [row[0] for row in rows] == [t // 10 for t in expected_times]
+    for row in rows:
+        t = row[1]
+        assert row[2] == t % 256
+        assert row[3] == pytest.approx(-t / 10.0)
+        assert row[4] == pytest.approx(((t * 7) % 360) - 180.0)
+        assert row[5] == pytest.approx(0.001 * (t % 1000), abs=0.001)
+    assert telemetry_decode.summarize(decoded).endswith("3 lost")
+
+    # .vextlm file, CSV and NPZ all hold the same rows
+    vextlm = tmp_path / "run.vextlm"
+    vextlm.write_bytes(telemetry_decode.encode_log(decoded))
+    reloaded = telemetry_decode.read_log(str(vextlm))
+    assert reloaded.records == decoded.records
+    telemetry_decode.write_csv(str(tmp_path / "run.csv"), reloaded)
+    with open(tmp_path / "run.csv") as f:
+        table = list(csv.reader(f))
+    assert table[0] == ["seq", "time_ms", "buttons", "drive_left", "heading_deg", "amps"]
+    assert [float(v) for v in table[1]] == pytest.approx(rows[0])
+    assert len(table) == 1 + len(rows)
+
+    np = pytest.importorskip("numpy")
+    telemetry_decode.write_npz(str(tmp_path / "run.npz"), reloaded)
+    arrays = np.load(tmp_path / "run.npz")
+    assert list(arrays["time_ms"]) == expected_times
+    assert arrays["heading_deg"] == pytest.approx([row[4] for row in rows])
+
+
+def test_commit_saturates_values_outside_int16(brain_module):
+    module = brain_module(("tools/telemetry_log.py", "# TELEMETRY"))
+    log = module["TelemetryLog"]((("big", 10),), capacity=4, batch=4)
+    console = io.StringIO()
+    with contextlib.redirect_stdout(console):
+        for value in (5000.0, -5000.0, 12.3):
+            log.row[0] = value
+            log.commit(0)
+        log.flush()
+    values = [row[2] for row in telemetry_decode.parse_console(console.getvalue()).rows()]
+    assert values == pytest.approx([3276.7, -3276.8, 12.3])
+
+
+def _spin(now):
+    return {"axisA": 100, "axisD": -100}
+
+
+def test_runtime_logs_a_wrapped_heading_while_spinning():
+    report, program, console = run_program("2025-2026Season/main.py", duration_ms=20000, driver=_spin,
+                                           setup=harness.drive_world([1, 7], [6, 12]))
+    assert abs(report["pose"]["true"][2]) > 720
+    log = telemetry_decode.parse_console(console)
+    assert log.names[-1] == "heading_deg"
+    headings = [row[-1] for row in log.rows()]
+    assert all(-180 <= h < 180 for h in headings)
+    assert min(headings) < -170 and max(headings) > 170
+    assert log.gaps() == []
+
+
+def test_runtime_telemetry_can_be_disabled():
+    def disable(program):
+        program["TELEMETRY_LOG"] = False
+
+    _, program, console = run_program("2025-2026Season/main.py", duration_ms=2000, driver=_spin, setup=disable)
+    assert "#VEXTLM" not in console
+    assert program["telemetry_log"].written == 0
+    assert program["ROBOT_CONFIG"]["telemetry_log"]["enabled"] is True
@@ -0,0 +1,110 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       motion_profile.py                                            #
+# 	Description:  Trapezoidal and S-curve motion profiles for IQ2 programs    #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+#
+# Everything below the PROFILE marker is copied into each program by
+# tools/robot_config.py. Edit this file, not the copies, then run
+#
+#     python tools/robot_config.py render
+#
+# It only needs math, so it can also be imported on the desktop.
+
+# PROFILE
+
+import math
+
+PROFILE_TRAPEZOID = "trapezoid"
+PROFILE_SCURVE = "scurve"
+
+# Smart motor speed at 100 percent, degrees per second
+MOTOR_DPS_AT_FULL = 720.0
+
+#
+# Fraction of the way through a ramp, 0 to 1, for progress 0 to 1.
+#
+def ramp_shape(progress, shape):
+    if shape == PROFILE_SCURVE:
+        return (1 - math.cos(math.pi * progress)) / 2
+    return progress
+
+#
+# Teleop slew limiter. steps[v] is the largest change in output allowed in
+# one tick while the output is at |v| percent, so a tick costs one list
+# index. A trapezoid ramps at a constant rate, reaching full speed from rest
+# in ramp_ms. An S-curve follows (1 - cos) / 2 over the same time: its steps
+# are smallest near rest and near full speed and largest at half speed,
+# never below min_step so the output always gets moving.
+#
+class SlewTable:
+    def __init__(self, ramp_ms, tick_ms, shape=PROFILE_SCURVE, min_step=1.0):
+        self.ramp_ms = ramp_ms
+        self.shape = shape
+        steps = []
+        for v in range(101):
+            if ramp_ms <= 0:
+                step = 200.0
+            elif shape == PROFILE_SCURVE:
+                step = math.pi * tick_ms / ramp_ms * math.sqrt(v * (100 - v))
+            else:
+                step = 100.0 * tick_ms / ramp_ms
+            if step < min_step:
+                step = min_step
+            steps.append(step)
+        self.steps = steps
+
+    # the output for this tick when moving from current towards target
+    def next(self, current, target):
+        if target > 100:
+            target = 100
+        elif target < -100:
+            target = -100
+        step = self.steps[int(abs(current))]
+        if target > current:
+            if current + step < target:
+                return current + step
+            return target
+        if current - step > target:
+            return current - step
+        return target
+
+#
+# Velocity in percent for each tick of a move of `degrees` motor degrees.
+# The move ramps up over ramp_ms, cruises at velocity and ramps down over
+# ramp_ms to end at rest, every ramp following the given shape. A move too
+# short to reach velocity gets a lower peak instead, so the table always
+# covers exactly the requested distance. Velocities never drop below
+# min_velocity so the move can finish on its encoder.
+#
+def build_move_profile(degrees, velocity, ramp_ms, tick_ms, shape=PROFILE_SCURVE, min_velocity=5.0):
+    degrees = abs(degrees)
+    peak = abs(velocity)
+    ramp_s = ramp_ms / 1000.0
+    peak_dps = peak * MOTOR_DPS_AT_FULL / 100.0
+    # each ramp covers peak * ramp / 2 whatever its shape
+    if peak_dps * ramp_s > degrees:
+        peak_dps = degrees / ramp_s if ramp_s > 0 else peak_dps
+        peak = peak_dps * 100.0 / MOTOR_DPS_AT_FULL
+    cruise_s = 0.0
+    if peak_dps > 0:
+        cruise_s = (degrees - peak_dps * ramp_s) / peak_dps
+    total_ms = 2 * ramp_ms + cruise_s * 1000.0
+
+    table = []
+    t = tick_ms / 2.0
+    while t < total_ms:
+        if t < ramp_ms:
+            v = peak * ramp_shape(t / ramp_ms, shape)
+        elif t > total_ms - ramp_ms:
+            v = peak * ramp_shape((total_ms - t) / ramp_ms, shape)
+        else:
+            v = peak
+        if v < min_velocity:
+            v = min_velocity
+        table.append(v)
+        t += tick_ms
+    if not table:
+        table.append(min_velocity)
+    return table
@@ -0,0 +1,132 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       odometry.py                                                  #
+# 	Description:  Inertial and encoder pose estimation for IQ2 programs       #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+#
+# Everything below the ODOMETRY marker is copied into each program by
+# tools/robot_config.py. Edit this file, not the copies, then run
+#
+#     python tools/robot_config.py render
+#
+# It needs the program's vex imports (sleep, MSEC, DEGREES) and brain.
+
+# ODOMETRY
+
+import math
+
+#
+# Pose estimator for a differential drive. Each update takes the change in
+# the drive encoders since the last one for distance, and the change in
+# heading from the inertial sensor blended with the heading change the
+# encoders imply (heading_weight 1 trusts the inertial sensor only), then
+# advances (x, y, heading) along the mean heading of the step.
+#
+# x is to the right and y forward of the starting pose, in mm; heading is
+# in degrees, clockwise like the inertial sensor. The update keeps its
+# state in preallocated lists and builds no tuples or lists per tick.
+#
+# The latest pose is published lock-free for other threads: it is written
+# to the inactive one of two buffers, each guarded by a sequence number
+# that is odd while the buffer is being written, and then the active index
+# is flipped. pose() retries if it raced with a write.
+#
+class PoseEstimator:
+    def __init__(self, inertial, left, right, wheel_travel_mm=200, track_width_mm=176,
+                 heading_weight=1.0, period_ms=10):
+        self.inertial = inertial
+        self.left = tuple(left)
+        self.right = tuple(right)
+        self.mm_per_degree = wheel_travel_mm / 360.0
+        self.track_width_mm = track_width_mm
+        self.heading_weight = heading_weight
+        self.period_ms = period_ms
+        # x, y, heading (deg), last left, last right, last inertial rotation
+        self.state = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        # published poses: x, y, heading, sequence
+        self.buffers = ([0.0, 0.0, 0.0, 0], [0.0, 0.0, 0.0, 0])
+        self.active = 0
+        self.updates = 0
+        self.reset(0, 0, 0)
+
+    def _side(self, motors):
+        total = 0.0
+        for motor in motors:
+            total += motor.position(DEGREES)
+        return total / len(motors)
+
+    # restart the estimate at the given pose, e.g. at a known field position
+    def reset(self, x, y, heading):
+        state = self.state
+        state[0] = x
+        state[1] = y
+        state[2] = heading
+        state[3] = self._side(self.left)
+        state[4] = self._side(self.right)
+        state[5] = self.inertial.rotation(DEGREES)
+        self._publish()
+
+    def update(self):
+        state = self.state
+        left = self._side(self.left)
+        right = self._side(self.right)
+        rotation = self.inertial.rotation(DEGREES)
+
+        d_left = (left - state[3]) * self.mm_per_degree
+        d_right = (right - state[4]) * self.mm_per_degree
+        d_imu = rotation - state[5]
+        d_encoder = math.degrees((d_left - d_right) / self.track_width_mm)
+        d_heading = self.heading_weight * d_imu + (1 - self.heading_weight) * d_encoder
+
+        distance = (d_left + d_right) / 2
+        mid = math.radians(state[2] + d_heading / 2)
+        state[0] += distance * math.sin(mid)
+        state[1] += distance * math.cos(mid)
+        state[2] += d_heading
+        state[3] = left
+        state[4] = right
+        state[5] = rotation
+        self.updates += 1
+        self._publish()
+
+    def _publish(self):
+        buf = self.buffers[1 - self.active]
+        buf[3] += 1
+        buf[0] = self.state[0]
+        buf[1] = self.state[1]
+        buf[2] = self.state[2]
+        buf[3] += 1
+        self.active = 1 - self.active
+
+    # the latest (x, y, heading); safe to call from any thread
+    def pose(self):
+        while True:
+            buf = self.buffers[self.active]
+            seq = buf[3]
+            x = buf[0]
+            y = buf[1]
+            heading = buf[2]
+            if seq % 2 == 0 and buf[3] == seq:
+                return x, y, heading
+
+    # the latest heading only, without building a tuple
+    def heading(self):
+        while True:
+            buf = self.buffers[self.active]
+            seq = buf[3]
+            heading = buf[2]
+            if seq % 2 == 0 and buf[3] == seq:
+                return heading
+
+    # update forever at period_ms against a fixed deadline, for its own thread
+    def run(self):
+        deadline = brain.timer.time(MSEC)
+        while True:
+            self.update()
+            deadline += self.period_ms
+            now = brain.timer.time(MSEC)
+            if deadline > now:
+                sleep(deadline - now)
+            else:
+                deadline = now
@@ -0,0 +1,228 @@
+"""
+Render robot_config.json into the brain programs.
+
+The IQ2 brain runs a single main.py and cannot read files, so every
+driver-control program carries generated copies of: its robot's entry from
+robot_config.json (between the ROBOT CONFIG markers), the shared modules in
+SHARED_MODULES (motion profiles, odometry, the telemetry log and the screen
+layout, each between its own markers)
+and the shared runtime from tools/robot_runtime.py (ROBOT RUNTIME). The
+runtime builds all devices from the config at startup and runs the one
+drive_task every robot shares. Programs in MODULE_PROGRAMS get only the
+shared modules.
+
+Each robot entry is merged over "defaults" (nested dicts are merged one level
+deep) and validated with the runtime's own validate_config before anything is
+written, so port collisions are caught on the desktop as well as on the brain.
+
+Usage:
+    python tools/robot_config.py render        # rewrite the generated blocks
+    python tools/robot_config.py check         # exit 1 if any program is stale
+    python tools/robot_config.py show practice-tank
+"""
+
+import argparse
+import ast
+import copy
+import json
+import os
+import pprint
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(REPO_ROOT, "robot_config.json")
+RUNTIME_PATH = os.path.join(REPO_ROOT, "tools", "robot_runtime.py")
+RUNTIME_MARKER = "# RUNTIME\n"
+
+BLOCKS = {
+    "ROBOT CONFIG": "robot_config.json",
+    "ROBOT RUNTIME": "tools/robot_runtime.py",
+    "MOTION PROFILE": "tools/motion_profile.py",
+    "ODOMETRY": "tools/odometry.py",
+    "TELEMETRY LOG": "tools/telemetry_log.py",
+    "SCREEN LAYOUT": "tools/screen_layout.py",
+}
+
+# Brain-side modules rendered into every program: block -> (template, marker)
+SHARED_MODULES = (
+    ("MOTION PROFILE", os.path.join(REPO_ROOT, "tools", "motion_profile.py"), "# PROFILE\n"),
+    ("ODOMETRY", os.path.join(REPO_ROOT, "tools", "odometry.py"), "# ODOMETRY\n"),
+    ("TELEMETRY LOG", os.path.join(REPO_ROOT, "tools", "telemetry_log.py"), "# TELEMETRY\n"),
+    ("SCREEN LAYOUT", os.path.join(REPO_ROOT, "tools", "screen_layout.py"), "# SCREEN\n"),
+)
+
+# Programs without a robot config that still get the shared modules
+MODULE_PROGRAMS = ("ExampleSetup/src/main.py",)
+
+
+def _begin_marker(block):
+    return "# ---- BEGIN %s: generated by tools/robot_config.py from %s, do not edit ----\n" % (block, BLOCKS[block])
+
+
+def _end_marker(block):
+    return "# ---- END %s ----\n" % block
+
+
+def load_robots(path=CONFIG_PATH):
+    """
+    Load every robot from the config file with defaults applied.
+
+    Args:
+        path: Path of robot_config.json.
+
+    Returns:
+        dict: Robot name -> merged config, each with a "name" key.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    defaults = data.get("defaults", {})
+    robots = {}
+    for name, entry in data["robots"].items():
+        config = copy.deepcopy(defaults)
+        for key, value in entry.items():
+            if isinstance(value, dict) and isinstance(config.get(key), dict):
+                config[key] = dict(config[key], **value)
+            else:
+                config[key] = copy.deepcopy(value)
+        config["name"] = name
+        robots[name] = config
+    return robots
+
+
+def template_source(path, marker):
+    """
+    Return the part of a brain-side template below its marker line, which is
+    what gets copied into programs.
+    """
+    with open(path) as f:
+        text = f.read()
+    if marker not in text:
+        raise ValueError("%s has no %r line" % (path, marker.strip()))
+    return text.split(marker, 1)[1].lstrip("\n")
+
+
+def runtime_source(path=RUNTIME_PATH):
+    return template_source(path, RUNTIME_MARKER)
+
+
+def module_sources():
+    """
+    Return the shared modules as (block, source) pairs.
+    """
+    return [(block, template_source(path, marker)) for block, path, marker in SHARED_MODULES]
+
+
+def load_validator(source):
+    """
+    Pull validate_config and the constants it uses out of the runtime source,
+    without running the rest of it (which needs the brain's vex module).
+
+    Args:
+        source: The runtime source.
+
+    Returns:
+        function: validate_config(config), raising ValueError on a bad config.
+    """
+    tree = ast.parse(source)
+    wanted = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "validate_config":
+            wanted.append(node)
+        elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets):
+            try:
+                ast.literal_eval(node.value)
+            except ValueError:
+                continue
+            wanted.append(node)
+    namespace = {}
+    exec(compile(ast.Module(body=wanted, type_ignores=[]), RUNTIME_PATH, "exec"), namespace)
+    return namespace["validate_config"]
+
+
+def config_block(config):
+    body = dict((k, v) for k, v in config.items() if k != "program")
+    return "ROBOT_CONFIG = " + pprint.pformat(body, width=100, sort_dicts=False) + "\n"
+
+
+def replace_block(text, block, body, path):
+    """
+    Replace the contents between a block's BEGIN and END markers.
+    """
+    begin = text.find("# ---- BEGIN %s:" % block)
+    end = text.find(_end_marker(block))
+    if begin < 0 or end < 0:
+        raise ValueError("%s has no %s markers" % (path, block))
+    return text[:begin] + _begin_marker(block) + body + _end_marker(block) + text[end + len(_end_marker(block)):]
+
+
+def render(robots, runtime, modules):
+    """
+    Compute the new contents of every program.
+
+    Returns:
+        dict: Program path -> (old text, new text).
+    """
+    validate = load_validator(runtime)
+    results = {}
+    for name, config in robots.items():
+        try:
+            validate(config)
+        except (KeyError, ValueError) as e:
+            raise ValueError("robot %s: %s" % (name, e))
+        path = os.path.join(REPO_ROOT, config["program"])
+        with open(path) as f:
+            old = f.read()
+        new = replace_block(old, "ROBOT CONFIG", config_block(config), path)
+        for block, source in modules:
+            new = replace_block(new, block, source, path)
+        new = replace_block(new, "ROBOT RUNTIME", runtime, path)
+        results[path] = (old, new)
+    for program in MODULE_PROGRAMS:
+        path = os.path.join(REPO_ROOT, program)
+        with open(path) as f:
+            old = f.read()
+        new = old
+        for block, source in modules:
+            new = replace_block(new, block, source, path)
+        results[path] = (old, new)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render robot_config.json into the brain programs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("render", help="rewrite the generated blocks in every program")
+    sub.add_parser("check", help="exit 1 if any program's generated blocks are out of date")
+    p = sub.add_parser("show", help="print a robot's merged config")
+    p.add_argument("robot")
+    args = parser.parse_args(argv)
+
+    robots = load_robots()
+    if args.command == "show":
+        print(config_block(robots[args.robot]), end="")
+        return 0
+
+    try:
+        results = render(robots, runtime_source(), module_sources())
+    except ValueError as e:
+        print("Error: %s" % e)
+        return 1
+
+    stale = 0
+    for path, (old, new) in results.items():
+        rel = os.path.relpath(path, REPO_ROOT)
+        if old == new:
+            print("%s: up to date" % rel)
+            continue
+        stale += 1
+        if args.command == "render":
+            with open(path, "w") as f:
+                f.write(new)
+            print("%s: rendered" % rel)
+        else:
+            print("%s: out of date" % rel)
+    return 1 if args.command == "check" and stale else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
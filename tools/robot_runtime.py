@@ -0,0 +1,515 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       robot_runtime.py                                             #
+# 	Description:  Shared driver-control runtime for every IQ2 robot           #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+#
+# Everything below the RUNTIME marker is copied into each driver-control
+# program by tools/robot_config.py, right after that program's ROBOT_CONFIG.
+# Edit this file, not the copies, then run
+#
+#     python tools/robot_config.py render
+#
+# It expects the program to have defined brain and controller already, and
+# the motion profiles, odometry, telemetry log and screen layout
+# (tools/motion_profile.py, tools/odometry.py, tools/telemetry_log.py,
+# tools/screen_layout.py) to be rendered above it.
+
+# RUNTIME
+
+# Controller button bits in ControllerState.buttons
+BUTTON_BITS = {
+    "LUp": 1, "LDown": 2, "RUp": 4, "RDown": 8,
+    "EUp": 16, "EDown": 32, "FUp": 64, "FDown": 128,
+}
+AXIS_NAMES = ("A", "B", "C", "D")
+STOPPING_NAMES = ("COAST", "BRAKE", "HOLD")
+SENSOR_TYPE_NAMES = ("Inertial", "Optical", "Touchled", "Distance", "Bumper")
+SLEW_SHAPES = ("trapezoid", "scurve")
+
+#
+# Check a robot config before anything is built from it. Raises ValueError
+# naming the first problem found: two devices on one port, a port outside
+# 1-12, an unknown axis, button, brake mode, sensor type or slew shape, a
+# motor's buttons that are not a pair of two different buttons, a button
+# mapped to two motors, a drive motor that is not declared, an odometry
+# sensor that is not an Inertial, a telemetry enabled flag that is not a
+# bool, or a telemetry ring smaller than one flush batch.
+#
+def validate_config(config):
+    used_ports = {}
+    devices = list(config["motors"].items()) + list(config.get("sensors", {}).items())
+    for name, spec in devices:
+        port = spec.get("port")
+        if port is None:
+            continue
+        if not isinstance(port, int) or port < 1 or port > 12:
+            raise ValueError("%s: port %s is not 1-12" % (name, port))
+        if port in used_ports:
+            raise ValueError("port %d is used by both %s and %s" % (port, used_ports[port], name))
+        used_ports[port] = name
+
+    for name, spec in config["motors"].items():
+        if spec.get("stopping", "COAST") not in STOPPING_NAMES:
+            raise ValueError("%s: unknown stopping mode %s" % (name, spec["stopping"]))
+    for name, spec in config.get("sensors", {}).items():
+        if spec["type"] not in SENSOR_TYPE_NAMES:
+            raise ValueError("%s: unknown sensor type %s" % (name, spec["type"]))
+
+    inertial = config["odometry"]["inertial"]
+    if config.get("sensors", {}).get(inertial, {}).get("type") != "Inertial":
+        raise ValueError("odometry inertial %s is not an Inertial sensor" % inertial)
+
+    log = config["telemetry_log"]
+    if not isinstance(log["enabled"], bool):
+        raise ValueError("telemetry_log enabled must be true or false, not %s" % log["enabled"])
+    if log["capacity"] < log["batch"]:
+        raise ValueError("telemetry_log capacity %d is smaller than its batch %d" % (log["capacity"], log["batch"]))
+
+    if config["slew"]["shape"] not in SLEW_SHAPES:
+        raise ValueError("unknown slew shape %s" % config["slew"]["shape"])
+
+    used_buttons = {}
+    for name, spec in config["motors"].items():
+        if "buttons" not in spec:
+            continue
+        buttons = spec["buttons"]
+        if not isinstance(buttons, (list, tuple)) or len(buttons) != 2:
+            raise ValueError("%s: buttons must be an [up, down] pair, not %s" % (name, buttons))
+        if buttons[0] == buttons[1]:
+            raise ValueError("%s: button %s is both up and down" % (name, buttons[0]))
+        for button in buttons:
+            if button not in BUTTON_BITS:
+                raise ValueError("%s: unknown button %s" % (name, button))
+            if button in used_buttons:
+                raise ValueError("button %s is mapped to both %s and %s" % (button, used_buttons[button], name))
+            used_buttons[button] = name
+
+    drive = config["drive"]
+    if drive["mode"] == "tank":
+        axes = (drive["left_axis"], drive["right_axis"])
+    elif drive["mode"] == "arcade":
+        axes = (drive["forward_axis"], drive["turn_axis"])
+    else:
+        raise ValueError("unknown drive mode %s" % drive["mode"])
+    for axis in axes:
+        if axis not in AXIS_NAMES:
+            raise ValueError("unknown controller axis %s" % axis)
+    for name in list(drive["left"]) + list(drive["right"]):
+        if name not in config["motors"]:
+            raise ValueError("drive motor %s is not declared" % name)
+
+CONTROLLER_BUTTONS = (
+    (controller.buttonLUp, BUTTON_BITS["LUp"]),
+    (controller.buttonLDown, BUTTON_BITS["LDown"]),
+    (controller.buttonRUp, BUTTON_BITS["RUp"]),
+    (controller.buttonRDown, BUTTON_BITS["RDown"]),
+    (controller.buttonEUp, BUTTON_BITS["EUp"]),
+    (controller.buttonEDown, BUTTON_BITS["EDown"]),
+    (controller.buttonFUp, BUTTON_BITS["FUp"]),
+    (controller.buttonFDown, BUTTON_BITS["FDown"]),
+)
+CONTROLLER_AXES = (controller.axisA, controller.axisB, controller.axisC, controller.axisD)
+
+#
+# Snapshot of the controller taken once per tick. Every button is read once
+# into a bitmask and only the axes the robot maps are read, so all the
+# mappings in a tick see the same input and the tick can be replayed from
+# (buttons, axes) alone.
+#
+class ControllerState:
+    __slots__ = ("buttons", "axes", "axis_indexes", "time")
+
+    def __init__(self, axis_indexes):
+        self.buttons = 0
+        self.axes = [0, 0, 0, 0]
+        self.axis_indexes = axis_indexes
+        self.time = 0
+
+    def read(self):
+        buttons = 0
+        for button, bit in CONTROLLER_BUTTONS:
+            if button.pressing():
+                buttons |= bit
+        self.buttons = buttons
+        axes = self.axes
+        for i in self.axis_indexes:
+            axes[i] = CONTROLLER_AXES[i].position()
+        self.time = brain.timer.time(MSEC)
+
+#
+# Motor output layer. Remembers the last command sent to each motor and only
+# sends a new one when the value changes, so an idle controller does not
+# flood the smart ports with identical spin commands every loop.
+# Unchanged commands are still resent every refresh_ms as a safety net, which
+# also restores a motor that lost its state (e.g. after a smart port
+# reconnect); refresh_ms <= 0 never resends. Every motor command in the
+# runtime goes through spin().
+#
+# Motors are registered once at startup with add(), which returns the
+# motor's slot; spin() takes the slot, and the last command of every motor
+# is kept in lists indexed by it, so a tick does no dictionary lookups.
+#
+class MotorWriter:
+    def __init__(self, refresh_ms):
+        self.refresh_ms = refresh_ms
+        self.motors = []
+        self.last_value = []
+        self.last_sent = []
+        self.sent = 0
+        self.suppressed = 0
+        self.started = brain.timer.time(MSEC)
+
+    # register motor and return its slot; a motor added twice keeps one slot
+    def add(self, motor):
+        for slot in range(len(self.motors)):
+            if self.motors[slot] is motor:
+                return slot
+        self.motors.append(motor)
+        self.last_value.append(None)
+        self.last_sent.append(0)
+        return len(self.motors) - 1
+
+    # spin the motor in slot at value percent, skipping the command if nothing changed
+    def spin(self, slot, value):
+        now = brain.timer.time(MSEC)
+        if self.last_value[slot] == value:
+            if self.refresh_ms <= 0 or now - self.last_sent[slot] < self.refresh_ms:
+                self.suppressed += 1
+                return
+        self.motors[slot].spin(FORWARD, value, PERCENT)
+        self.last_value[slot] = value
+        self.last_sent[slot] = now
+        self.sent += 1
+
+    # commands per second sent and suppressed since the writer was created
+    def rates(self):
+        elapsed = (brain.timer.time(MSEC) - self.started) / 1000
+        if elapsed <= 0:
+            return 0, 0
+        return self.sent / elapsed, self.suppressed / elapsed
+
+    def status(self):
+        sent, suppressed = self.rates()
+        return "cmd/s %d saved %d" % (sent, suppressed)
+
+#
+# Fixed-rate scheduler. Each registered loop function runs every period_ms
+# against a fixed deadline (start + n * period), so the period does not drift
+# with how long the loop body takes, and several loops share one thread.
+# A run that ends after its next deadline counts as an overrun, and the
+# missed periods are skipped rather than run back to back.
+#
+class PeriodicTask:
+    def __init__(self, name, func, period_ms):
+        self.name = name
+        self.func = func
+        self.period_ms = period_ms
+        self.deadline = 0
+        self.runs = 0
+        self.overruns = 0
+        self.jitter_total = 0
+        self.jitter_max = 0
+        self.busy_max = 0
+
+    # average lateness of the start of a run (msec)
+    def jitter_mean(self):
+        if self.runs == 0:
+            return 0
+        return self.jitter_total / self.runs
+
+class Scheduler:
+    def __init__(self):
+        self.tasks = []
+
+    def add(self, name, func, period_ms):
+        task = PeriodicTask(name, func, period_ms)
+        self.tasks.append(task)
+        return task
+
+    # run the registered loops forever from the calling thread
+    def run(self):
+        now = brain.timer.time(MSEC)
+        for task in self.tasks:
+            task.deadline = now
+        while True:
+            task = self.tasks[0]
+            for other in self.tasks:
+                if other.deadline < task.deadline:
+                    task = other
+
+            now = brain.timer.time(MSEC)
+            if task.deadline > now:
+                sleep(task.deadline - now)
+                now = brain.timer.time(MSEC)
+
+            late = now - task.deadline
+            task.func()
+            end = brain.timer.time(MSEC)
+
+            task.runs += 1
+            task.jitter_total += late
+            if late > task.jitter_max:
+                task.jitter_max = late
+            if end - now > task.busy_max:
+                task.busy_max = end - now
+
+            task.deadline += task.period_ms
+            if end > task.deadline:
+                task.overruns += 1
+                while task.deadline <= end:
+                    task.deadline += task.period_ms
+
+    # one line per loop: mean/max jitter and overruns
+    def status(self, index):
+        task = self.tasks[index]
+        return "%s j%d/%d o%d" % (task.name, task.jitter_mean(), task.jitter_max, task.overruns)
+
+SENSOR_TYPES = {
+    "Inertial": Inertial,
+    "Optical": Optical,
+    "Touchled": Touchled,
+    "Distance": Distance,
+    "Bumper": Bumper,
+}
+STOPPING_MODES = {"COAST": COAST, "BRAKE": BRAKE, "HOLD": HOLD}
+
+# Telemetry log record: controller input, drive outputs and pose, one per drive tick
+TELEMETRY_CHANNELS = (
+    ("buttons", 1), ("axis_a", 1), ("axis_b", 1), ("axis_c", 1), ("axis_d", 1),
+    ("drive_left", 10), ("drive_right", 10), ("x_mm", 1), ("y_mm", 1), ("heading_deg", 10),
+)
+
+#
+# Builds every device from the config once at startup and precomputes the
+# tables the control loops use, including the slew tables that ramp every
+# output, so the loops themselves only index tuples and lists and never
+# look at the config again.
+#
+class Robot:
+    def __init__(self, config):
+        validate_config(config)
+        self.name = config["name"]
+        self.max_speed = config["max_speed"]
+        self.deadband = config["deadband"]
+        self.periods = config["periods_ms"]
+
+        self.devices = {}
+        for name, spec in config["motors"].items():
+            motor = Motor(getattr(Ports, "PORT%d" % spec["port"]), spec.get("reverse", False))
+            if "max_torque" in spec:
+                motor.set_max_torque(spec["max_torque"], PERCENT)
+            if "stopping" in spec:
+                motor.set_stopping(STOPPING_MODES[spec["stopping"]])
+            self.devices[name] = motor
+        for name, spec in config.get("sensors", {}).items():
+            if spec.get("port") is None:
+                self.devices[name] = SENSOR_TYPES[spec["type"]]()
+            else:
+                self.devices[name] = SENSOR_TYPES[spec["type"]](getattr(Ports, "PORT%d" % spec["port"]))
+
+        drive = config["drive"]
+        self.drive_mode = drive["mode"]
+        self.left = tuple([self.devices[name] for name in drive["left"]])
+        self.right = tuple([self.devices[name] for name in drive["right"]])
+        if self.drive_mode == "tank":
+            self.drive_axes = (AXIS_NAMES.index(drive["left_axis"]), AXIS_NAMES.index(drive["right_axis"]))
+        else:
+            self.drive_axes = (AXIS_NAMES.index(drive["forward_axis"]), AXIS_NAMES.index(drive["turn_axis"]))
+
+        self.writer = MotorWriter(config["motor_refresh_ms"])
+        # writer slots of the drive motors, left then right
+        self.left_slots = tuple([self.writer.add(motor) for motor in self.left])
+        self.right_slots = tuple([self.writer.add(motor) for motor in self.right])
+
+        # (writer slot, up bit, down bit) for every button-driven motor
+        buttons = []
+        for name, spec in config["motors"].items():
+            if "buttons" in spec:
+                up, down = spec["buttons"]
+                buttons.append((self.writer.add(self.devices[name]), BUTTON_BITS[up], BUTTON_BITS[down]))
+        self.button_motors = tuple(buttons)
+
+        axis_indexes = list(self.drive_axes)
+        axis_indexes.sort()
+        self.state = ControllerState(tuple(axis_indexes))
+        # last drive outputs (percent), left then right
+        self.drive_outputs = [0, 0]
+
+        odometry = config["odometry"]
+        self.odometry = PoseEstimator(self.devices[odometry["inertial"]], self.left, self.right,
+                                      odometry["wheel_travel_mm"], odometry["track_width_mm"],
+                                      odometry["heading_weight"], self.periods["drive"])
+
+        slew = config["slew"]
+        self.drive_slew = SlewTable(slew["drive_ramp_ms"], self.periods["drive"], slew["shape"])
+        self.arm_slew = SlewTable(slew["arm_ramp_ms"], self.periods["arm"], slew["shape"])
+
+        log = config["telemetry_log"]
+        self.log = TelemetryLog(TELEMETRY_CHANNELS, log["capacity"], log["batch"], log["flush_ms"])
+        self.scheduler = Scheduler()
+
+    # the drive loop for this robot's drive mode, bound to its tables
+    def drive_step(self):
+        axes = self.state.axes
+        first_axis, second_axis = self.drive_axes
+        left = self.left_slots
+        right = self.right_slots
+        deadband = self.deadband
+        spin = self.writer.spin
+        slew = self.drive_slew.next
+        outputs = self.drive_outputs
+
+        # joystick tank control
+        def tank_step():
+            drive_left = axes[first_axis]
+            drive_right = axes[second_axis]
+
+            # threshold the variable channels so the drive does not
+            # move if the joystick axis does not return exactly to 0
+            if abs(drive_left) < deadband:
+                drive_left = 0
+            if abs(drive_right) < deadband:
+                drive_right = 0
+
+            out_left = slew(outputs[0], drive_left)
+            out_right = slew(outputs[1], drive_right)
+            outputs[0] = out_left
+            outputs[1] = out_right
+            for slot in left:
+                spin(slot, out_left)
+            for slot in right:
+                spin(slot, out_right)
+
+        # arcade drive, forward and turn from separate axes
+        def arcade_step():
+            drive_axis = axes[first_axis]
+            turn_axis = axes[second_axis]
+            drive_left = 0
+            drive_right = 0
+            if abs(drive_axis) + abs(turn_axis) > deadband:
+                drive_left = drive_axis + turn_axis
+                drive_right = drive_axis - turn_axis
+
+            out_left = slew(outputs[0], drive_left)
+            out_right = slew(outputs[1], drive_right)
+            outputs[0] = out_left
+            outputs[1] = out_right
+            for slot in left:
+                spin(slot, out_left)
+            for slot in right:
+                spin(slot, out_right)
+
+        if self.drive_mode == "tank":
+            return tank_step
+        return arcade_step
+
+    # the button loop: each up/down pair gives max, 0 or -max, slew limited
+    def button_step(self):
+        state = self.state
+        table = self.button_motors
+        max_speed = self.max_speed
+        spin = self.writer.spin
+        slew = self.arm_slew.next
+        outputs = [0] * len(table)
+
+        def step():
+            buttons = state.buttons
+            i = 0
+            for slot, up, down in table:
+                value = 0
+                if buttons & up:
+                    value = max_speed
+                if buttons & down:
+                    value -= max_speed
+                value = slew(outputs[i], value)
+                outputs[i] = value
+                spin(slot, value)
+                i += 1
+
+        return step
+
+robot = Robot(ROBOT_CONFIG)
+
+# device names from the config are globals, as they were before the config;
+# this runs once at startup, the loops only use the robot's tables
+globals().update(robot.devices)
+
+# extra per-tick input consumers, each called with the controller snapshot
+INPUT_HOOKS = []
+
+def input_step():
+    robot.state.read()
+    for hook in INPUT_HOOKS:
+        hook(robot.state)
+
+# the pose estimate, readable from any thread
+odometry = robot.odometry
+telemetry_log = robot.log
+
+# Record telemetry and print it to the console (telemetry_log.enabled)
+TELEMETRY_LOG = ROBOT_CONFIG["telemetry_log"]["enabled"]
+
+# record this tick's input, drive outputs and pose into the telemetry log
+def log_step():
+    if not TELEMETRY_LOG:
+        return
+    state = robot.state
+    row = telemetry_log.row
+    row[0] = state.buttons
+    axes = state.axes
+    row[1] = axes[0]
+    row[2] = axes[1]
+    row[3] = axes[2]
+    row[4] = axes[3]
+    row[5] = robot.drive_outputs[0]
+    row[6] = robot.drive_outputs[1]
+    # the pose loop runs in this thread, so its state can be read directly
+    pose = odometry.state
+    row[7] = pose[0]
+    row[8] = pose[1]
+    # the heading is cumulative; wrap it to [-180, 180) so it fits the int16
+    heading = pose[2] % 360
+    if heading >= 180:
+        heading -= 360
+    row[9] = heading
+    telemetry_log.commit(state.time)
+
+# flush the telemetry log to the console while it is enabled, for its own thread
+def telemetry_task():
+    if TELEMETRY_LOG:
+        telemetry_log.run()
+
+# Brain screen fields; only the ones whose text changed are redrawn
+SCREEN_FIELDS = (("commands", 1), ("pose", 2), ("loop1", 3), ("loop2", 4), ("loop3", 5))
+LOOP_FIELDS = ("loop1", "loop2", "loop3")
+screen = ScreenLayout(SCREEN_FIELDS, robot.periods["telemetry"])
+
+# command rates, pose and loop timing on the brain screen; this only updates
+# the fields, the program draws them from a thread of its own (screen.run)
+def telemetry_step():
+    screen.set("commands", robot.writer.status())
+    x, y, heading = odometry.pose()
+    screen.set("pose", "x %d y %d h %d" % (x, y, heading))
+    scheduler = robot.scheduler
+    for i in range(min(len(LOOP_FIELDS), len(scheduler.tasks))):
+        screen.set(LOOP_FIELDS[i], scheduler.status(i))
+
+#
+# All motors are controlled from this function which is run as a separate thread.
+# The input, drive, button and screen field loops all run from it, the drive and
+# button loops reading the controller snapshot taken at the start of the tick.
+# The telemetry log records each drive tick; the program flushes it to the
+# console from a thread of its own (telemetry_task), so printing never
+# delays a drive tick.
+#
+def drive_task():
+    scheduler = robot.scheduler
+    scheduler.add("input", input_step, robot.periods["drive"])
+    scheduler.add("pose", odometry.update, robot.periods["drive"])
+    scheduler.add("drive", robot.drive_step(), robot.periods["drive"])
+    scheduler.add("log", log_step, robot.periods["drive"])
+    scheduler.add("arm", robot.button_step(), robot.periods["arm"])
+    scheduler.add("telem", telemetry_step, robot.periods["telemetry"])
+    scheduler.run()
@@ -0,0 +1,78 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       screen_layout.py                                             #
+# 	Description:  Named-field brain screen that redraws only what changed     #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+#
+# Everything below the SCREEN marker is copied into each program by
+# tools/robot_config.py. Edit this file, not the copies, then run
+#
+#     python tools/robot_config.py render
+#
+# It needs the program's vex imports (sleep, MSEC) and brain.
+
+# SCREEN
+
+#
+# Brain screen layout. Each field is a named text line on its own screen
+# row. set() only stores the new text and marks the field dirty when it
+# differs from what is on screen, so it is cheap to call from any loop.
+# draw() then rewrites the dirty rows, padding with spaces over the end of
+# the old text instead of clearing, so nothing flickers. Drawing is rate
+# limited to one pass every refresh_ms; a call that comes sooner returns
+# at once and the changes are drawn on a later pass. Control loops should
+# only call set() and leave drawing to run() in a thread of its own; draw()
+# takes the dirty list before printing, so a field set meanwhile is kept
+# for the next pass.
+#
+class ScreenLayout:
+    def __init__(self, fields, refresh_ms=200):
+        self.rows = {}
+        self.text = {}
+        self.shown = {}
+        self.dirty = []
+        for name, row in fields:
+            self.rows[name] = row
+            self.text[name] = ""
+            self.shown[name] = ""
+        self.refresh_ms = refresh_ms
+        self.last_draw = -refresh_ms
+        self.draws = 0
+        self.lines_drawn = 0
+
+    # show text in the named field on the next draw
+    def set(self, name, text):
+        if text == self.text[name]:
+            return
+        self.text[name] = text
+        if name not in self.dirty:
+            self.dirty.append(name)
+
+    # redraw the fields that changed; force skips the rate limit
+    def draw(self, force=False):
+        if not self.dirty:
+            return
+        now = brain.timer.time(MSEC)
+        if not force and now - self.last_draw < self.refresh_ms:
+            return
+        self.last_draw = now
+        dirty = self.dirty
+        self.dirty = []
+        for name in dirty:
+            text = self.text[name]
+            old = self.shown[name]
+            brain.screen.set_cursor(self.rows[name], 1)
+            if len(old) > len(text):
+                brain.screen.print(text + " " * (len(old) - len(text)))
+            else:
+                brain.screen.print(text)
+            self.shown[name] = text
+            self.lines_drawn += 1
+        self.draws += 1
+
+    # draw every refresh_ms forever, for its own thread
+    def run(self):
+        while True:
+            self.draw()
+            sleep(self.refresh_ms)
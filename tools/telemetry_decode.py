@@ -0,0 +1,246 @@
+"""
+Decode telemetry logs from the brain console.
+
+Programs with a TelemetryLog (tools/telemetry_log.py) print it to the console
+as a header line and batches of hex records:
+
+    #VEXTLM HEADER <record size> name:scale,name:scale,...
+    #VEXTLM <sequence number of the first record> <records as hex>
+
+Each record is a uint32 time in msec and one int16 per channel, little
+endian, the stored value being the channel value times its scale. This tool
+turns a console capture into a compact .vextlm file and exports either one as
+CSV or as NumPy arrays. Records the brain overwrote before they were flushed
+show up as gaps in the sequence numbers.
+
+Usage:
+    python tools/telemetry_decode.py extract console.txt -o run.vextlm
+    python tools/telemetry_decode.py summary run.vextlm
+    python tools/telemetry_decode.py csv run.vextlm -o run.csv
+    python tools/telemetry_decode.py npz console.txt -o run.npz
+"""
+
+import argparse
+import csv
+import sys
+
+TELEMETRY_MAGIC = b"VEXTLM01"
+CONSOLE_PREFIX = "#VEXTLM "
+
+
+class TelemetryLog:
+    """
+    Decoded telemetry.
+
+    Attributes:
+        channels: (name, scale) pairs in record order.
+        records: (sequence, time_ms, raw values) tuples in sequence order,
+            raw values being the stored int16s.
+    """
+
+    def __init__(self, channels, records):
+        self.channels = list(channels)
+        self.records = records
+
+    @property
+    def names(self):
+        return [name for name, _ in self.channels]
+
+    @property
+    def record_size(self):
+        return 4 + 2 * len(self.channels)
+
+    def rows(self):
+        """
+        Yield (sequence, time_ms, value, ...) rows with the scales undone.
+        """
+        scales = [scale for _, scale in self.channels]
+        for seq, t, raw in self.records:
+            yield (seq, t) + tuple(v / scale if scale != 1 else v for v, scale in zip(raw, scales))
+
+    def gaps(self):
+        """
+        Return (first missing sequence, count) for every run of lost records.
+        """
+        gaps = []
+        expected = self.records[0][0] if self.records else 0
+        for seq, _, _ in self.records:
+            if seq > expected:
+                gaps.append((expected, seq - expected))
+            expected = seq + 1
+        return gaps
+
+
+def _int16(lo, hi):
+    value = lo | hi << 8
+    return value - 65536 if value > 32767 else value
+
+
+def _parse_header(fields):
+    size = int(fields[0])
+    channels = []
+    for field in fields[1].split(","):
+        name, scale = field.rsplit(":", 1)
+        channels.append((name, float(scale) if "." in scale else int(scale)))
+    if size != 4 + 2 * len(channels):
+        raise ValueError("record size %d does not match %d channels" % (size, len(channels)))
+    return channels
+
+
+def _unpack(data, seq, channel_count):
+    size = 4 + 2 * channel_count
+    if len(data) % size:
+        raise ValueError("batch at %d is %d bytes, not a multiple of %d" % (seq, len(data), size))
+    records = []
+    for i in range(0, len(data), size):
+        t = data[i] | data[i + 1] << 8 | data[i + 2] << 16 | data[i + 3] << 24
+        raw = tuple(_int16(data[j], data[j + 1]) for j in range(i + 4, i + size, 2))
+        records.append((seq, t, raw))
+        seq += 1
+    return records
+
+
+def parse_console(text):
+    """
+    Extract the telemetry from a console capture. A HEADER line starts a new
+    log (the program restarted), so only the last log is returned.
+
+    Args:
+        text: Console output from the brain.
+
+    Returns:
+        TelemetryLog: The decoded log.
+    """
+    channels = None
+    by_seq = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith(CONSOLE_PREFIX):
+            continue
+        fields = line[len(CONSOLE_PREFIX):].split()
+        if fields[0] == "HEADER":
+            channels = _parse_header(fields[1:])
+            by_seq = {}
+        elif channels is not None and len(fields) == 2:
+            for record in _unpack(bytes.fromhex(fields[1]), int(fields[0]), len(channels)):
+                by_seq[record[0]] = record
+    if channels is None:
+        raise ValueError("no #VEXTLM HEADER line found")
+    return TelemetryLog(channels, [by_seq[seq] for seq in sorted(by_seq)])
+
+
+def encode_log(log):
+    """
+    Pack a log into the .vextlm format: the magic, the header line and then
+    every record prefixed with its uint32 sequence number.
+    """
+    header = "%d %s\n" % (log.record_size, ",".join("%s:%s" % c for c in log.channels))
+    out = bytearray(TELEMETRY_MAGIC + header.encode("ascii"))
+    for seq, t, raw in log.records:
+        for value in (seq, t):
+            out += bytes((value & 0xFF, (value >> 8) & 0xFF, (value >> 16) & 0xFF, (value >> 24) & 0xFF))
+        for v in raw:
+            out += bytes((v & 0xFF, (v >> 8) & 0xFF))
+    return bytes(out)
+
+
+def decode_log(data):
+    """
+    Unpack a .vextlm file's contents.
+    """
+    if not data.startswith(TELEMETRY_MAGIC):
+        raise ValueError("not a .vextlm file")
+    end = data.index(b"\n")
+    channels = _parse_header(data[len(TELEMETRY_MAGIC):end].decode("ascii").split())
+    body = data[end + 1:]
+    size = 8 + 2 * len(channels)
+    if len(body) % size:
+        raise ValueError("record data is %d bytes, not a multiple of %d" % (len(body), size))
+    records = []
+    for i in range(0, len(body), size):
+        seq = body[i] | body[i + 1] << 8 | body[i + 2] << 16 | body[i + 3] << 24
+        records.extend(_unpack(body[i + 4:i + size], seq, len(channels)))
+    return TelemetryLog(channels, records)
+
+
+def read_log(path):
+    """
+    Load a log from a .vextlm file or directly from a console capture.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(TELEMETRY_MAGIC):
+        return decode_log(data)
+    return parse_console(data.decode("utf-8", "replace"))
+
+
+def write_csv(path, log):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["seq", "time_ms"] + log.names)
+        for row in log.rows():
+            writer.writerow(row)
+
+
+def write_npz(path, log):
+    """
+    Save every column as a NumPy array named after its channel, plus "seq"
+    and "time_ms". Needs numpy, which the brain programs do not.
+    """
+    import numpy as np
+
+    columns = list(zip(*log.rows())) if log.records else [()] * (2 + len(log.channels))
+    arrays = {"seq": np.array(columns[0], dtype=np.int64), "time_ms": np.array(columns[1], dtype=np.int64)}
+    for (name, _), values in zip(log.channels, columns[2:]):
+        arrays[name] = np.array(values, dtype=np.float64)
+    np.savez(path, **arrays)
+
+
+def summarize(log):
+    lost = sum(count for _, count in log.gaps())
+    if not log.records:
+        return "0 records"
+    first, last = log.records[0], log.records[-1]
+    return ("%d records of %d bytes, %d channels (%s), %d to %d ms, %d lost"
+            % (len(log.records), log.record_size, len(log.channels), ", ".join(log.names), first[1], last[1], lost))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode telemetry logs from the brain console")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("extract", help="convert a console capture into a .vextlm file")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", required=True)
+    p = sub.add_parser("summary", help="print what a log holds")
+    p.add_argument("input")
+    p = sub.add_parser("csv", help="export a log as CSV")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", required=True)
+    p = sub.add_parser("npz", help="export a log as NumPy arrays")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    try:
+        log = read_log(args.input)
+    except ValueError as e:
+        print("Error: %s" % e)
+        return 1
+
+    if args.command == "extract":
+        with open(args.output, "wb") as f:
+            f.write(encode_log(log))
+    elif args.command == "csv":
+        write_csv(args.output, log)
+    elif args.command == "npz":
+        try:
+            write_npz(args.output, log)
+        except ImportError:
+            print("Error: npz export needs numpy")
+            return 1
+    print(summarize(log))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
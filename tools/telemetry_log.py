@@ -0,0 +1,102 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       telemetry_log.py                                             #
+# 	Description:  Ring-buffer telemetry log for IQ2 programs                  #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+#
+# Everything below the TELEMETRY marker is copied into each program by
+# tools/robot_config.py. Edit this file, not the copies, then run
+#
+#     python tools/robot_config.py render
+#
+# It needs the program's vex imports (sleep, MSEC) and brain. Decode the
+# console output on the desktop with tools/telemetry_decode.py.
+
+# TELEMETRY
+
+#
+# Telemetry log. Each record is a uint32 time in msec followed by one int16
+# per channel, little endian. A channel is a (name, scale) pair and is
+# stored as int(value * scale), so scale 10 keeps one decimal place.
+#
+# The hot loop fills the preallocated `row` list and calls commit(), which
+# packs it into the next slot of a preallocated ring buffer; nothing is
+# allocated per record. flush() runs from a slower background loop and
+# prints the records written since the last flush as hex lines
+#
+#     #VEXTLM HEADER <record size> name:scale,name:scale,...
+#     #VEXTLM <sequence number of the first record> <records as hex>
+#
+# with at most batch records per line. If the flush falls more than the
+# ring's capacity behind, the oldest records are overwritten and counted in
+# lost; the sequence numbers let the decoder see the gap.
+#
+class TelemetryLog:
+    def __init__(self, channels, capacity=256, batch=16, flush_ms=250):
+        self.names = tuple([name for name, scale in channels])
+        self.scales = tuple([scale for name, scale in channels])
+        self.record_size = 4 + 2 * len(channels)
+        self.capacity = capacity
+        self.batch = batch
+        self.flush_ms = flush_ms
+        self.buffer = bytearray(capacity * self.record_size)
+        self.row = [0] * len(channels)
+        self.written = 0
+        self.flushed = 0
+        self.lost = 0
+        self.header_sent = False
+
+    # pack row into the ring as a record stamped with time t (msec)
+    def commit(self, t):
+        buf = self.buffer
+        i = (self.written % self.capacity) * self.record_size
+        t = int(t)
+        buf[i] = t & 0xFF
+        buf[i + 1] = (t >> 8) & 0xFF
+        buf[i + 2] = (t >> 16) & 0xFF
+        buf[i + 3] = (t >> 24) & 0xFF
+        i += 4
+        row = self.row
+        scales = self.scales
+        for c in range(len(row)):
+            v = int(row[c] * scales[c])
+            if v > 32767:
+                v = 32767
+            elif v < -32768:
+                v = -32768
+            buf[i] = v & 0xFF
+            buf[i + 1] = (v >> 8) & 0xFF
+            i += 2
+        self.written += 1
+
+    # print every record not flushed yet, oldest first
+    def flush(self):
+        if not self.header_sent:
+            fields = []
+            for c in range(len(self.names)):
+                fields.append("%s:%s" % (self.names[c], self.scales[c]))
+            print("#VEXTLM HEADER %d %s" % (self.record_size, ",".join(fields)))
+            self.header_sent = True
+        written = self.written
+        if written - self.flushed > self.capacity:
+            self.lost += written - self.flushed - self.capacity
+            self.flushed = written - self.capacity
+        size = self.record_size
+        while self.flushed < written:
+            count = min(self.batch, written - self.flushed)
+            # a batch may wrap around the end of the ring
+            start = (self.flushed % self.capacity) * size
+            end = start + count * size
+            if end <= len(self.buffer):
+                data = self.buffer[start:end]
+            else:
+                data = self.buffer[start:] + self.buffer[:end - len(self.buffer)]
+            print("#VEXTLM %d %s" % (self.flushed, "".join(["%02x" % b for b in data])))
+            self.flushed += count
+
+    # flush every flush_ms forever, for its own thread
+    def run(self):
+        while True:
+            sleep(self.flush_ms)
+            self.flush()